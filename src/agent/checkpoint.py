@@ -0,0 +1,95 @@
+import os
+import pickle
+import random
+
+import numpy as np
+
+
+def save_checkpoint(path, **state):
+    """
+    Writes the state of a simulation or search to `path`, together with the
+    state of the `random` and `np.random` modules used by the allocation
+    policies.
+
+    The state is pickled to a temporary file which then replaces `path`, so
+    that a job stopped while writing leaves the previous checkpoint intact.
+    Objects pickled in the same checkpoint keep sharing their references
+    when it is loaded.
+    """
+    state["random"] = random.getstate()
+    state["np_random"] = np.random.get_state()
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path):
+    """
+    Returns the state written by `save_checkpoint`, restoring the state of
+    the `random` and `np.random` modules.
+    """
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    random.setstate(state.pop("random"))
+    np.random.set_state(state.pop("np_random"))
+    return state
+
+
+def save_search(path, root, arrivals, n_iterations=0):
+    """
+    Writes an MCTS search to `path`, with the arrivals it searches and the
+    number of iterations done, so that it can be continued with `load_search`.
+    """
+    save_checkpoint(
+        path, root=root, arrivals=arrivals, n_iterations=n_iterations
+    )
+
+
+def load_search(path):
+    """
+    Returns the root, arrivals and number of iterations of a search written
+    by `save_search`.
+
+    The tree refers to the loaded arrivals rather than to the original
+    patients, so the search must be continued with them, e.g.
+
+    `root, arrivals, done = load_search(path)
+    run_mcts(hospital, arrivals, n_iterations=n - done, root=root)`
+
+    which makes the same choices as the search would have made without
+    stopping.
+    """
+    state = load_checkpoint(path)
+    return state["root"], state["arrivals"], state["n_iterations"]
+
+
+class SearchCheckpoint:
+    """
+    Search callback saving the tree every `every` iterations with
+    `save_search`, passed to `run_mcts(..., callback=...)`. Searches resumed
+    with `load_search` can be given the same callback, which carries on
+    counting from the iterations already done.
+
+    Attributes
+    ----------
+    path: str
+        File the search is written to.
+    arrivals: List[List[hospital.people.Patient]]
+        Arrivals being searched.
+    every: int
+        Number of iterations between checkpoints.
+    n_iterations: int
+        Number of iterations done.
+    """
+
+    def __init__(self, path, arrivals, every=100, n_iterations=0):
+        self.path = path
+        self.arrivals = arrivals
+        self.every = every
+        self.n_iterations = n_iterations
+
+    def __call__(self, root):
+        self.n_iterations += 1
+        if self.n_iterations % self.every == 0:
+            save_search(self.path, root, self.arrivals, self.n_iterations)
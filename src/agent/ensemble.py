@@ -0,0 +1,152 @@
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Tuple
+
+import numpy as np
+
+from agent.simulator import Simulator
+
+
+@dataclass
+class EnsembleSummary:
+    """
+    Per-timestep distribution of independent replications of a simulation.
+    Entry [i, t] of every array is the `percentiles[i]` percentile over the
+    replications at timestep t.
+
+    Attributes
+    ----------
+    percentiles: Tuple[float]
+        Percentiles summarising the replications.
+    penalty: np.ndarray
+        Percentiles of the total penalty of the hospital.
+    occupancy: np.ndarray
+        Percentiles of the number of occupied beds.
+    violations: np.ndarray
+        Percentiles of the number of violated restrictions.
+    """
+
+    percentiles: Tuple[float]
+    penalty: np.ndarray
+    occupancy: np.ndarray
+    violations: np.ndarray
+
+
+def run_ensemble(
+    hospital,
+    arrivals,
+    policy,
+    num_timesteps,
+    n_replications,
+    seed=0,
+    n_workers=1,
+    percentiles=(5, 50, 95),
+):
+    """
+    Runs independent replications of an `agent.simulator.Simulator` across
+    a pool of processes, returning the per-timestep distribution of the
+    penalty, occupancy and violated restrictions.
+
+    Each replication draws from its own stream, spawned from `seed` with
+    `np.random.SeedSequence`, which seeds the discharges, the arrivals and
+    the `random` and `np.random` modules used by policies. The results
+    therefore only depend on `seed`, however many workers run them. The
+    hospital, arrivals and policy are sent once to each worker rather than
+    with every replication. Replications run in this process leave the
+    state of the `random` and `np.random` modules as it was.
+
+    Parameters
+    ----------
+    hospital: hospital.building.building.Hospital
+        Hospital every replication starts from.
+    arrivals: Callable[[np.random.Generator], Iterator[Patient]]
+        Returns the patients arriving at each timestep of a replication, as
+        the `generator` of `Simulator`, given the replication's generator.
+        It must be picklable (e.g. a module level function) when
+        `n_workers` > 1.
+    policy: Callable[[Hospital, queue.Queue], Any]
+        Allocation policy, as for `Simulator`.
+    num_timesteps: int
+        Number of timesteps of each replication.
+    n_replications: int
+        Number of replications.
+    seed: int
+        Master seed of the replications.
+    n_workers: int
+        Number of worker processes, replications run in this process if 1.
+    percentiles: Sequence[float]
+        Percentiles to summarise the replications with.
+
+    Returns
+    -------
+    EnsembleSummary
+    """
+    seeds = np.random.SeedSequence(seed).spawn(n_replications)
+    args = (hospital, arrivals, policy, num_timesteps)
+    if n_workers > 1:
+        chunksize = max(math.ceil(n_replications / (4 * n_workers)), 1)
+        with ProcessPoolExecutor(
+            n_workers, initializer=_init_worker, initargs=args
+        ) as pool:
+            results = list(pool.map(_replicate, seeds, chunksize=chunksize))
+    else:
+        # replications seed the modules, which are restored afterwards
+        random_state = random.getstate()
+        np_random_state = np.random.get_state()
+        _init_worker(*args)
+        try:
+            results = [_replicate(s) for s in seeds]
+        finally:
+            _worker.clear()
+            random.setstate(random_state)
+            np.random.set_state(np_random_state)
+
+    penalty, occupancy, violations = (np.array(r) for r in zip(*results))
+    percentiles = tuple(percentiles)
+    return EnsembleSummary(
+        percentiles,
+        np.percentile(penalty, percentiles, axis=0),
+        np.percentile(occupancy, percentiles, axis=0),
+        np.percentile(violations, percentiles, axis=0),
+    )
+
+
+# simulation shared by the replications run in this process
+_worker = {}
+
+
+def _init_worker(hospital, arrivals, policy, num_timesteps):
+    _worker.update(
+        hospital=hospital,
+        arrivals=arrivals,
+        policy=policy,
+        num_timesteps=num_timesteps,
+    )
+
+
+def _replicate(seed_sequence):
+    """
+    Runs one replication, returning the penalty, occupancy and number of
+    violated restrictions at each timestep.
+    """
+    simulator_seed, arrivals_seed, module_seed = seed_sequence.spawn(3)
+    random.seed(int(module_seed.generate_state(1)[0]))
+    np.random.seed(module_seed.generate_state(1))
+    arrivals = _worker["arrivals"](np.random.default_rng(arrivals_seed))
+    simulator = Simulator(
+        _worker["hospital"],
+        arrivals,
+        _worker["policy"],
+        seed=simulator_seed,
+    )
+    penalty = []
+    occupancy = []
+    violations = []
+    for _ in range(_worker["num_timesteps"]):
+        penalty.append(simulator.simulate_once())
+        occupancy.append(len(simulator.hospital.occupied_beds))
+        names = simulator.hospital.eval_restrictions()["names"]
+        violations.append(len(names))
+    return penalty, occupancy, violations
@@ -0,0 +1,148 @@
+import copy
+import heapq
+import itertools
+import math
+import queue
+import random
+
+import numpy as np
+
+from agent.simulator import sample_discharge_delays
+
+# discharges are processed before arrivals at the same time, as in Simulator
+DISCHARGE = 0
+ARRIVAL = 1
+
+
+class EventSimulator:
+    """
+    Discrete-event simulation of a hospital, for long horizons.
+
+    Rather than advancing every patient one timestep at a time as
+    `agent.simulator.Simulator` does, the simulator keeps a heap of
+    timestamped events. Arrivals are read from a stream of (time, patient)
+    pairs, one at a time. The discharge time of a patient is sampled from
+    the length of stay model (see `sample_discharge_delays`) as soon as they
+    are allocated a bed. Allocations are made by a policy with the same
+    `policy(hospital, queue)` interface as `Simulator`, run after every
+    arrival and after discharges while patients are waiting. The cost of a
+    simulation is proportional to the number of events, not to the number of
+    timesteps times the number of beds.
+
+    Times are measured in timesteps (hours) and may be fractional. Patients
+    allocated by the policy are observed through `Hospital.observe`. Every
+    admission is given a token carried by its discharge event, so that the
+    discharges of admissions ended by other means are dropped when they are
+    due, even if the patient has been admitted again since.
+
+    Attributes
+    ----------
+    hospital: hospital.building.building.Hospital
+        Copy of the hospital being simulated.
+    arrivals: Iterator[Tuple[float, hospital.people.Patient]]
+        Arrival time and patient of every arrival, in order of time, e.g.
+        `enumerate(generator, 1)` for one arrival per timestep as in
+        `Simulator`.
+    policy: Callable[[Hospital, queue.Queue], Any]
+        Allocation policy, modifying the hospital in place.
+    queue: queue.Queue
+        Patients waiting for a bed.
+    time: float
+        Time of the last processed event.
+    rng: np.random.Generator
+        Source of the discharge times, seeded from the `random` module unless
+        a seed is given.
+    """
+
+    def __init__(self, hospital, arrivals, policy, seed=None):
+        self.hospital = copy.deepcopy(hospital)
+        self.arrivals = iter(arrivals)
+        self.policy = policy
+        self.queue = queue.Queue()
+        self.time = 0
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.rng = np.random.default_rng(seed)
+        self._events = []
+        self._order = itertools.count()
+        # admission token, time and length of stay timer at admission, by bed
+        self._admissions = {}
+        self._tokens = itertools.count()
+
+        beds = self.hospital.occupied_beds
+        patients = [bed.patient for bed in beds]
+        delays = sample_discharge_delays(
+            [p.length_of_stay for p in patients],
+            [p.expected_length_of_stay for p in patients],
+            self.rng,
+        )
+        for bed, patient, delay in zip(beds, patients, delays.tolist()):
+            self._admit(bed, patient, delay)
+        self.hospital.observe(self._on_occupancy_change)
+        self._next_arrival()
+
+    def run(self, until):
+        """
+        Processes the events up to time `until`, returning the time and score
+        of the hospital after each batch of simultaneous events.
+        """
+        scores = []
+        while self._events and self._events[0][0] <= until:
+            time = self._events[0][0]
+            self.step()
+            if not self._events or self._events[0][0] != time:
+                scores.append((time, self.hospital.score()))
+        self.time = max(self.time, until)
+        self._update_timers()
+        return scores
+
+    def step(self):
+        """
+        Processes the next event.
+        """
+        self.time, kind, _, payload = heapq.heappop(self._events)
+        if kind == ARRIVAL:
+            self.queue.put(payload)
+            self._next_arrival()
+            self.policy(self.hospital, self.queue)
+            return
+        bed, token = payload
+        admission = self._admissions.get(bed)
+        if admission is not None and admission[0] == token:
+            self.hospital.discharge(bed.patient)
+            if not self.queue.empty():
+                self.policy(self.hospital, self.queue)
+
+    def _next_arrival(self):
+        try:
+            time, patient = next(self.arrivals)
+        except StopIteration:
+            return
+        self._push(time, ARRIVAL, patient)
+
+    def _push(self, time, kind, payload):
+        heapq.heappush(self._events, (time, kind, next(self._order), payload))
+
+    def _admit(self, bed, patient, delay):
+        token = next(self._tokens)
+        self._admissions[bed] = (token, self.time, patient.length_of_stay)
+        self._push(self.time + delay, DISCHARGE, (bed, token))
+
+    def _on_occupancy_change(self, bed, old_patient, new_patient):
+        if old_patient is not None:
+            _, admitted, length_of_stay = self._admissions.pop(bed)
+            elapsed = math.floor(self.time - admitted)
+            old_patient.length_of_stay = length_of_stay + elapsed
+        if new_patient is not None:
+            (delay,) = sample_discharge_delays(
+                [new_patient.length_of_stay],
+                [new_patient.expected_length_of_stay],
+                self.rng,
+            )
+            self._admit(bed, new_patient, delay)
+
+    def _update_timers(self):
+        # bring the timers of the patients in the hospital up to date
+        for bed, (_, admitted, length_of_stay) in self._admissions.items():
+            elapsed = math.floor(self.time - admitted)
+            bed.patient.length_of_stay = length_of_stay + elapsed
@@ -1,26 +1,371 @@
 import copy
 import math
-import statistics
-from itertools import permutations
+from collections import Counter, deque
+from itertools import product
 
-from anytree import NodeMixin
+import numpy as np
 
-from agent.policy import random_allocate
-from agent.simulator import Simulator, discharge_patients, increment_timers
+from agent.policy import interchangeable_beds, random_allocate
+from agent.rollout import batched_rollouts
+from agent.simulator import Simulator, discharge_probability
+from agent.transposition import TranspositionTable, ZobristHasher
+from agent.utils import bernoulli
+from hospital.snapshot import OccupancySnapshot
 
 
-class Node(NodeMixin):
+class SearchTree:
+    """
+    Array-backed Monte Carlo search tree.
+
+    Nodes are identified by their index, the root being node 0. The
+    statistics of the nodes are stored in NumPy arrays, which grow
+    geometrically as nodes are added. The children of a node are added
+    together when it is expanded, so they are stored contiguously and
+    described by the index of the first child and their number. Visit values
+    are kept as running totals rather than lists.
+
+    With a transposition table, nodes reaching the same occupancy at the same
+    depth (up to swapping patients between interchangeable beds) share the
+    statistics and children of the first of them, their `stats` node. Nodes
+    can then be reached along several paths, so the path followed from the
+    root is carried by the `Node` views.
+
+    Children are added lazily: expanding a node stores the snapshot their
+    allocations are admitted to and their actions only. The snapshot and the
+    immediate reward of a child are computed when it is first used (see
+    `materialise`), so that expansion does not score every child.
+
+    With progressive widening, only the first ceil(k N^alpha) children of a
+    node visited N times are open to the search, children being ordered by
+    the greedy penalty of their allocation when the node is expanded.
+
+    Attributes
+    ----------
+    max_tree_depth: int
+        Maximum tree depth to expand to.
+    discount_factor: float
+        Weighting for future timesteps in the visit values.
+    table: Optional[agent.transposition.TranspositionTable]
+        Node holding the statistics of each (depth, occupancy hash).
+    hasher: Optional[agent.transposition.ZobristHasher]
+        Hash function of the occupancy of the nodes.
+    widening: Optional[Tuple[float, float]]
+        Coefficient k and exponent alpha of the progressive widening, None
+        to open every child on expansion.
+    parent: np.ndarray
+        Index of the parent of each node, -1 for the root.
+    depth: np.ndarray
+        Depth of each node.
+    first_child: np.ndarray
+        Index of the first child of each node.
+    num_children: np.ndarray
+        Number of children of each node, 0 until it is expanded.
+    visit_count: np.ndarray
+        Number of visits of each node.
+    value_sum: np.ndarray
+        Sum of the values of the visits of each node.
+    value_min: np.ndarray
+        Lowest value of the visits of each node.
+    prior: np.ndarray
+        Prior on UCB value of each node.
+    immediate_reward: np.ndarray
+        Immediate reward associated with the action of each node, NaN until
+        the node is materialised.
+    stats: np.ndarray
+        Index of the node holding the statistics and children of each node,
+        the node itself unless it is a transposition of another node.
+    key: np.ndarray
+        Occupancy hash of each node, 0 without a transposition table.
+    snapshots: List[Optional[hospital.snapshot.OccupancySnapshot]]
+        Occupancy of the hospital at each node, None until the node is
+        materialised.
+    expanded_from: List[Optional[hospital.snapshot.OccupancySnapshot]]
+        Snapshot to which the allocations of the children of each node are
+        admitted, None until the node is expanded.
+    actions: List[Optional[dict]]
+        Set of bed allocations represented by each node.
+    rng: Optional[np.random.Generator]
+        Source of the batched rollouts of the search, None until the first
+        batched rollout.
+
+    Trees can be pickled (see agent.checkpoint.save_search), the arrays being
+    trimmed to the nodes in use.
+    """
+
+    _arrays = {
+        "parent": np.int32,
+        "depth": np.int32,
+        "first_child": np.int32,
+        "num_children": np.int32,
+        "visit_count": np.int32,
+        "value_sum": np.float64,
+        "value_min": np.float64,
+        "prior": np.float64,
+        "immediate_reward": np.float64,
+        "stats": np.int32,
+        "key": np.uint64,
+    }
+
+    def __init__(
+        self,
+        snapshot,
+        max_tree_depth,
+        discount_factor=0.9,
+        table_size=None,
+        hasher=None,
+        widening=None,
+    ):
+        self.max_tree_depth = max_tree_depth
+        self.discount_factor = discount_factor
+        self.widening = widening
+        self.size = 0
+        for name, dtype in self._arrays.items():
+            setattr(self, name, np.zeros(16, dtype=dtype))
+        self.snapshots = []
+        self.expanded_from = []
+        self.actions = []
+        self.table = None
+        self.hasher = None
+        self.rng = None
+        keys = None
+        if table_size:
+            self.table = TranspositionTable(table_size)
+            self.hasher = hasher or ZobristHasher(snapshot.context)
+            keys = [self.hasher.hash(snapshot)]
+        self._add_nodes(-1, [0], [None], keys)
+        self.snapshots[0] = snapshot
+        self.immediate_reward[0] = 1 - snapshot.score()
+
+    def __len__(self):
+        return self.size
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        for name in self._arrays:
+            state[name] = state[name][: self.size]
+        return state
+
+    def children(self, index):
+        index = self.stats[index]
+        first = self.first_child[index]
+        return range(first, first + self.num_children[index])
+
+    def is_leaf(self, index):
+        return not self.num_children[self.stats[index]]
+
+    def width(self, index):
+        """
+        Returns the number of children of the node open to the search.
+        """
+        index = self.stats[index]
+        num_children = int(self.num_children[index])
+        if self.widening is None or not num_children:
+            return num_children
+        k, alpha = self.widening
+        visits = max(int(self.visit_count[index]), 1)
+        return min(num_children, max(math.ceil(k * visits ** alpha), 1))
+
+    def open_children(self, index):
+        first = self.first_child[self.stats[index]]
+        return range(first, first + self.width(index))
+
+    def add_children(self, index, snapshot, priors, actions, keys=None):
+        """
+        Adds the children of an unexpanded node, whose actions are admitted
+        to `snapshot`, returning their indices.
+        """
+        index = self.stats[index]
+        if self.num_children[index]:
+            raise ValueError(f"Node {index} has already been expanded.")
+        children = self._add_nodes(index, priors, actions, keys)
+        self.expanded_from[index] = snapshot
+        self.first_child[index] = children.start
+        self.num_children[index] = len(children)
+        return children
+
+    def materialise(self, index):
+        """
+        Computes the snapshot and immediate reward of the node if they have
+        not been computed yet.
+        """
+        if self.snapshots[index] is None:
+            expanded_from = self.expanded_from[self.parent[index]]
+            snapshot = expanded_from.admit(self.actions[index].items())
+            self.immediate_reward[index] = 1 - snapshot.score()
+            self.snapshots[index] = snapshot
+
+    def add_visits(self, index, count, total, minimum):
+        """
+        Adds `count` visits to the node, with values summing to `total` and
+        lowest value `minimum`.
+        """
+        if not count:
+            return
+        index = self.stats[index]
+        if self.visit_count[index]:
+            minimum = min(minimum, self.value_min[index])
+        self.value_min[index] = minimum
+        self.value_sum[index] += total
+        self.visit_count[index] += count
+
+    def path(self, index):
+        """
+        Returns the indices of the node and its ancestors, up to the root.
+        """
+        path = []
+        while index >= 0:
+            path.append(index)
+            index = self.parent[index]
+        return path
+
+    def values(self, indices):
+        """
+        Returns the mean visit value of the nodes, 0 for unvisited nodes.
+        """
+        indices = self.stats[indices]
+        counts = self.visit_count[indices]
+        return _mean(self.value_sum[indices], counts)
+
+    def ucb_scores(self, index):
+        """
+        Returns the UCB score of each open child of the node.
+        """
+        width = self.width(index)
+        index = self.stats[index]
+        first = self.first_child[index]
+        children = slice(first, first + width)
+        priors = self.prior[children]
+        if self.table is not None:
+            children = self.stats[children]
+        counts = self.visit_count[children]
+        values = _mean(self.value_sum[children], counts)
+        ratio = np.sqrt(self.visit_count[index]) / (counts + 1)
+        return values + priors * ratio
+
+    def subtree(self, index, max_tree_depth):
+        """
+        Returns a new tree holding a copy of the subtree of an expanded node,
+        with nodes deeper than `max_tree_depth` left out.
+
+        The root of the new tree is the snapshot the children of the node
+        were expanded from. Transpositions within the subtree are copied once
+        and keep sharing their statistics.
+        """
+        table_size = self.table.capacity if self.table is not None else None
+        tree = SearchTree(
+            self.expanded_from[self.stats[index]],
+            max_tree_depth,
+            self.discount_factor,
+            table_size,
+            self.hasher,
+            self.widening,
+        )
+        tree.copy_statistics(0, self, index)
+        queue = deque([(index, 0)])
+        while queue:
+            old, new = queue.popleft()
+            children = self.children(old)
+            if not len(children) or tree.depth[new] >= max_tree_depth:
+                continue
+            nodes = slice(children.start, children.stop)
+            copies = tree.add_children(
+                new,
+                self.expanded_from[self.stats[old]],
+                self.prior[nodes],
+                self.actions[nodes],
+                self.key[nodes].tolist() if tree.table is not None else None,
+            )
+            tree.immediate_reward[
+                copies.start : copies.stop
+            ] = self.immediate_reward[nodes]
+            tree.snapshots[copies.start : copies.stop] = self.snapshots[nodes]
+            for old_child, new_child in zip(children, copies):
+                if tree.stats[new_child] == new_child:
+                    tree.copy_statistics(new_child, self, old_child)
+                    queue.append((old_child, new_child))
+        return tree
+
+    def copy_statistics(self, index, tree, other):
+        """
+        Adds the visits of the node `other` of `tree` to the node.
+        """
+        other = tree.stats[other]
+        self.add_visits(
+            index,
+            tree.visit_count[other],
+            tree.value_sum[other],
+            tree.value_min[other],
+        )
+
+    def _add_nodes(self, parent, priors, actions, keys=None):
+        start = self.size
+        stop = start + len(actions)
+        self._reserve(stop)
+        nodes = slice(start, stop)
+        depth = self.depth[parent] + 1 if parent >= 0 else 0
+        self.parent[nodes] = parent
+        self.depth[nodes] = depth
+        self.prior[nodes] = priors
+        self.immediate_reward[nodes] = np.nan
+        self.stats[nodes] = np.arange(start, stop)
+        self.snapshots.extend([None] * len(actions))
+        self.expanded_from.extend([None] * len(actions))
+        self.actions.extend(actions)
+        self.size = stop
+        if self.table is not None and keys is not None:
+            self.key[nodes] = keys
+            for i, key in enumerate(keys, start):
+                stats = self.table.get((depth, key))
+                if stats is None:
+                    self.table.put((depth, key), i)
+                else:
+                    self.stats[i] = stats
+        return range(start, stop)
+
+    def _reserve(self, size):
+        capacity = len(self.parent)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name in self._arrays:
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[: len(array)] = array
+            setattr(self, name, grown)
+
+
+def _mean(totals, counts):
+    return np.divide(
+        totals, counts, out=np.zeros(len(totals)), where=counts > 0
+    )
+
+
+class Node:
     """
     Node class used for Monte Carlo Tree Search algorithm.
 
+    Nodes are views of a position within a SearchTree, which holds their
+    statistics. Creating a node from a hospital creates a new tree with the
+    node as its root, with a transposition table of `table_size` entries and
+    progressive `widening` if given (see SearchTree).
+
     Attributes
     ----------
-    hospital: hospital.building.building.Hospital
-        Hospital structure with wards, rooms beds and patients.
+    tree: SearchTree
+        Tree holding the node.
+    index: int
+        Position of the node within the tree.
+    snapshot: hospital.snapshot.OccupancySnapshot
+        Occupancy of the hospital at the node. Nodes can be created from a
+        hospital.building.building.Hospital, and share the unchanged wards
+        and rooms of their snapshots with their parent.
     prior: float
         Prior on UCB value of the node.
-    visit_values: List[float]
-        Rewards associated with each visit of the node during the tree search.
+    visit_count: int
+        Number of visits of the node during the tree search.
+    value: float
+        Mean reward of the visits of the node, 0 until it is visited.
     immediate_reward: float
         Immediate reward associated with the node action.
     discount_factor: float
@@ -32,78 +377,225 @@ class Node(NodeMixin):
         window of the future arrivals.
     action: dict
         Set of bed allocations for t=1 represented by the node.
+    path: List[int]
+        Indices of the node and of the ancestors it was reached from, up to
+        the root.
     """
 
+    __slots__ = ("tree", "index", "_path")
+
     def __init__(
-        self, hospital, prior, max_tree_depth, discount_factor=0.9, action=None
+        self,
+        hospital,
+        prior,
+        max_tree_depth,
+        discount_factor=0.9,
+        action=None,
+        table_size=None,
+        widening=None,
     ):
-        self.hospital = hospital
-        self.prior = prior
-        self.visit_values = []
-        self.immediate_reward = 1 - self.hospital.eval_restrictions()["score"]
-        self.discount_factor = discount_factor
-        self.max_tree_depth = max_tree_depth
-        self.action = action
+        if not isinstance(hospital, OccupancySnapshot):
+            hospital = OccupancySnapshot.from_hospital(hospital)
+        self.tree = SearchTree(
+            hospital,
+            max_tree_depth,
+            discount_factor,
+            table_size,
+            widening=widening,
+        )
+        self.tree.prior[0] = prior
+        self.tree.actions[0] = action
+        self.index = 0
+        self._path = None
+
+    @classmethod
+    def _view(cls, tree, index, path=None):
+        node = cls.__new__(cls)
+        node.tree = tree
+        node.index = int(index)
+        node._path = path
+        return node
+
+    def __eq__(self, other):
+        if not isinstance(other, Node):
+            return NotImplemented
+        return self.tree is other.tree and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    @property
+    def snapshot(self):
+        self.tree.materialise(self.index)
+        return self.tree.snapshots[self.index]
+
+    @property
+    def expanded_from(self):
+        """
+        Snapshot the children of the node were expanded from, after the
+        simulated discharges. None until the node is expanded.
+        """
+        return self.tree.expanded_from[self.tree.stats[self.index]]
+
+    @property
+    def hospital(self):
+        """
+        New hospital holding a copy of the occupancy at the node.
+        """
+        return self.snapshot.to_hospital()
+
+    @property
+    def action(self):
+        return self.tree.actions[self.index]
+
+    @property
+    def prior(self):
+        return float(self.tree.prior[self.index])
+
+    @property
+    def immediate_reward(self):
+        self.tree.materialise(self.index)
+        return float(self.tree.immediate_reward[self.index])
+
+    @property
+    def discount_factor(self):
+        return self.tree.discount_factor
+
+    @property
+    def max_tree_depth(self):
+        return self.tree.max_tree_depth
 
     @property
     def visit_count(self):
-        return len(self.visit_values)
+        return int(self.tree.visit_count[self.tree.stats[self.index]])
 
     @property
     def value(self):
-        try:
-            return statistics.mean(self.visit_values)
-        except statistics.StatisticsError:
-            return 0
+        return float(self.tree.values([self.index])[0])
+
+    @property
+    def depth(self):
+        return int(self.tree.depth[self.index])
+
+    @property
+    def path(self):
+        if self._path is None:
+            return self.tree.path(self.index)
+        return self._path[::-1]
+
+    @property
+    def parent(self):
+        if self._path is not None and len(self._path) > 1:
+            return Node._view(self.tree, self._path[-2], self._path[:-1])
+        parent = self.tree.parent[self.index]
+        return None if parent < 0 else Node._view(self.tree, parent)
+
+    @property
+    def children(self):
+        tree = self.tree
+        path = self.path[::-1]
+        return tuple(
+            Node._view(tree, i, path + [i]) for i in tree.children(self.index)
+        )
+
+    @property
+    def open_children(self):
+        """
+        Children open to the search under progressive widening, all of the
+        children otherwise.
+        """
+        tree = self.tree
+        path = self.path[::-1]
+        return tuple(
+            Node._view(tree, i, path + [i])
+            for i in tree.open_children(self.index)
+        )
+
+    @property
+    def is_root(self):
+        return bool(self.tree.parent[self.index] < 0)
+
+    @property
+    def is_transposition(self):
+        """
+        Whether the node shares the statistics of another node.
+        """
+        return bool(self.tree.stats[self.index] != self.index)
 
     def is_expandable(self):
-        return not self.children
+        return not self.tree.num_children[self.tree.stats[self.index]]
+
+    def subtree(self, max_tree_depth):
+        """
+        Returns the root of a new tree holding a copy of the subtree of the
+        node (see `SearchTree.subtree`).
+        """
+        tree = self.tree.subtree(self.index, max_tree_depth)
+        return Node._view(tree, 0)
 
-    def attach_child(self, node):
-        self.children = self.children + (node,)
+    def materialise(self):
+        self.tree.materialise(self.index)
 
     # --- MCTS:
     def select(self):
-        node = self
-        while not node.is_expandable():
-            node = max(node.children, key=ucb_score)
-        return node
+        tree = self.tree
+        index = self.index
+        path = self.path[::-1]
+        while not tree.is_leaf(index):
+            best = np.argmax(tree.ucb_scores(index))
+            index = tree.first_child[tree.stats[index]] + best
+            path.append(int(index))
+        return Node._view(tree, index, path)
 
     def expand(self, patients):
         if not self.is_expandable():
             return
 
-        hospital_copy = copy.deepcopy(self.hospital)
+        snapshot = self.snapshot
+        discharged = []
         if not self.is_root:
-            increment_timers(hospital_copy)
-            discharge_patients(hospital_copy)
+            snapshot, discharged = _simulate_discharges(snapshot.tick())
 
         possible_allocations = _allocation_combinations(
-            hospital_copy, patients
+            _interchangeable_beds(snapshot), patients
         )
         if not possible_allocations:
             print("Hospital full, cannot allocate patients")
             return
 
-        num_allocations = len(possible_allocations)
-        for combination in possible_allocations:
-            new_hospital = copy.deepcopy(hospital_copy)
-
-            for bed_name, patient in combination:
-                new_hospital.admit(patient, bed_name)
-
-            child_node = Node(
-                new_hospital,
-                prior=1 / num_allocations,
-                action=dict(combination),
-                max_tree_depth=self.max_tree_depth,
-                discount_factor=self.discount_factor,
+        tree = self.tree
+        if tree.widening is not None:
+            possible_allocations = _greedy_order(
+                snapshot, possible_allocations, patients
+            )
+        keys = None
+        if tree.hasher is not None:
+            time = snapshot.time
+            key = tree.hasher.discharge(
+                int(tree.key[self.index]), time, discharged
             )
-            self.attach_child(child_node)
+            keys = [
+                tree.hasher.admit(key, time, c) for c in possible_allocations
+            ]
+
+        num_allocations = len(possible_allocations)
+        tree.add_children(
+            self.index,
+            snapshot,
+            [1 / num_allocations] * num_allocations,
+            [dict(c) for c in possible_allocations],
+            keys,
+        )
 
     def simulate(self, arrival_simulator):
+        """
+        Runs a rollout from the node with `Simulator`, returning its rewards
+        and discounts. The arrivals are admitted as copies, so that the
+        patients of the tree are left unallocated and rollouts do not carry
+        length of stay timers over to one another.
+        """
         simulator = Simulator(
-            self.hospital, arrival_simulator, random_allocate
+            self.hospital, _unallocated(arrival_simulator), random_allocate
         )
         depth = self.max_tree_depth - self.depth
         timesteps = range(depth)
@@ -112,21 +604,49 @@ class Node(NodeMixin):
         discounts = [self.discount_factor ** t for t in timesteps]
         return rewards, discounts
 
+    def simulate_batch(self, arrivals, n_rollouts, policy="random", rng=None):
+        """
+        Runs `n_rollouts` rollouts from the node at once (see
+        agent.rollout.batched_rollouts), returning the rewards of each
+        rollout, of shape (n_rollouts, depth), and the discounts.
+        """
+        depth = self.max_tree_depth - self.depth
+        penalties = batched_rollouts(
+            self.snapshot.to_state(), arrivals, depth, n_rollouts, policy, rng
+        )
+        return 1 - penalties, self.discount_factor ** np.arange(depth)
+
     def backpropagate(self, rewards, discounts):
         """
         Value: L = R_1 + γ R_2 + ...
+
+        The discounted rewards and discounts are carried up the path, each
+        node adding its immediate reward in front of those of its child.
+        """
+        long_term = sum(r * d for r, d in zip(rewards, discounts))
+        normalisation = sum(discounts)
+        self._propagate(self.path, long_term, normalisation)
+
+    def backpropagate_value(self, value):
+        """
+        Backpropagates a visit of the node's ancestors returning the value of
+        the node, without visiting the node itself. Used for transpositions
+        of nodes that have already been simulated.
         """
         gamma = self.discount_factor
-        for node in self.iter_path_reverse():
-            rewards = [
-                node.immediate_reward,
-            ] + rewards
-            discounts = [
-                1,
-            ] + [gamma * d for d in discounts]
-            long_term = sum(r * d for r, d in zip(rewards, discounts))
-            normalisation = sum(discounts)
-            node.visit_values.append(long_term / normalisation)
+        depth = self.max_tree_depth - self.depth
+        normalisation = sum(gamma ** t for t in range(depth + 1))
+        self._propagate(self.path[1:], value * normalisation, normalisation)
+
+    def _propagate(self, path, long_term, normalisation):
+        tree = self.tree
+        gamma = self.discount_factor
+        for index in path:
+            tree.materialise(index)
+            long_term = tree.immediate_reward[index] + gamma * long_term
+            normalisation = 1 + gamma * normalisation
+            value = long_term / normalisation
+            tree.add_visits(index, 1, value, value)
 
     def __repr__(self):
         return (
@@ -141,32 +661,97 @@ def ucb_score(node):
     if node.is_root:
         raise ValueError("Cannot compute UCB score for a root node.")
 
-    ratio = math.sqrt(node.parent.visit_count) / (node.visit_count + 1)
-    prior_score = node.prior * ratio
-    return node.value + prior_score
+    tree = node.tree
+    parent = node.parent.index
+    scores = tree.ucb_scores(parent)
+    return float(scores[node.index - tree.first_child[tree.stats[parent]]])
+
+
+def _unallocated(patients):
+    for patient in patients:
+        patient = copy.copy(patient)
+        patient.bed = None
+        yield patient
 
 
-def _allocation_combinations(hospital, arrivals_t):
+def _simulate_discharges(snapshot):
     """
-    Returns possible combinations of patients to beds for a given time step.
+    Discharges patients from the snapshot as `discharge_patients` does,
+    returning the new snapshot and the discharged occupants.
     """
-    empty_beds = hospital.get_empty_beds()
-    empty_beds = [bed.name for bed in empty_beds]
-    if len(empty_beds) >= len(arrivals_t):
-        combinations = [
-            list(zip(x, arrivals_t))
-            for x in permutations(
-                empty_beds,
-                len(arrivals_t),
-            )
-        ]
-        return combinations
-    else:
-        combinations = [
-            list(zip(empty_beds, x))
-            for x in permutations(
-                arrivals_t,
-                len(empty_beds),
-            )
-        ]
-        return combinations
+    discharged = [
+        (bed_name, patient, t)
+        for bed_name, patient, t in snapshot.occupants()
+        if bernoulli(discharge_probability(patient, t))
+    ]
+    return snapshot.discharge([o[0] for o in discharged]), discharged
+
+
+def _greedy_order(snapshot, allocations, patients):
+    """
+    Returns the allocations sorted by their greedy penalty, the sum of the
+    penalties of admitting each of their patients alone (see
+    `Hospital.penalty_matrix`).
+    """
+    context = snapshot.context
+    context.checkout(snapshot)
+    beds = context.hospital.beds
+    names = sorted({bed_name for a in allocations for bed_name, _ in a})
+    matrix, _ = context.hospital.penalty_matrix(
+        patients, [beds[context.topology.index(name)] for name in names]
+    )
+    columns = {name: j for j, name in enumerate(names)}
+    rows = {id(patient): i for i, patient in enumerate(patients)}
+    penalties = [
+        sum(matrix[rows[id(p)], columns[bed_name]] for bed_name, p in a)
+        for a in allocations
+    ]
+    order = sorted(range(len(allocations)), key=penalties.__getitem__)
+    return [allocations[i] for i in order]
+
+
+def _interchangeable_beds(snapshot):
+    """
+    Returns the names of the empty beds of the snapshot, grouped into
+    classes of interchangeable beds (see agent.policy.interchangeable_beds)
+    and sorted by name within each class.
+    """
+    topology = snapshot.context.topology
+    beds = topology.hospital.beds
+    empty_beds = [beds[topology.index(name)] for name in snapshot.empty_beds()]
+    return [
+        sorted(bed.name for bed in group)
+        for group in interchangeable_beds(empty_beds).values()
+    ]
+
+
+def _allocation_combinations(bed_classes, arrivals_t):
+    """
+    Returns possible combinations of patients to beds for a given time step,
+    given the names of the empty beds grouped into classes of
+    interchangeable beds.
+
+    Beds within a class are interchangeable, so combinations only differ by
+    the class each patient is allocated to (a multiset of patients per
+    class), and the beds of a class are used in order. When there are fewer
+    empty beds than patients every bed is filled, leaving some patients
+    unallocated.
+    """
+    num_beds = sum(len(beds) for beds in bed_classes)
+    num_allocated = min(len(arrivals_t), num_beds)
+    options = list(range(len(bed_classes))) + [None]
+    combinations = []
+    for classes in product(options, repeat=len(arrivals_t)):
+        if len(arrivals_t) - classes.count(None) != num_allocated:
+            continue
+        counts = Counter(c for c in classes if c is not None)
+        if any(n > len(bed_classes[c]) for c, n in counts.items()):
+            continue
+        used = Counter()
+        combination = []
+        for patient, c in zip(arrivals_t, classes):
+            if c is not None:
+                combination.append((bed_classes[c][used[c]], patient))
+                used[c] += 1
+        combinations.append(combination)
+    return combinations
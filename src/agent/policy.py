@@ -23,8 +23,13 @@ def random_allocate(
 
     patient_queue: queue
         A queue of Patient class instances.
+
+    random_seed: int, optional
+        Seed of the `random` module. By default the module is left as it is,
+        so that seeding it makes simulations reproducible.
     """
-    random.seed(random_seed)
+    if random_seed is not None:
+        random.seed(random_seed)
 
     empty_beds = list(hospital.get_empty_beds())
     random.shuffle(empty_beds)
@@ -35,7 +40,7 @@ def random_allocate(
         except (queue.Empty, IndexError):
             break
         else:
-            bed.allocate(patient)
+            hospital.admit(patient, bed.name)
 
 
 def greedy_allocate(hospital: Hospital, patient_queue: queue.Queue):
@@ -68,15 +73,15 @@ def greedy_suggestions(
 
     suggetions = {}
     for bed_name in best_beds:
-        hospital.admit(patient, bed_name)
-        new_state = hospital.eval_restrictions()
+        with hospital.what_if():
+            hospital.admit(patient, bed_name)
+            new_state = hospital.eval_restrictions()
         suggetions[bed_name] = {
             "penalty": new_state["score"] - base_score,
             "violated_restrictions": reduce_restrictions(
                 base_restrictions, new_state["names"]
             ),
         }
-        hospital.discharge(patient)
 
     return suggetions
 
@@ -103,14 +108,9 @@ def find_best_bed(
     Returns the beds with the lowest penalty for a given patient.
     The number of beds returned is determined by the num_beds parameter.
     """
-    beds = quotient_hospital(hospital)
-    current_penalty = hospital.eval_restrictions()["score"]
-    results = []
-    for bed_name in beds.keys():
-        hospital.admit(patient, bed_name)
-        delta = hospital.eval_restrictions()["score"] - current_penalty
-        hospital.discharge(patient)
-        results.append((bed_name, delta))
+    beds = [hospital.find_bed(name) for name in quotient_hospital(hospital)]
+    penalties, _ = hospital.penalty_matrix([patient], beds)
+    results = [(bed.name, delta) for bed, delta in zip(beds, penalties[0])]
 
     best = [
         bed_name
@@ -153,6 +153,20 @@ def equivalent_beds(hospital: Hospital) -> dict:
     return equivalent_beds
 
 
+def interchangeable_beds(beds) -> dict:
+    """
+    Groups the beds into lists of interchangeable beds, the beds of the same
+    type within the same room. Moving a patient between interchangeable beds
+    does not change the penalty of the hospital, whatever the restrictions.
+    Unlike `equivalent_beds`, every bed is grouped, whatever its room type.
+    Keys are (room, bed type) pairs.
+    """
+    groups = defaultdict(list)
+    for bed in beds:
+        groups[(bed.room, type(bed))].append(bed)
+    return groups
+
+
 def quotient_hospital(hospital: Hospital) -> dict:
     """
     First empty bed in each location and the fraction
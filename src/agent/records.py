@@ -0,0 +1,155 @@
+import json
+import os
+from dataclasses import astuple, dataclass, fields
+
+import numpy as np
+
+
+@dataclass
+class StepRecord:
+    """
+    Summary of one simulated timestep (see `Simulator.iter_steps`).
+
+    Attributes
+    ----------
+    time: int
+        Number of the timestep, starting from 1.
+    score: float
+        Total penalty of the hospital at the end of the timestep.
+    admissions: int
+        Number of patients allocated a bed during the timestep.
+    discharges: int
+        Number of patients discharged during the timestep.
+    occupancy: np.ndarray
+        Number of occupied beds in each ward.
+    violations: np.ndarray
+        Number of violated restrictions in each ward, including those of its
+        rooms and patients.
+    """
+
+    time: int
+    score: float
+    admissions: int
+    discharges: int
+    occupancy: np.ndarray
+    violations: np.ndarray
+
+
+# data type of each column in the files
+_COLUMNS = {
+    f.name: float if f.name == "score" else np.int64
+    for f in fields(StepRecord)
+}
+
+
+class RecordWriter:
+    """
+    Writes StepRecords to a columnar file as they are produced, so that the
+    memory used stays flat however many timesteps are simulated.
+
+    The file is a directory holding one raw binary file per column, to which
+    the buffered records are appended every `buffer_size` records, and a
+    `columns.json` description of the columns read by `read_records`.
+
+    Attributes
+    ----------
+    path: str
+        Directory the records are written to.
+    wards: List[str]
+        Names of the wards, in the order of the per-ward columns.
+    buffer_size: int
+        Number of records held in memory before they are written.
+    """
+
+    def __init__(self, path, wards=(), buffer_size=1024):
+        self.path = path
+        self.wards = list(wards)
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._columns = None
+        os.makedirs(path, exist_ok=True)
+        for name in _COLUMNS:
+            open(os.path.join(path, f"{name}.bin"), "wb").close()
+
+    def write(self, record):
+        self._buffer.append(astuple(record))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        columns = [np.asarray(c) for c in zip(*self._buffer)]
+        if self._columns is None:
+            self._columns = {
+                name: {"dtype": np.dtype(dtype).str, "shape": c.shape[1:]}
+                for (name, dtype), c in zip(_COLUMNS.items(), columns)
+            }
+            self._write_description()
+        for (name, dtype), column in zip(_COLUMNS.items(), columns):
+            with open(os.path.join(self.path, f"{name}.bin"), "ab") as f:
+                column.astype(dtype).tofile(f)
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+        if self._columns is None:
+            self._columns = {}
+            self._write_description()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_description(self):
+        description = {"wards": self.wards, "columns": self._columns}
+        with open(os.path.join(self.path, "columns.json"), "w") as f:
+            json.dump(description, f)
+
+
+def write_records(records, path, wards=(), buffer_size=1024):
+    """
+    Writes an iterable of StepRecords to a columnar file (see RecordWriter),
+    returning the number of records written.
+    """
+    count = 0
+    with RecordWriter(path, wards, buffer_size) as writer:
+        for record in records:
+            writer.write(record)
+            count += 1
+    return count
+
+
+def read_records(path):
+    """
+    Returns the columns written by a RecordWriter, as a dictionary of arrays
+    mapped from the files rather than read into memory, with one entry per
+    record. The ward names are stored under "wards".
+
+    Records only partly written, e.g. by a simulation stopped while the
+    writer was flushing, are left out, so that every column holds the same
+    complete records.
+    """
+    with open(os.path.join(path, "columns.json")) as f:
+        description = json.load(f)
+    layouts = {}
+    for name, column in description["columns"].items():
+        file = os.path.join(path, f"{name}.bin")
+        dtype = np.dtype(column["dtype"])
+        shape = tuple(column["shape"])
+        size = dtype.itemsize * int(np.prod(shape))
+        layouts[name] = (file, dtype, shape, os.path.getsize(file) // size)
+    count = min((layout[3] for layout in layouts.values()), default=0)
+
+    columns = {"wards": description["wards"]}
+    for name, (file, dtype, shape, _) in layouts.items():
+        if count:
+            columns[name] = np.memmap(
+                file, dtype=dtype, mode="r", shape=(count,) + shape
+            )
+        else:
+            # empty files cannot be mapped
+            columns[name] = np.empty((0,) + shape, dtype=dtype)
+    return columns
@@ -0,0 +1,98 @@
+import numpy as np
+
+from agent.simulator import discharge_probabilities
+
+POLICIES = ("random", "greedy")
+
+
+def batched_rollouts(
+    state, arrivals, num_timesteps, n_rollouts, policy="random", rng=None
+):
+    """
+    Simulates independent rollouts of a hospital at once, returning the
+    penalty of each rollout after each timestep, as `Simulator.run` does for
+    a single rollout.
+
+    Each timestep follows `Simulator.simulate_once`: the length of stay
+    timers are incremented, patients are discharged with
+    `discharge_probability`, the next patient arrives in the queue and the
+    queued patients are allocated to empty beds. The rollouts are stored as
+    arrays of bed occupancy and length of stay timers with one row per
+    rollout, so that each timestep is a handful of array operations over all
+    of the rollouts, and they are scored together with
+    `HospitalState.score_batch`.
+
+    Parameters
+    ----------
+    state: hospital.state.HospitalState
+        Occupancy the rollouts start from, which is left unchanged.
+    arrivals: Sequence[hospital.people.Patient]
+        Patients arriving one per timestep, as yielded by
+        `agent.utils.arrivals_generator`.
+    num_timesteps: int
+        Number of timesteps to simulate.
+    n_rollouts: int
+        Number of rollouts to simulate.
+    policy: str
+        "random" allocates the queued patients to random empty beds, as
+        `agent.policy.random_allocate`. "greedy" allocates them to the empty
+        bed with the lowest ward and patient restriction penalty, ignoring
+        room restrictions, breaking ties at random.
+    rng: np.random.Generator, optional
+        Source of the random discharges and allocations.
+
+    Returns
+    -------
+    np.ndarray
+        Penalties of shape (n_rollouts, num_timesteps).
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown rollout policy {policy}.")
+    if rng is None:
+        rng = np.random.default_rng()
+
+    state = state.copy()
+    arrival_ids = state.add_patients(arrivals)
+    costs = None
+    if policy == "greedy":
+        costs = state.admission_penalties(arrival_ids)
+
+    bed_patient = np.tile(state.bed_patient, (n_rollouts, 1))
+    length_of_stay = np.tile(state.length_of_stay, (n_rollouts, 1))
+    expected_length_of_stay = state.expected_length_of_stay
+    # position in `arrivals` of the first patient still in the queue
+    queued = np.zeros(n_rollouts, dtype=int)
+
+    penalties = np.zeros((n_rollouts, num_timesteps))
+    for t in range(num_timesteps):
+        rows, beds = np.nonzero(bed_patient >= 0)
+        patients = bed_patient[rows, beds]
+        length_of_stay[rows, patients] += 1
+        p = discharge_probabilities(
+            length_of_stay[rows, patients],
+            expected_length_of_stay[patients],
+        )
+        discharged = rng.random(len(p)) < p
+        bed_patient[rows[discharged], beds[discharged]] = -1
+
+        num_arrived = min(t + 1, len(arrivals))
+        _allocate(bed_patient, arrival_ids, queued, num_arrived, costs, rng)
+        penalties[:, t] = state.score_batch(bed_patient)
+    return penalties
+
+
+def _allocate(bed_patient, arrival_ids, queued, num_arrived, costs, rng):
+    # allocates the queued patients in order, one patient of every rollout
+    # at a time, to a random bed among the empty (or cheapest empty) beds
+    counts = np.minimum(num_arrived - queued, (bed_patient < 0).sum(axis=1))
+    for k in range(counts.max(initial=0)):
+        allocating = np.flatnonzero(counts > k)
+        positions = queued[allocating] + k
+        candidates = bed_patient[allocating] < 0
+        if costs is not None:
+            cost = np.where(candidates, costs[positions], np.inf)
+            candidates = cost == cost.min(axis=1, keepdims=True)
+        draws = np.where(candidates, rng.random(candidates.shape), -1)
+        beds = draws.argmax(axis=1)
+        bed_patient[allocating, beds] = arrival_ids[positions]
+    queued += counts
@@ -1,4 +1,11 @@
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
 from agent.mcts import Node
+from agent.policy import interchangeable_beds
 from agent.utils import arrivals_generator, reduce_restrictions
 
 
@@ -7,6 +14,14 @@ def run_mcts(
     arrivals,
     discount_factor=0.9,
     n_iterations=100,
+    n_workers=1,
+    seed=None,
+    table_size=None,
+    root=None,
+    deadline=None,
+    callback=None,
+    widening=None,
+    n_rollouts=None,
 ):
     """
     Runs the MCTS algorithm from an initialised hospital state.
@@ -22,8 +37,43 @@ def run_mcts(
     discount_factor: float
         Weight between 0-1 to tune how important future steps are in the final
         allocation.
-    n_iterations: int
-        Number of iterations to perform before terminating the search.
+    n_iterations: int, optional
+        Number of iterations to perform before terminating the search, per
+        worker. None for no limit other than the deadline.
+    n_workers: int
+        Number of independent searches run in parallel worker processes from
+        the same root (root parallelisation). The visits and values of the
+        root children are merged into a single root node. This is the way to
+        use several cores: rollouts hold the GIL, so threads searching a
+        shared tree would not run them concurrently.
+    seed: int, optional
+        Seed from which the random seed of each worker is drawn.
+    table_size: int, optional
+        Number of entries of the transposition table, through which nodes
+        reaching the same occupancy at the same time step share their
+        statistics, e.g. 2 ** 16. None, the default, disables the table.
+    root: agent.mcts.Node, optional
+        Root returned by `reuse_tree`, whose search is continued instead of
+        starting from an empty tree. The hospital, table size and widening are
+        taken from the root.
+    deadline: float, optional
+        Time budget of the search in milliseconds. The search stops at the
+        first iteration or rollout starting after the deadline, and returns
+        the statistics gathered so far.
+    callback: Callable[[agent.mcts.Node], Any], optional
+        Called with the root after each iteration, e.g. to display the
+        current ranking of the actions (see `rank_actions`), or to save the
+        search periodically (see `agent.checkpoint.SearchCheckpoint`).
+    widening: Tuple[float, float], optional
+        Coefficient k and exponent alpha of progressive widening: nodes
+        visited N times open their ceil(k N^alpha) best children, ordered by
+        the penalty of a greedy allocation, instead of all of them. None
+        opens every child.
+    n_rollouts: int, optional
+        Number of rollouts simulated at once from each expanded node (see
+        `agent.rollout.batched_rollouts`), whose mean value is
+        backpropagated. None simulates a single rollout with
+        `agent.simulator.Simulator`.
     max_treedepth: int
         number of timesteps into the future through which to search.
 
@@ -34,38 +84,387 @@ def run_mcts(
         the current patient(s). Properties, visit_count, and value can be used
         to determine the best allocation.
     """
-    max_tree_depth = len(arrivals)
+    if n_iterations is None and deadline is None:
+        raise ValueError("Either n_iterations or deadline must be given.")
+    budget = _SearchBudget(n_iterations, deadline)
+
+    if n_workers > 1:
+        if root is not None:
+            raise ValueError("Cannot reuse a tree in parallel workers.")
+        if callback is not None:
+            raise ValueError("Cannot call back from parallel workers.")
+        return _run_root_parallel(
+            hospital,
+            arrivals,
+            discount_factor,
+            budget,
+            n_workers,
+            seed,
+            table_size,
+            widening,
+            n_rollouts,
+        )
+
+    if root is None:
+        root = Node(
+            hospital,
+            prior=0,
+            max_tree_depth=len(arrivals),
+            discount_factor=discount_factor,
+            table_size=table_size,
+            widening=widening,
+        )
+    for _ in _search(root, arrivals, budget, n_rollouts):
+        if callback is not None:
+            callback(root)
+    return root
+
+
+def iter_mcts(
+    hospital,
+    arrivals,
+    discount_factor=0.9,
+    n_iterations=100,
+    deadline=None,
+    table_size=None,
+    root=None,
+    report_every=10,
+    widening=None,
+    n_rollouts=None,
+):
+    """
+    Runs the MCTS algorithm as `run_mcts`, yielding the ranking of the
+    actions of the root (see `rank_actions`) every `report_every`
+    iterations and once the search is over, so that suggestions can be
+    displayed while the search runs.
+    """
+    if n_iterations is None and deadline is None:
+        raise ValueError("Either n_iterations or deadline must be given.")
+    if root is None:
+        root = Node(
+            hospital,
+            prior=0,
+            max_tree_depth=len(arrivals),
+            discount_factor=discount_factor,
+            table_size=table_size,
+            widening=widening,
+        )
+    budget = _SearchBudget(n_iterations, deadline)
+    search = _search(root, arrivals, budget, n_rollouts)
+    for i, _ in enumerate(search, 1):
+        if i % report_every == 0:
+            yield rank_actions(root)
+    yield rank_actions(root)
+
+
+def rank_actions(root):
+    """
+    Returns the actions of the children of the root with their visit count
+    and value, by decreasing visit count.
+    """
+    ranking = [
+        {
+            "action": child.action,
+            "visit_count": child.visit_count,
+            "value": child.value,
+        }
+        for child in root.children
+    ]
+    ranking.sort(key=lambda r: r["visit_count"], reverse=True)
+    return ranking
+
+
+class _SearchBudget:
+    """
+    Number of iterations and time left to a search.
+
+    Attributes
+    ----------
+    n_iterations: int, optional
+        Number of iterations left, None for no limit.
+    end: float, optional
+        Value of `time.monotonic()` at which the search must stop, None for
+        no limit.
+    """
+
+    def __init__(self, n_iterations=None, deadline=None):
+        self.n_iterations = n_iterations
+        self.end = None
+        if deadline is not None:
+            self.end = time.monotonic() + deadline / 1000
+
+    @property
+    def expired(self):
+        return self.end is not None and time.monotonic() >= self.end
+
+    def take(self):
+        """
+        Uses up one iteration, returns False if the budget is exhausted.
+        """
+        if self.n_iterations is not None:
+            if self.n_iterations <= 0:
+                return False
+            self.n_iterations -= 1
+        return not self.expired
+
+    def remaining(self):
+        """
+        Returns the time left in milliseconds, None if there is no deadline.
+        """
+        if self.end is None:
+            return None
+        return max(self.end - time.monotonic(), 0) * 1000
+
+
+def _search(root, arrivals, budget, n_rollouts=None):
+    """
+    Runs search iterations from the root until the budget is exhausted,
+    yielding after each iteration.
+
+    Nodes without children to simulate, at the end of the forecast, are
+    visited with their immediate reward, so that every iteration adds a
+    visit to the root and progressive widening keeps opening children.
+    Children that are transpositions of visited nodes are not simulated
+    again, their value is backpropagated instead. Batched rollouts
+    (`n_rollouts`) draw from the generator of the tree, seeded from `random`
+    by the first search, so seeded searches stay reproducible and continued
+    searches carry on with the same stream.
+    """
+    max_tree_depth = root.max_tree_depth
+    if n_rollouts is not None:
+        if root.tree.rng is None:
+            root.tree.rng = np.random.default_rng(random.getrandbits(64))
+        rng = root.tree.rng
+    while budget.take():
+        node = root.select()
+        children = []
+        if node.depth < max_tree_depth:
+            node.expand(arrivals[node.depth])
+            children = [
+                child
+                for child in node.open_children
+                if child.depth < max_tree_depth
+            ]
+        if not children:
+            # nothing to simulate past the length of the arrivals forecast
+            # (or in a full hospital), the value of the node is its
+            # immediate reward
+            node.backpropagate([], [])
+        for child in children:
+            if budget.expired:
+                break
+            if child.is_transposition and child.visit_count:
+                child.backpropagate_value(child.value)
+                continue
+            child.materialise()
+            if n_rollouts is None:
+                rewards, discounts = child.simulate(
+                    arrival_simulator=arrivals_generator(
+                        arrivals[child.depth]
+                    ),
+                )
+            else:
+                rewards, discounts = child.simulate_batch(
+                    arrivals[child.depth], n_rollouts, rng=rng
+                )
+                rewards = rewards.mean(axis=0)
+            child.backpropagate(rewards, discounts)
+        yield
+
+
+def _run_root_parallel(
+    hospital,
+    arrivals,
+    discount_factor,
+    budget,
+    n_workers,
+    seed,
+    table_size,
+    widening,
+    n_rollouts,
+):
+    seeds = random.Random(seed).sample(range(2 ** 32), n_workers)
+    args = [
+        (
+            hospital,
+            arrivals,
+            discount_factor,
+            budget.n_iterations,
+            budget.remaining(),
+            s,
+            table_size,
+            widening,
+            n_rollouts,
+        )
+        for s in seeds
+    ]
+    with ProcessPoolExecutor(n_workers) as pool:
+        results = list(pool.map(_root_statistics, *zip(*args)))
+
+    # children are expanded deterministically, so each worker's root has
+    # the same children as this one
     root = Node(
         hospital,
         prior=0,
-        max_tree_depth=max_tree_depth,
+        max_tree_depth=len(arrivals),
         discount_factor=discount_factor,
+        widening=widening,
     )
-    for _ in range(n_iterations):
-        node = root.select()
-        if node.depth >= max_tree_depth:
-            # cannot expand the past the length of the arrivals forecast
-            pass
-        else:
-            node.expand(arrivals[node.depth])
-            print(
-                f"Empty beds: {len(list(node.hospital.get_empty_beds()))}, ",
-                f"arrivals: {len(arrivals[node.depth])}",
-            )
-            for child in node.children:
-                if child.depth >= max_tree_depth:
-                    pass
-                else:
-                    rewards, discounts = child.simulate(
-                        arrival_simulator=arrivals_generator(
-                            arrivals[child.depth]
-                        ),
-                    )
-                    child.backpropagate(rewards, discounts)
-
+    root.expand(arrivals[0])
+    children = {
+        _action_key(child.action, arrivals[0]): child
+        for child in root.children
+    }
+    tree = root.tree
+    for root_statistics, child_statistics in results:
+        tree.add_visits(root.index, *root_statistics)
+        for key, statistics in child_statistics:
+            tree.add_visits(children[key].index, *statistics)
     return root
 
 
+def _root_statistics(
+    hospital,
+    arrivals,
+    discount_factor,
+    n_iterations,
+    deadline,
+    seed,
+    table_size,
+    widening,
+    n_rollouts,
+):
+    """
+    Runs a search in a worker process, returning the visit count, value sum
+    and lowest value of the root and of each of its children, identified by
+    `_action_key`.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    root = run_mcts(
+        hospital,
+        arrivals,
+        discount_factor,
+        n_iterations,
+        table_size=table_size,
+        deadline=deadline,
+        widening=widening,
+        n_rollouts=n_rollouts,
+    )
+    tree = root.tree
+
+    def statistics(node):
+        i = node.index
+        return (
+            int(tree.visit_count[i]),
+            float(tree.value_sum[i]),
+            float(tree.value_min[i]),
+        )
+
+    child_statistics = [
+        (_action_key(child.action, arrivals[0]), statistics(child))
+        for child in root.children
+    ]
+    return statistics(root), child_statistics
+
+
+def _action_key(action, patients):
+    # patients are copied between processes, identify them by position
+    positions = {id(p): i for i, p in enumerate(patients)}
+    return tuple((bed, positions[id(p)]) for bed, p in action.items())
+
+
+def reuse_tree(root, action, hospital, arrivals):
+    """
+    Returns the root of the search for the next allocation decision, keeping
+    the search effort spent below the action taken.
+
+    Parameters
+    ----------
+    root: agent.mcts.Node
+        Root of the previous search.
+    action: dict
+        Allocation taken, the action of one of the children of the root.
+    hospital: hospital.building.Hospital
+        Actual hospital at the next decision, once the allocation has been
+        admitted, timers incremented and patients discharged.
+    arrivals: List[List[Patient(...), Patient(...)]]
+        Forecasted arrivals from the next decision, usually the previous
+        forecast shifted by one time step.
+
+    Returns
+    -------
+    root: agent.mcts.Node
+        Root to pass to `run_mcts`. When the actual occupancy matches the
+        occupancy the search expanded the chosen child from, the subtree of
+        the child is kept and its siblings discarded. Otherwise the new root
+        is expanded from the actual occupancy, and only the statistics of the
+        allocations already explored are kept.
+    """
+    children = [c for c in root.children if c.action == action]
+    if not children:
+        raise ValueError(f"No child of the root takes the action {action}.")
+    child = children[0]
+    max_tree_depth = len(arrivals)
+    grandchildren = child.children
+    expanded_from = child.expanded_from
+    if expanded_from is not None:
+        if _occupancy(expanded_from.occupants()) == _occupancy(
+            (bed.name, bed.patient, bed.patient.length_of_stay)
+            for bed in hospital.occupied_beds
+        ):
+            return child.subtree(max_tree_depth)
+
+    table = root.tree.table
+    new_root = Node(
+        hospital,
+        prior=0,
+        max_tree_depth=max_tree_depth,
+        discount_factor=root.discount_factor,
+        table_size=table.capacity if table is not None else None,
+        widening=root.tree.widening,
+    )
+    tree = new_root.tree
+    tree.copy_statistics(new_root.index, child.tree, child.index)
+    if not grandchildren or not max_tree_depth:
+        return new_root
+    new_root.expand(arrivals[0])
+    bed_classes = _bed_classes(new_root.snapshot)
+    explored = {
+        _allocation_key(g.action, bed_classes, arrivals[0]): g
+        for g in grandchildren
+    }
+    for node in new_root.children:
+        key = _allocation_key(node.action, bed_classes, arrivals[0])
+        if key is not None and key in explored:
+            tree.copy_statistics(node.index, child.tree, explored[key].index)
+    return new_root
+
+
+def _occupancy(occupants):
+    return sorted(
+        (bed_name, patient.name, length_of_stay)
+        for bed_name, patient, length_of_stay in occupants
+    )
+
+
+def _bed_classes(snapshot):
+    # class of interchangeable beds of each bed, by name
+    beds = snapshot.context.topology.hospital.beds
+    groups = interchangeable_beds(beds).values()
+    return {bed.name: c for c, group in enumerate(groups) for bed in group}
+
+
+def _allocation_key(action, bed_classes, patients):
+    # allocations are equivalent if they use the same classes of beds
+    key = []
+    for bed_name, patient in action.items():
+        if patient not in patients:
+            return None
+        key.append((bed_classes[bed_name], patients.index(patient)))
+    return tuple(sorted(key))
+
+
 def construct_mcts_output(hospital, root_node, patient):
     """
     Returns an ordered dictionary of the allocation scores and violated
@@ -79,12 +478,11 @@ def construct_mcts_output(hospital, root_node, patient):
 
     allocation_scores = []
     for child in root_node.children:
-        admitted_patients = []
-        for bed_name, patient in child.action.items():
-            admitted_patients.append(patient)
-            hospital.admit(patient, bed_name)
+        with hospital.what_if():
+            for bed_name, patient in child.action.items():
+                hospital.admit(patient, bed_name)
+            hospital_eval = hospital.eval_restrictions()
 
-        hospital_eval = hospital.eval_restrictions()
         allocation_scores.append(
             {
                 "action": child.action,
@@ -96,7 +494,5 @@ def construct_mcts_output(hospital, root_node, patient):
                 "visit_count": child.visit_count,
             }
         )
-        for patient in admitted_patients:
-            hospital.discharge(patient)
 
     return allocation_scores
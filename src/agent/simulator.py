@@ -1,8 +1,15 @@
 import copy
+import os
 import queue
+import random
+from itertools import compress, count, islice
 
+import numpy as np
+from scipy.special import expit
 from tqdm import tqdm
 
+from agent.checkpoint import load_checkpoint, save_checkpoint
+from agent.records import StepRecord
 from agent.utils import bernoulli, logistic
 from hospital.building.building import Hospital
 
@@ -22,41 +29,181 @@ class Simulator:
     policy: An allocation policy function.
         Must accept a hospital and a queue as arguments
         and modify the hospital in-place.
+
+    rng: np.random.Generator
+        Source of the random discharges. Unless a seed is given, it is
+        seeded from the `random` module, so that `random.seed` makes
+        simulations reproducible.
+
+    timers: LengthOfStayTimers
+        Length of stay timers of the patients in the hospital, which are
+        incremented and discharged as arrays.
+
+    time: int
+        Number of timesteps simulated since the last reset.
+
+    num_arrivals: int
+        Number of patients drawn from the generator.
     """
 
-    def __init__(self, hospital, generator, policy):
+    def __init__(self, hospital, generator, policy, seed=None):
 
         self._original_hospital = hospital
         self.hospital = copy.deepcopy(hospital)
         self.generator = generator
         self.queue = queue.Queue()
         self.policy = policy
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.rng = np.random.default_rng(seed)
+        self.timers = LengthOfStayTimers(self.hospital)
+        self.time = 0
+        self.num_arrivals = 0
+
+    def run(
+        self,
+        num_timesteps,
+        progress_bar=True,
+        checkpoint=None,
+        checkpoint_every=100,
+    ):
+        """
+        Simulates `num_timesteps` timesteps, returning the score after each.
+
+        If a `checkpoint` path is given, the simulation is saved to it every
+        `checkpoint_every` timesteps and at the end (see `save_checkpoint`).
+        When the file already exists, the run is resumed from it instead of
+        starting over, so a stopped job can be run again with the same
+        arguments and returns the same scores.
+        """
 
-    def run(self, num_timesteps, progress_bar=True):
         def _do_nothing(x):
             return x
 
         bar = tqdm if progress_bar else _do_nothing
-        return [self.simulate_once() for _ in bar(range(num_timesteps))]
+        if checkpoint is None:
+            return [self.simulate_once() for _ in bar(range(num_timesteps))]
+
+        scores = []
+        if os.path.exists(checkpoint):
+            scores = self.load_checkpoint(checkpoint)
+            if len(scores) > num_timesteps:
+                raise ValueError(
+                    f"Checkpoint {checkpoint} is past timestep "
+                    f"{num_timesteps}."
+                )
+        for t in bar(range(len(scores), num_timesteps)):
+            scores.append(self.simulate_once())
+            if (t + 1) % checkpoint_every == 0 or t + 1 == num_timesteps:
+                self.save_checkpoint(checkpoint, scores)
+        return scores
+
+    def save_checkpoint(self, path, scores=()):
+        """
+        Writes the state of the simulation to `path`: the occupancy of the
+        hospital and the patients' timers, the queue, the random generators
+        and the number of timesteps and arrivals, with the `scores` of the
+        run so far (see agent.checkpoint.save_checkpoint).
+        """
+        save_checkpoint(
+            path,
+            hospital=self.hospital,
+            queue=list(self.queue.queue),
+            rng=self.rng.bit_generator.state,
+            time=self.time,
+            num_arrivals=self.num_arrivals,
+            scores=list(scores),
+        )
+
+    def load_checkpoint(self, path):
+        """
+        Restores the state written by `save_checkpoint`, returning the saved
+        scores. The simulator must have been created with the same
+        generator and policy as the saved one. Patients the saved simulator
+        had already drawn are skipped from the generator, so it must yield
+        the same patients as it did for the saved simulator, e.g. by drawing
+        them from its own seeded generator.
+        """
+        state = load_checkpoint(path)
+        skipped = state["num_arrivals"] - self.num_arrivals
+        if skipped < 0:
+            raise ValueError(
+                "The generator is past the arrivals of the checkpoint."
+            )
+        # keep the restored module states, whatever the skipped arrivals draw
+        random_state = random.getstate()
+        np_random_state = np.random.get_state()
+        next(islice(self.generator, skipped, skipped), None)
+        random.setstate(random_state)
+        np.random.set_state(np_random_state)
+
+        self.hospital = state["hospital"]
+        self.queue = queue.Queue()
+        for patient in state["queue"]:
+            self.queue.put(patient)
+        self.rng.bit_generator.state = state["rng"]
+        self.timers = LengthOfStayTimers(self.hospital)
+        self.time = state["time"]
+        self.num_arrivals = state["num_arrivals"]
+        return state["scores"]
+
+    def iter_steps(self, num_timesteps=None):
+        """
+        Simulates `num_timesteps` timesteps, or until stopped if None,
+        yielding a StepRecord after each one. Nothing is kept between
+        timesteps, so records can be consumed as they are produced, e.g.
+        written with `agent.records.write_records`.
+        """
+        wards = self.hospital.wards
+        positions = {ward: i for i, ward in enumerate(wards)}
+        bed_wards = np.array(
+            [positions[bed.room.ward] for bed in self.timers.beds], dtype=int
+        )
+        if num_timesteps is None:
+            steps = count()
+        else:
+            steps = range(num_timesteps)
+        for _ in steps:
+            self.time += 1
+            discharged = self.simulate_discharges()
+            remaining = self.timers.occupied.sum()
+            self.simulate_arrivals()
+            self.simulate_allocations()
+            occupied = self.timers.occupied
+            yield StepRecord(
+                time=self.time,
+                score=self.hospital.score(),
+                admissions=int(occupied.sum() - remaining),
+                discharges=len(discharged),
+                occupancy=np.bincount(
+                    bed_wards[occupied], minlength=len(wards)
+                ),
+                violations=np.array(self.hospital.violation_counts()),
+            )
 
     def simulate_once(self):
         """
         Simulate 1 timestep.
         """
+        self.time += 1
         self.simulate_discharges()
         self.simulate_arrivals()
         self.simulate_allocations()
-        return self.hospital.eval_restrictions()["score"]
+        return self.hospital.score()
 
     def simulate_arrivals(self):
         try:
             self.queue.put(next(self.generator))
         except StopIteration:
-            pass
+            return
+        self.num_arrivals += 1
 
     def simulate_discharges(self):
-        increment_timers(self.hospital)
-        discharge_patients(self.hospital)
+        """
+        Discharges patients, returning the positions of the vacated beds.
+        """
+        self.timers.increment()
+        return self.timers.discharge(self.rng)
 
     def simulate_allocations(self):
         self.policy(self.hospital, self.queue)
@@ -68,6 +215,81 @@ class Simulator:
         """
         self.hospital = copy.deepcopy(self._original_hospital)
         self.queue = queue.Queue()
+        self.timers = LengthOfStayTimers(self.hospital)
+        self.time = 0
+
+
+class LengthOfStayTimers:
+    """
+    Length of stay timers of the patients in a hospital, held as arrays by
+    bed position.
+
+    The arrays observe the allocations of the hospital (see
+    `Hospital.observe`), so that admissions and discharges made by any
+    policy are picked up as they happen. Each timestep then increments every
+    timer and draws every discharge with a few array operations, as
+    `increment_timers` and `discharge_patients` do patient by patient. The
+    structure of the hospital must not change while it is observed.
+
+    Attributes
+    ----------
+    beds: Tuple[hospital.equipment.bed.Bed]
+        Beds of the hospital, in the order of the arrays.
+    patients: List[Optional[hospital.people.Patient]]
+        Patient in each bed.
+    occupied: np.ndarray
+        Whether each bed is occupied.
+    length_of_stay: np.ndarray
+        Length of stay timer of the patient in each bed.
+    expected_length_of_stay: np.ndarray
+        Expected length of stay of the patient in each bed.
+    """
+
+    def __init__(self, hospital):
+        self.beds = hospital.beds
+        self._positions = {bed: i for i, bed in enumerate(self.beds)}
+        self.patients = [None] * len(self.beds)
+        self.occupied = np.zeros(len(self.beds), dtype=bool)
+        self.length_of_stay = np.zeros(len(self.beds), dtype=int)
+        self.expected_length_of_stay = np.zeros(len(self.beds), dtype=int)
+        for bed in hospital.occupied_beds:
+            self._update(bed, None, bed.patient)
+        hospital.observe(self._update)
+
+    def increment(self, timedelta=1):
+        """
+        Increments the timers of the patients in the hospital, writing them
+        back to the patients.
+        """
+        self.length_of_stay[self.occupied] += timedelta
+        patients = compress(self.patients, self.occupied)
+        timers = self.length_of_stay[self.occupied].tolist()
+        for patient, length_of_stay in zip(patients, timers):
+            patient.length_of_stay = length_of_stay
+
+    def discharge(self, rng):
+        """
+        Vacates the bed of each patient with probability
+        `discharge_probability`, drawing every discharge at once. Returns the
+        positions of the vacated beds.
+        """
+        p = discharge_probabilities(
+            self.length_of_stay, self.expected_length_of_stay
+        )
+        discharged = np.flatnonzero(self.occupied & (rng.random(len(p)) < p))
+        for i in discharged.tolist():
+            self.beds[i].vacate()
+        return discharged
+
+    def _update(self, bed, old_patient, new_patient):
+        i = self._positions[bed]
+        self.patients[i] = new_patient
+        self.occupied[i] = new_patient is not None
+        if new_patient is not None:
+            self.length_of_stay[i] = new_patient.length_of_stay
+            self.expected_length_of_stay[
+                i
+            ] = new_patient.expected_length_of_stay
 
 
 def increment_timers(hospital: Hospital, timedelta: int = 1):
@@ -75,6 +297,7 @@ def increment_timers(hospital: Hospital, timedelta: int = 1):
     Increments the length of stay timers on each patient within a hospital.
     """
     for patient in hospital.patients:
+        hospital.record(patient, "length_of_stay")
         patient.length_of_stay += timedelta
 
 
@@ -85,9 +308,55 @@ def discharge_patients(hospital: Hospital):
     for bed in hospital.get_occupied_beds():
         patient = bed.patient
         t = patient.length_of_stay
-        T = patient.expected_length_of_stay
-        # For testing only, otherwise logistic(2 * (t - T + 1))
-        discharge_proba = logistic(2 * (t - T + 1))  # int(t > T)
-        is_discharge = bernoulli(discharge_proba)
+        is_discharge = bernoulli(discharge_probability(patient, t))
         if is_discharge:
             bed.vacate()
+
+
+def discharge_probability(patient, length_of_stay):
+    """
+    Probability of discharging a patient after the given length of stay.
+    """
+    T = patient.expected_length_of_stay
+    # For testing only, otherwise logistic(2 * (t - T + 1))
+    return logistic(2 * (length_of_stay - T + 1))  # int(t > T)
+
+
+def discharge_probabilities(length_of_stay, expected_length_of_stay):
+    """
+    Vectorised `discharge_probability`, for arrays of length of stay timers
+    and expected lengths of stay.
+    """
+    return expit(2 * (length_of_stay - expected_length_of_stay + 1))
+
+
+def sample_discharge_delays(length_of_stay, expected_length_of_stay, rng):
+    """
+    Samples the number of timesteps after which patients are discharged, as
+    `LengthOfStayTimers` would discharge them timestep by timestep, given
+    arrays of their current length of stay timers and expected lengths of
+    stay.
+
+    The discharges of each patient are drawn for blocks of timesteps at
+    once, spanning their expected length of stay, so that most patients
+    are sampled with a single draw.
+    """
+    length_of_stay = np.asarray(length_of_stay)
+    expected_length_of_stay = np.asarray(expected_length_of_stay)
+    delays = np.zeros(len(length_of_stay), dtype=int)
+    pending = np.arange(len(length_of_stay))
+    start = 1
+    while len(pending):
+        remaining = expected_length_of_stay[pending] - length_of_stay[pending]
+        block = max(remaining.max(), 0) + 8
+        steps = np.arange(start, start + block)
+        p = discharge_probabilities(
+            length_of_stay[pending, None] + steps,
+            expected_length_of_stay[pending, None],
+        )
+        discharged = rng.random(p.shape) < p
+        found = discharged.any(axis=1)
+        delays[pending[found]] = steps[discharged[found].argmax(axis=1)]
+        pending = pending[~found]
+        start += block
+    return delays
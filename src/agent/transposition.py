@@ -0,0 +1,118 @@
+import random
+from collections import OrderedDict
+
+from agent.policy import interchangeable_beds
+
+
+class ZobristHasher:
+    """
+    Zobrist hashing of the occupancy of hospital snapshots.
+
+    Each occupied bed contributes a random 64 bit key for its (bed class,
+    patient, admission time) triple, and the hash of a snapshot is the XOR of
+    the keys of its occupied beds. Beds are replaced by their class of
+    interchangeable beds (see agent.policy.interchangeable_beds), so
+    snapshots that only differ by swapping patients between interchangeable
+    beds hash the same. As XOR is its own inverse, admitting or discharging
+    patients updates a hash with one XOR per bed.
+
+    Attributes
+    ----------
+    context: hospital.snapshot.SnapshotContext
+        Context of the snapshots being hashed.
+    bed_class: List[int]
+        Class of interchangeable beds of each bed, in bed order.
+    """
+
+    def __init__(self, context, seed=0):
+        self.context = context
+        beds = context.topology.hospital.beds
+        positions = {bed: i for i, bed in enumerate(beds)}
+        # beds left out of every class are only equivalent to themselves
+        self.bed_class = [-1 - i for i in range(len(beds))]
+        groups = interchangeable_beds(beds).values()
+        for c, group in enumerate(groups):
+            for bed in group:
+                self.bed_class[positions[bed]] = c
+        self._random = random.Random(seed)
+        self._keys = {}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # copied patients are new objects, key them by their new id
+        self._keys = {
+            (bed_class, id(patient), admitted): (key, patient)
+            for (bed_class, _, admitted), (key, patient) in self._keys.items()
+        }
+
+    def hash(self, snapshot):
+        """
+        Returns the hash of the occupancy of the snapshot.
+        """
+        return self.discharge(0, snapshot.time, snapshot.occupants())
+
+    def admit(self, value, time, allocations):
+        """
+        Returns the hash `value` updated for (bed name, patient) allocations
+        admitted at `time`, as in `OccupancySnapshot.admit`.
+        """
+        for bed_name, patient in allocations:
+            admitted = time - patient.length_of_stay
+            value ^= self._key(bed_name, patient, admitted)
+        return value
+
+    def discharge(self, value, time, occupants):
+        """
+        Returns the hash `value` updated for (bed name, patient, length of
+        stay) occupants leaving their bed at `time`, as returned by
+        `OccupancySnapshot.occupants`.
+        """
+        for bed_name, patient, length_of_stay in occupants:
+            admitted = time - length_of_stay
+            value ^= self._key(bed_name, patient, admitted)
+        return value
+
+    def _key(self, bed_name, patient, admitted):
+        bed_class = self.bed_class[self.context.topology.index(bed_name)]
+        feature = (bed_class, id(patient), admitted)
+        try:
+            return self._keys[feature][0]
+        except KeyError:
+            # keep the patient alive, so that its id is not reused
+            key = self._random.getrandbits(64)
+            self._keys[feature] = (key, patient)
+            return key
+
+
+class TranspositionTable:
+    """
+    Bounded mapping of search states to the tree node holding their
+    statistics. The least recently used entries are evicted first once the
+    table holds `capacity` entries.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.hits = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        try:
+            value = self._entries[key]
+        except KeyError:
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
@@ -1,11 +1,19 @@
-from functools import reduce
+from contextlib import contextmanager
+from itertools import chain
 
-from anytree import NodeMixin, RenderTree
+from anytree import RenderTree
 
 from hospital.exceptions import BedNotFoundError, PatientNotFoundError
+from hospital.scoring import (
+    CompiledWardRestrictions,
+    PenaltyLedger,
+    penalty_matrix,
+)
+from hospital.tree import BedContainer, alias
+from hospital.undo import UndoLog
 
 
-class Hospital(NodeMixin):
+class Hospital(BedContainer):
     """
     Hospital class for the virtual hospital.
 
@@ -16,43 +24,63 @@ class Hospital(NodeMixin):
     wards: List[hospital.building.ward.Ward]
         Wards are children of the Hospital. They can be or any type within
         hospital.building.ward.
+
+    The flattened rooms and beds are cached, and beds are indexed by name and
+    by the patient they hold, so `find_bed` and `find_patient` are constant
+    time. These are rebuilt when the tree structure changes, while the
+    patient index and occupancy views are updated in place when a bed is
+    allocated or vacated.
+
+    Changes can be tried out and reverted with `checkpoint` and `rollback`,
+    or within a `what_if` block, instead of copying the hospital.
+
+    Callbacks registered with `observe` are told about every allocation and
+    vacancy, so that derived state can be kept in sync with the beds.
     """
 
-    aliases = {"wards": "children"}
+    __slots__ = ("_undo", "_observers")
+    _transient = BedContainer._transient + ("_undo", "_observers")
+
+    wards = alias("children")
 
     def __init__(self, name, wards=None):
         super(Hospital, self).__init__()
         self.name = name
+        self._undo = UndoLog()
+        self._observers = []
         if wards:
             self.children = wards
 
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._undo = UndoLog()
+        self._observers = []
+
     def admit(self, patient, bed_name):
         bed = self.find_bed(bed_name)
         bed.allocate(patient)
+        self.record(patient, "bed")
         patient.allocate(bed)
 
     def discharge(self, patient):
         bed = self.find_patient(patient)
         bed.vacate()
+        self.record(patient, "bed")
         patient.discharge()
 
     def find_bed(self, bed_name):
         try:
-            result = next(bed for bed in self.beds if bed.name == bed_name)
-        except StopIteration:
+            return self._beds_by_name[bed_name]
+        except KeyError:
             message = f"Couldn't find any bed with name {bed_name}"
             raise BedNotFoundError(message)
-        else:
-            return result
 
     def find_patient(self, patient):
         try:
-            result = next(bed for bed in self.beds if bed.patient == patient)
-        except StopIteration:
+            return self._beds_by_patient[id(patient)]
+        except KeyError:
             message = f"Couldn't find patient {patient} in any bed."
             raise PatientNotFoundError(message)
-        else:
-            return result
 
     def render(self, maxlevel=None):
         for pre, _, node in RenderTree(self, maxlevel=maxlevel):
@@ -65,58 +93,192 @@ class Hospital(NodeMixin):
         """
         Returns the total penalty and a list of violated
         restrictions within the hospital.
+
+        Penalties are read from a ledger that only re-evaluates the wards,
+        rooms and patients affected by admissions and discharges since the
+        last call (see hospital.scoring.PenaltyLedger).
         """
-        penalties = []
-        names = []
-        entities = self.wards + self.rooms + self.patients
-        for e in entities:
-            penalties.append(e.eval_restrictions()["score"])
-            names += e.eval_restrictions()["names"]
+        ledger = self._ledger
+        return {"score": ledger.score, "names": ledger.names()}
 
-        return {"score": sum(penalties), "names": names}
+    def violation_counts(self):
+        """
+        Returns the number of violated restrictions within each ward,
+        including those of its rooms and patients, as counted by
+        `eval_restrictions`.
+        """
+        return self._ledger.ward_counts()
+
+    def score(self):
+        """
+        Returns the total penalty within the hospital, as
+        `eval_restrictions()["score"]` without building the list of violated
+        restrictions.
+        """
+        return self._ledger.score
 
     def clear(self):
         for bed in self.get_occupied_beds():
             patient = bed.patient
             bed.vacate()
+            self.record(patient, "bed")
             patient.discharge()
 
+    def checkpoint(self):
+        """
+        Opens a checkpoint and returns its identifier. Until the checkpoint
+        is rolled back or released, bed allocations and the patient changes
+        passed to `record` are logged so that they can be reverted.
+        Checkpoints can be nested.
+        """
+        return self._undo.checkpoint()
+
+    def rollback(self, checkpoint=None):
+        """
+        Reverts the changes made since the checkpoint (the latest one by
+        default), closing it and every checkpoint opened after it. Costs one
+        assignment per recorded change.
+        """
+        if checkpoint is None:
+            checkpoint = len(self._undo.checkpoints) - 1
+        self._undo.rollback(checkpoint)
+
+    def release(self, checkpoint=None):
+        """
+        Keeps the changes made since the checkpoint (the latest one by
+        default), closing it and every checkpoint opened after it.
+        """
+        if checkpoint is None:
+            checkpoint = len(self._undo.checkpoints) - 1
+        self._undo.release(checkpoint)
+
+    @contextmanager
+    def what_if(self):
+        """
+        Context manager reverting every change made to the hospital within
+        it, including when an exception is raised, e.g.
+
+        `with hospital.what_if():
+            hospital.admit(patient, bed_name)
+            score = hospital.score()`
+        """
+        checkpoint = self.checkpoint()
+        try:
+            yield self
+        finally:
+            self.rollback(checkpoint)
+
+    def observe(self, callback):
+        """
+        Calls `callback(bed, old_patient, new_patient)` whenever the patient
+        in one of the beds changes, until `unobserve` is called. Observers
+        are not copied or pickled with the hospital.
+        """
+        self._observers.append(callback)
+
+    def unobserve(self, callback):
+        self._observers.remove(callback)
+
+    def record(self, obj, attribute):
+        """
+        Logs the current value of an attribute of a patient (or any other
+        object) about to be modified, so that rolling back restores it. Does
+        nothing when no checkpoint is open.
+        """
+        if self._undo.checkpoints:
+            self._undo.record(obj, attribute, getattr(obj, attribute))
+
     def get_empty_beds(self):
-        return (bed for bed in self.beds if bed.is_available)
+        return iter(self.empty_beds)
 
     def get_occupied_beds(self):
-        return (bed for bed in self.beds if bed.is_occupied)
+        return iter(self.occupied_beds)
 
     def has_empty_beds(self):
-        return any(bed.is_available for bed in self.beds)
+        return len(self.empty_beds) > 0
+
+    def _build_index(self):
+        beds_by_name = {}
+        beds_by_patient = {}
+        for bed in self.beds:
+            # keep the first bed when names are duplicated
+            beds_by_name.setdefault(bed.name, bed)
+            if bed.patient is not None:
+                beds_by_patient[id(bed.patient)] = bed
+        self._cache["beds_by_name"] = beds_by_name
+        self._cache["beds_by_patient"] = beds_by_patient
 
-    def __setattr__(self, name, value):
-        name = self.aliases.get(name, name)
-        object.__setattr__(self, name, value)
+    def _on_occupancy_change(self, bed, old_patient, new_patient):
+        super()._on_occupancy_change(bed, old_patient, new_patient)
+        if self._undo.checkpoints:
+            self._undo.record(bed, "patient", old_patient)
+        ledger = self._cache.get("ledger")
+        if ledger is not None:
+            ledger.mark_stale(bed)
+        compiled = self._cache.get("compiled")
+        if compiled is not None:
+            compiled.update(bed)
+        for callback in self._observers:
+            callback(bed, old_patient, new_patient)
+        beds_by_patient = self._cache.get("beds_by_patient")
+        if beds_by_patient is None:
+            return
+        if beds_by_patient.get(id(old_patient)) is bed:
+            del beds_by_patient[id(old_patient)]
+        if new_patient is not None:
+            beds_by_patient[id(new_patient)] = bed
 
-    def __getattr__(self, name):
-        if name == "aliases":
-            raise AttributeError
-        name = self.aliases.get(name, name)
-        return object.__getattribute__(self, name)
+    def compile_restrictions(self):
+        """
+        Returns the vectorised evaluator of the ward restrictions within the
+        hospital (see hospital.scoring.CompiledWardRestrictions). It is kept
+        in sync with the beds until the hospital structure or the
+        restrictions change, after which a new one is compiled.
+        """
+        compiled = self._cache.get("compiled")
+        if compiled is None or not compiled.is_valid:
+            compiled = self._cache["compiled"] = CompiledWardRestrictions(self)
+        return compiled
+
+    def penalty_matrix(self, patients, beds=None):
+        """
+        Returns the change in score caused by admitting each patient to each
+        of the empty beds (or the given beds), as an array of shape
+        (len(patients), len(beds)), together with the beds matching its
+        columns. See hospital.scoring.penalty_matrix.
+        """
+        return penalty_matrix(self, patients, beds)
 
     @property
-    def rooms(self):
-        add = tuple.__add__
-        gen = (ward.rooms for ward in self.wards)
-        return reduce(add, gen, ())
+    def _ledger(self):
+        ledger = self._cache.get("ledger")
+        if ledger is None or not ledger.is_valid:
+            ledger = self._cache["ledger"] = PenaltyLedger(self)
+        return ledger
 
     @property
-    def beds(self):
-        add = tuple.__add__
-        gen = (room.beds for room in self.rooms)
-        return reduce(add, gen, ())
+    def _beds_by_name(self):
+        if "beds_by_name" not in self._cache:
+            self._build_index()
+        return self._cache["beds_by_name"]
 
     @property
-    def patients(self):
-        return tuple(
-            bed.patient for bed in self.beds if bed.patient is not None
-        )
+    def _beds_by_patient(self):
+        if "beds_by_patient" not in self._cache:
+            self._build_index()
+        return self._cache["beds_by_patient"]
+
+    def _collect_beds(self):
+        return tuple(chain.from_iterable(room.beds for room in self.rooms))
+
+    @property
+    def rooms(self):
+        try:
+            return self._cache["rooms"]
+        except KeyError:
+            gen = (ward.rooms for ward in self.wards)
+            rooms = self._cache["rooms"] = tuple(chain.from_iterable(gen))
+            return rooms
 
     def __repr__(self):
         cls = self.__class__.__name__
@@ -1,7 +1,8 @@
-from anytree import NodeMixin
+from hospital.restrictions.base import total_penalty
+from hospital.tree import BedContainer, alias
 
 
-class Room(NodeMixin):
+class Room(BedContainer):
     """
     Base class for all kind of rooms in virtual hospital.
 
@@ -18,10 +19,9 @@ class Room(NodeMixin):
         List of applicable room restrictions.
     """
 
-    aliases = {
-        "ward": "parent",
-        "beds": "children",
-    }
+    __slots__ = ()
+
+    ward = alias("parent")
 
     def __init__(
         self,
@@ -49,30 +49,27 @@ class Room(NodeMixin):
                 names += [n for _ in range(int(total_penalty / p))]
         return {"score": penalty, "names": names}
 
-    def __setattr__(self, name, value):
-        name = self.aliases.get(name, name)
-        object.__setattr__(self, name, value)
+    def score(self):
+        """
+        Returns the total penalty, as `eval_restrictions()["score"]`.
+        """
+        return total_penalty(self.restrictions, self)
+
+    def _collect_beds(self):
+        return self._children
 
-    def __getattr__(self, name):
-        if name == "aliases":
-            raise AttributeError
-        name = self.aliases.get(name, name)
-        return object.__getattribute__(self, name)
+    @BedContainer.beds.setter
+    def beds(self, beds):
+        self.children = beds
 
     def __repr__(self):
         cls = self.__class__.__name__
         return f"<{cls}(name={self.name})>"
 
-    @property
-    def patients(self):
-        return tuple(
-            bed.patient for bed in self.beds if bed.patient is not None
-        )
-
 
 class BedBay(Room):
-    pass
+    __slots__ = ()
 
 
 class SideRoom(Room):
-    pass
+    __slots__ = ()
@@ -1,11 +1,11 @@
-from functools import reduce
-
-from anytree import NodeMixin
+from itertools import chain
 
 from hospital.data import Department, Sex, Specialty
+from hospital.restrictions.base import total_penalty
+from hospital.tree import BedContainer, ScoredAttribute, alias
 
 
-class Ward(NodeMixin):
+class Ward(BedContainer):
     """
     Base class for all kind of wards in virtual hospital.
 
@@ -33,10 +33,13 @@ class Ward(NodeMixin):
         Siderooms.
     """
 
-    aliases = {
-        "hospital": "parent",
-        "rooms": "children",
-    }
+    __slots__ = ("_sex", "_department", "_specialty")
+
+    hospital = alias("parent")
+    rooms = alias("children")
+    sex = ScoredAttribute()
+    department = ScoredAttribute()
+    specialty = ScoredAttribute()
 
     def __init__(
         self,
@@ -79,31 +82,14 @@ class Ward(NodeMixin):
                 names += [n for _ in range(int(total_penalty / p))]
         return {"score": penalty, "names": names}
 
-    def __setattr__(self, name, value):
-        name = self.aliases.get(name, name)
-        object.__setattr__(self, name, value)
-
-    def __getattr__(self, name):
-        if name == "aliases":
-            raise AttributeError
-        name = self.aliases.get(name, name)
-        return object.__getattribute__(self, name)
-
-    @property
-    def beds(self):
-        add = tuple.__add__
-        gen = (room.beds for room in self.rooms)
-        return reduce(add, gen, ())
-
-    @property
-    def empty_beds(self):
-        return [bed for bed in self.beds if bed.patient is None]
-
-    @property
-    def patients(self):
-        return tuple(
-            bed.patient for bed in self.beds if bed.patient is not None
-        )
+    def score(self):
+        """
+        Returns the total penalty, as `eval_restrictions()["score"]`.
+        """
+        return total_penalty(self.restrictions, self)
+
+    def _collect_beds(self):
+        return tuple(chain.from_iterable(room.beds for room in self.rooms))
 
     def __repr__(self):
         cls = self.__class__.__name__
@@ -113,6 +99,8 @@ class Ward(NodeMixin):
 class SurgicalWard(Ward):
     """Surgical ward."""
 
+    __slots__ = ()
+
     def __init__(
         self,
         name,
@@ -131,4 +119,4 @@ class SurgicalWard(Ward):
 class MedicalWard(Ward):
     """Medical ward."""
 
-    pass
+    __slots__ = ()
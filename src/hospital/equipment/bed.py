@@ -1,9 +1,8 @@
-from anytree import NodeMixin
-
 from hospital.exceptions import BedOccupiedError
+from hospital.tree import HospitalNode, alias
 
 
-class Bed(NodeMixin):
+class Bed(HospitalNode):
     """
     Base class for Beds in virtual hospital.
 
@@ -19,11 +18,14 @@ class Bed(NodeMixin):
         Patient assigned to bed. If None then bed is considered unoccupied.
     """
 
-    aliases = {"room": "parent"}
+    __slots__ = ("_patient",)
+
+    room = alias("parent")
 
     def __init__(self, name, room=None, patient=None):
         super(Bed, self).__init__()
         self.name = name
+        self._patient = None
         self.parent = room
         self.patient = patient
 
@@ -46,16 +48,16 @@ class Bed(NodeMixin):
     def is_occupied(self):
         return not self.is_available
 
-    def __setattr__(self, name, value):
-        name = self.aliases.get(name, name)
-        object.__setattr__(self, name, value)
+    @property
+    def patient(self):
+        return self._patient
 
-    def __getattr__(self, name):
-        if name == "aliases":
-            raise AttributeError
-        name = self.aliases.get(name, name)
-        # return getattr(self, name)
-        return object.__getattribute__(self, name)
+    @patient.setter
+    def patient(self, patient):
+        old_patient = self._patient
+        self._patient = patient
+        if old_patient is not patient:
+            self._notify_occupancy_change(old_patient, patient)
 
     def __repr__(self):
         cls = self.__class__.__name__
@@ -63,4 +65,4 @@ class Bed(NodeMixin):
 
 
 class HighVisibility(Bed):
-    pass
+    __slots__ = ()
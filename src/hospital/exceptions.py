@@ -16,3 +16,7 @@ class DuplicatedBedError:
 
 class BedNotFoundError(Exception):
     pass
+
+
+class TreeLoopError(Exception):
+    pass
@@ -0,0 +1,224 @@
+from dataclasses import dataclass, fields
+
+import numpy as np
+
+from hospital.building.room import SideRoom
+from hospital.data import Department, Specialty
+from hospital.equipment.bed import HighVisibility
+
+_DEPARTMENTS = list(Department)
+_SPECIALTIES = list(Specialty)
+
+
+def _department_code(department):
+    return _DEPARTMENTS.index(department) if department is not None else -1
+
+
+def _specialty_bit(specialty):
+    return 1 << _SPECIALTIES.index(specialty) if specialty is not None else 0
+
+
+@dataclass
+class BedFeatures:
+    """
+    Array encoding of the static attributes of a sequence of beds, used by
+    the vectorised restriction evaluation. Entry i of every array describes
+    the i-th bed.
+
+    Attributes
+    ----------
+    ward: np.ndarray
+        Index of the ward of each bed in the order the wards are first seen.
+    ward_sex: np.ndarray
+        `Sex` value of the ward.
+    ward_department: np.ndarray
+        Position of the ward department in `Department`.
+    ward_specialties: np.ndarray
+        Bit mask of the ward specialties, bit k is set if the k-th
+        `Specialty` is one of the ward specialties.
+    is_side_room: np.ndarray
+        Whether the bed is in a side room.
+    is_high_visibility: np.ndarray
+        Whether the bed is a high visibility bed.
+    """
+
+    ward: np.ndarray
+    ward_sex: np.ndarray
+    ward_department: np.ndarray
+    ward_specialties: np.ndarray
+    is_side_room: np.ndarray
+    is_high_visibility: np.ndarray
+
+    @classmethod
+    def from_beds(cls, beds):
+        wards = {}
+        rows = []
+        for bed in beds:
+            ward = bed.room.ward
+            specialties = 0
+            for s in ward.specialty:
+                specialties |= _specialty_bit(s)
+            rows.append(
+                (
+                    wards.setdefault(ward, len(wards)),
+                    ward.sex.value if ward.sex is not None else -1,
+                    _department_code(ward.department),
+                    specialties,
+                    isinstance(bed.room, SideRoom),
+                    isinstance(bed, HighVisibility),
+                )
+            )
+        columns = zip(*rows) if rows else [()] * len(fields(cls))
+        dtypes = (np.int64, np.int64, np.int64, np.int64, bool, bool)
+        return cls(*(np.array(c, dtype=d) for c, d in zip(columns, dtypes)))
+
+    def __len__(self):
+        return len(self.ward)
+
+
+@dataclass
+class PatientFeatures:
+    """
+    Array encoding of the patient attributes read by the ward restrictions.
+    Entries describing no patient (e.g. the occupant of an empty bed) have
+    `is_occupied` set to False and default values elsewhere.
+
+    Attributes
+    ----------
+    is_occupied: np.ndarray
+        Whether the entry describes a patient.
+    sex: np.ndarray
+        `Sex` value of the patient.
+    department: np.ndarray
+        Position of the patient department in `Department`.
+    specialty: np.ndarray
+        Bit mask of the patient specialty (see `BedFeatures`).
+    weight: np.ndarray
+        Patient weight.
+    is_known_covid, is_suspected_covid, ..., is_high_acuity: np.ndarray
+        Patient flags.
+    """
+
+    is_occupied: np.ndarray
+    sex: np.ndarray
+    department: np.ndarray
+    specialty: np.ndarray
+    weight: np.ndarray
+    is_known_covid: np.ndarray
+    is_suspected_covid: np.ndarray
+    is_acute_surgical: np.ndarray
+    is_elective: np.ndarray
+    needs_mobility_assistence: np.ndarray
+    is_dementia_risk: np.ndarray
+    is_high_acuity: np.ndarray
+
+    _dtypes = (bool, np.int64, np.int64, np.int64, float) + (bool,) * 7
+    _empty = (False, -1, -1, 0, 70.0) + (False,) * 7
+
+    @classmethod
+    def from_patients(cls, patients):
+        """
+        Encodes a sequence of patients, where None stands for no patient.
+        """
+        rows = [cls._encode(p) for p in patients]
+        columns = zip(*rows) if rows else [()] * len(cls._dtypes)
+        return cls(
+            *(np.array(c, dtype=d) for c, d in zip(columns, cls._dtypes))
+        )
+
+    @classmethod
+    def _encode(cls, patient):
+        if patient is None:
+            return cls._empty
+        return (
+            True,
+            patient.sex.value if patient.sex is not None else -1,
+            _department_code(patient.department),
+            _specialty_bit(patient.specialty),
+            patient.weight,
+            patient.is_known_covid,
+            patient.is_suspected_covid,
+            patient.is_acute_surgical,
+            patient.is_elective,
+            patient.needs_mobility_assistence,
+            patient.is_dementia_risk,
+            patient.is_high_acuity,
+        )
+
+    def set(self, i, patient):
+        """
+        Overwrites entry i with the encoding of the patient (or None).
+        """
+        for f, value in zip(fields(self), self._encode(patient)):
+            getattr(self, f.name)[i] = value
+
+    @classmethod
+    def concatenate(cls, features):
+        """
+        Joins a sequence of encoded patients into one.
+        """
+        return cls(
+            *(
+                np.concatenate([getattr(f, column.name) for f in features])
+                for column in fields(cls)
+            )
+        )
+
+    def take(self, indices):
+        """
+        Returns the entries at the given indices.
+        """
+        return PatientFeatures(
+            *(getattr(self, f.name)[indices] for f in fields(self))
+        )
+
+    def column(self):
+        """
+        Returns the features reshaped to (n_patients, 1), so that evaluating
+        them against N beds broadcasts to a (n_patients, N) array.
+        """
+        return PatientFeatures(
+            *(getattr(self, f.name)[:, None] for f in fields(self))
+        )
+
+    def __len__(self):
+        return len(self.is_occupied)
+
+
+@dataclass
+class RoomFeatures:
+    """
+    Array encoding of the occupants of a sequence of rooms, used by the
+    vectorised room restriction evaluation. Entry i of every array describes
+    the i-th room.
+
+    Attributes
+    ----------
+    occupants: np.ndarray
+        Number of patients in the room.
+    sexes: np.ndarray
+        Bit mask of the sexes within the room, bit k is set if a patient of
+        `Sex` value k is in the room.
+    """
+
+    occupants: np.ndarray
+    sexes: np.ndarray
+
+    @classmethod
+    def from_rooms(cls, rooms):
+        occupants = []
+        sexes = []
+        for room in rooms:
+            mask = 0
+            for patient in room.patients:
+                if patient.sex is not None:
+                    mask |= 1 << patient.sex.value
+            occupants.append(len(room.patients))
+            sexes.append(mask)
+        return cls(
+            np.array(occupants, dtype=np.int64),
+            np.array(sexes, dtype=np.int64),
+        )
+
+    def __len__(self):
+        return len(self.occupants)
@@ -6,6 +6,7 @@ from warnings import warn
 import hospital.restrictions.people as R
 from hospital.data import Department, Sex, Specialty
 from hospital.equipment.bed import Bed
+from hospital.restrictions.base import RestrictionList, total_penalty
 
 
 @dataclass
@@ -46,16 +47,18 @@ class Patient:
         self.specialty = self._validate_enums(self.specialty, Specialty)
 
         # initialise restrictions
+        restrictions = list(self.restrictions)
         if self.is_immunosupressed:
-            self.restrictions.append(R.NeedsSideRoom(10))
+            restrictions.append(R.NeedsSideRoom(10))
         if self.is_end_of_life:
-            self.restrictions.append(R.NeedsSideRoom(3))
+            restrictions.append(R.NeedsSideRoom(3))
         if self.is_infection_control:
-            self.restrictions.append(R.NeedsSideRoom(4))
+            restrictions.append(R.NeedsSideRoom(4))
         if self.is_falls_risk:
-            self.restrictions.append(R.ProhibitedSideRoom(5))
+            restrictions.append(R.ProhibitedSideRoom(5))
         if self.needs_visual_supervision:
-            self.restrictions.append(R.NeedsVisualSupervision(5))
+            restrictions.append(R.NeedsVisualSupervision(5))
+        self.restrictions = RestrictionList(restrictions)
 
     def _validate_enums(self, value, enum_class):
         try:
@@ -77,6 +80,12 @@ class Patient:
                 names += [n for _ in range(int(total_penalty / p))]
         return {"score": penalty, "names": names}
 
+    def score(self):
+        """
+        Returns the total penalty, as `eval_restrictions()["score"]`.
+        """
+        return total_penalty(self.restrictions, self)
+
     def allocate(self, bed):
         if self.bed is not None:
             warn(f"Patient {self.name} is already in bed {self.bed.name}.")
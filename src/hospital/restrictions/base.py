@@ -4,10 +4,32 @@ import abc
 class BaseRestriction(abc.ABC):
     """
     Base class for all restrictions.
+
+    Changing the penalty of a restriction increments the shared `revision`
+    counter, which lets cached penalties (see hospital.scoring) detect that
+    they are out of date.
     """
 
+    revision = 0
+
     def __init__(self, penalty=0):
-        self.penalty = penalty
+        self._penalty = penalty
+
+    @classmethod
+    def touch(cls):
+        """
+        Marks every cached penalty as out of date.
+        """
+        BaseRestriction.revision += 1
+
+    @property
+    def penalty(self):
+        return self._penalty
+
+    @penalty.setter
+    def penalty(self, penalty):
+        self._penalty = penalty
+        BaseRestriction.touch()
 
     def __repr__(self):
         cls = self.__class__.__name__
@@ -32,6 +54,55 @@ class BaseRestriction(abc.ABC):
         setattr(self, "penalty", new_penalty)
 
 
+def total_penalty(restrictions, entity):
+    """
+    Returns the total penalty of the restrictions for the entity (ward, room
+    or patient), as the "score" of its `eval_restrictions` without building
+    the list of violated restrictions.
+    """
+    total = 0
+    for r in restrictions:
+        penalty = r.evaluate(entity)
+        if penalty > 0:
+            total += penalty
+    return total
+
+
+class RestrictionList(list):
+    """
+    List of restrictions which increments `BaseRestriction.revision` when it
+    is modified in place.
+    """
+
+    def _modified(method):
+        def wrapper(self, *args, **kwargs):
+            result = method(self, *args, **kwargs)
+            BaseRestriction.touch()
+            return result
+
+        wrapper.__name__ = method.__name__
+        return wrapper
+
+    append = _modified(list.append)
+    extend = _modified(list.extend)
+    insert = _modified(list.insert)
+    remove = _modified(list.remove)
+    pop = _modified(list.pop)
+    clear = _modified(list.clear)
+    sort = _modified(list.sort)
+    reverse = _modified(list.reverse)
+    __setitem__ = _modified(list.__setitem__)
+    __delitem__ = _modified(list.__delitem__)
+    __iadd__ = _modified(list.__iadd__)
+    __imul__ = _modified(list.__imul__)
+
+    del _modified
+
+    def __reduce_ex__(self, protocol):
+        # copies should not be reported as modifications
+        return (self.__class__, (list(self),))
+
+
 class WardRestriction(BaseRestriction):
     """
     Base class for ward level restrictions. These restrictions are evaluated
@@ -51,7 +122,8 @@ class WardRestriction(BaseRestriction):
     def evaluate(self, ward):
         """
         Scan through beds in the ward and penalize
-        violations to the restriction
+        violations to the restriction. Subclasses should only implement
+        `_evaluate_bed`, cached penalties are updated one bed at a time.
         """
         return sum(self._evaluate_bed(bed) for bed in ward.beds)
 
@@ -61,6 +133,24 @@ class WardRestriction(BaseRestriction):
         Determine the penalty for the bed in question.
         """
 
+    def _evaluate_features(self, beds, patients):
+        """
+        Vectorised form of `_evaluate_bed`. Returns a boolean mask of the
+        beds that are penalised when occupied by the given patients, of any
+        shape that broadcasts against the beds and patients.
+
+        Parameters
+        ----------
+        beds: hospital.features.BedFeatures
+            Encoded beds.
+        patients: hospital.features.PatientFeatures
+            Encoded occupants, either one per bed or reshaped with
+            `PatientFeatures.column` to evaluate every patient in every bed.
+
+        Restrictions which do not implement it are evaluated bed by bed.
+        """
+        raise NotImplementedError
+
 
 class RoomRestriction(BaseRestriction):
     """
@@ -92,6 +182,22 @@ class RoomRestriction(BaseRestriction):
         Determine the penalty for the room in question.
         """
 
+    def _evaluate_features(self, rooms, patients):
+        """
+        Vectorised form of `_evaluate_room`. Returns a boolean mask of the
+        rooms that are penalised once the given patients are admitted to
+        them, of any shape that broadcasts against the rooms and patients.
+
+        Parameters
+        ----------
+        rooms: hospital.features.RoomFeatures
+            Encoded rooms and their current occupants.
+        patients: hospital.features.PatientFeatures
+            Encoded patients joining the rooms, entries with `is_occupied`
+            set to False leave the room as it is.
+        """
+        raise NotImplementedError
+
 
 class PatientRestriction(BaseRestriction):
     """
@@ -117,3 +223,18 @@ class PatientRestriction(BaseRestriction):
         """
         Determine the penalty for the bed in question.
         """
+
+    def _evaluate_features(self, patient, beds):
+        """
+        Vectorised form of `_evaluate_patient`. Returns a boolean mask of the
+        beds in which the patient would be penalised, of any shape that
+        broadcasts against the beds.
+
+        Parameters
+        ----------
+        patient: hospital.people.Patient
+            Patient the restriction applies to.
+        beds: hospital.features.BedFeatures
+            Encoded beds.
+        """
+        raise NotImplementedError
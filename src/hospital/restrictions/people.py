@@ -18,6 +18,9 @@ class NeedsSideRoom(PatientRestriction):
         else:
             return 0
 
+    def _evaluate_features(self, patient, beds):
+        return ~beds.is_side_room
+
 
 class ProhibitedSideRoom(PatientRestriction):
     """
@@ -31,6 +34,9 @@ class ProhibitedSideRoom(PatientRestriction):
         else:
             return 0
 
+    def _evaluate_features(self, patient, beds):
+        return beds.is_side_room
+
 
 class NeedsVisualSupervision(PatientRestriction):
     """
@@ -47,3 +53,8 @@ class NeedsVisualSupervision(PatientRestriction):
             )
         else:
             return 0
+
+    def _evaluate_features(self, patient, beds):
+        return ~beds.is_high_visibility & bool(
+            patient.needs_visual_supervision
+        )
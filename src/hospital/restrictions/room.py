@@ -1,3 +1,5 @@
+import numpy as np
+
 from hospital.restrictions.base import RoomRestriction
 
 
@@ -14,6 +16,12 @@ class NoMixedSex(RoomRestriction):
         }
         return self.penalty if len(room_sexes) > 1 else 0
 
+    def _evaluate_features(self, rooms, patients):
+        sex = np.maximum(patients.sex, 0)
+        sexes = rooms.sexes | np.where(patients.is_occupied, 1 << sex, 0)
+        # more than one bit set
+        return (sexes & (sexes - 1)) != 0
+
 
 class KeepSideRoomEmpty(RoomRestriction):
     """
@@ -22,3 +30,6 @@ class KeepSideRoomEmpty(RoomRestriction):
 
     def _evaluate_room(self, room):
         return 0 if len(room.patients) == 0 else self.penalty
+
+    def _evaluate_features(self, rooms, patients):
+        return (rooms.occupants + patients.is_occupied) > 0
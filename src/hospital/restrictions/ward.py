@@ -2,6 +2,8 @@ from hospital.building.room import SideRoom
 from hospital.data import Department
 from hospital.restrictions.base import WardRestriction
 
+_DEPARTMENTS = list(Department)
+
 
 class NoAcuteSurgical(WardRestriction):
     """
@@ -12,6 +14,9 @@ class NoAcuteSurgical(WardRestriction):
         is_acute_surgical = getattr(bed.patient, "is_acute_surgical", False)
         return self.penalty if is_acute_surgical else 0
 
+    def _evaluate_features(self, beds, patients):
+        return patients.is_acute_surgical
+
 
 class NoKnownCovid(WardRestriction):
     """
@@ -26,6 +31,9 @@ class NoKnownCovid(WardRestriction):
         else:
             return self.penalty if known_covid else 0
 
+    def _evaluate_features(self, beds, patients):
+        return patients.is_known_covid & ~beds.is_side_room
+
 
 class NoSuspectedCovid(WardRestriction):
     """
@@ -40,6 +48,9 @@ class NoSuspectedCovid(WardRestriction):
         else:
             return self.penalty if suspected_covid else 0
 
+    def _evaluate_features(self, beds, patients):
+        return patients.is_suspected_covid & ~beds.is_side_room
+
 
 class NoNonCovid(WardRestriction):
     """
@@ -57,6 +68,10 @@ class NoNonCovid(WardRestriction):
         else:
             return 0
 
+    def _evaluate_features(self, beds, patients):
+        covid = patients.is_known_covid | patients.is_suspected_covid
+        return patients.is_occupied & ~covid & ~beds.is_side_room
+
 
 class NoPatientsOver100kg(WardRestriction):
     """
@@ -67,6 +82,9 @@ class NoPatientsOver100kg(WardRestriction):
         patient_weight = getattr(bed.patient, "weight", 70.0)
         return self.penalty if patient_weight > 100.0 else 0
 
+    def _evaluate_features(self, beds, patients):
+        return patients.weight > 100.0
+
 
 class IncorrectSex(WardRestriction):
     """
@@ -78,6 +96,9 @@ class IncorrectSex(WardRestriction):
         patient_sex = getattr(bed.patient, "sex", ward_sex)
         return self.penalty if patient_sex.value != ward_sex.value else 0
 
+    def _evaluate_features(self, beds, patients):
+        return patients.is_occupied & (patients.sex != beds.ward_sex)
+
 
 class NoMobilityAssistance(WardRestriction):
     """
@@ -91,6 +112,9 @@ class NoMobilityAssistance(WardRestriction):
         )
         return self.penalty if needs_assistence else 0
 
+    def _evaluate_features(self, beds, patients):
+        return patients.needs_mobility_assistence
+
 
 class NoDementiaRisk(WardRestriction):
     """
@@ -101,6 +125,9 @@ class NoDementiaRisk(WardRestriction):
         dementia_risk = getattr(bed.patient, "is_dementia_risk", False)
         return self.penalty if dementia_risk else 0
 
+    def _evaluate_features(self, beds, patients):
+        return patients.is_dementia_risk
+
 
 class NoHighAcuity(WardRestriction):
     """
@@ -111,6 +138,9 @@ class NoHighAcuity(WardRestriction):
         high_acuity = getattr(bed.patient, "is_high_acuity", False)
         return self.penalty if high_acuity else 0
 
+    def _evaluate_features(self, beds, patients):
+        return patients.is_high_acuity
+
 
 class NoNonElective(WardRestriction):
     """
@@ -124,6 +154,9 @@ class NoNonElective(WardRestriction):
         else:
             return 0
 
+    def _evaluate_features(self, beds, patients):
+        return patients.is_occupied & ~patients.is_elective
+
 
 class NoSurgical(WardRestriction):
     """
@@ -141,6 +174,10 @@ class NoSurgical(WardRestriction):
         else:
             return 0
 
+    def _evaluate_features(self, beds, patients):
+        surgery = _DEPARTMENTS.index(Department.surgery)
+        return patients.department == surgery
+
 
 class NoMedical(WardRestriction):
     """
@@ -158,6 +195,10 @@ class NoMedical(WardRestriction):
         else:
             return 0
 
+    def _evaluate_features(self, beds, patients):
+        medicine = _DEPARTMENTS.index(Department.medicine)
+        return patients.department == medicine
+
 
 class IncorrectSpecialty(WardRestriction):
     """
@@ -171,3 +212,7 @@ class IncorrectSpecialty(WardRestriction):
             return 0 if patient_specialty in ward_specialties else self.penalty
         else:
             return 0
+
+    def _evaluate_features(self, beds, patients):
+        matches = patients.specialty & beds.ward_specialties
+        return patients.is_occupied & (matches == 0)
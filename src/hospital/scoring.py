@@ -0,0 +1,482 @@
+import math
+from collections import Counter
+from itertools import chain
+
+import numpy as np
+
+from hospital.features import BedFeatures, PatientFeatures, RoomFeatures
+from hospital.restrictions.base import BaseRestriction, total_penalty
+
+
+class PenaltyLedger:
+    """
+    Running record of the restriction penalties within a hospital.
+
+    Penalties are recorded for every ward (one entry per bed, as ward
+    restrictions are evaluated bed by bed), room and patient. Allocating or
+    vacating a bed can only change the entries of that bed, its room and its
+    occupant, so these are marked as stale and re-evaluated the next time the
+    ledger is read. The total score is then summed again from the entries
+    with `math.fsum`, rather than updated by differences, so that it does not
+    drift from the entries through rounding (e.g. returning to exactly 0 once
+    every patient is discharged).
+
+    The ledger is only valid for the `BaseRestriction.revision` it was built
+    against. Modifying restrictions, or the ward attributes they depend on,
+    requires a new ledger (see `Hospital._ledger`).
+
+    Attributes
+    ----------
+    hospital: hospital.building.building.Hospital
+        Hospital the penalties are recorded for.
+    revision: int
+        Value of `BaseRestriction.revision` when the ledger was built.
+    """
+
+    def __init__(self, hospital):
+        self.hospital = hospital
+        self.revision = BaseRestriction.revision
+        self._bed_penalties = {}
+        self._room_penalties = {}
+        self._patient_penalties = {}
+        self._names = {}
+        self._patient_names = {}
+        self._stale = {}
+        self._score = 0
+        self._build()
+
+    @property
+    def is_valid(self):
+        return self.revision == BaseRestriction.revision
+
+    @property
+    def score(self):
+        """
+        Total penalty within the hospital.
+        """
+        if self._stale:
+            self._refresh()
+        return self._score
+
+    def names(self):
+        """
+        Returns the violated restrictions within the hospital, ordered by
+        wards, rooms and patients as in `Hospital.eval_restrictions`.
+        """
+        if self._stale:
+            self._refresh()
+        names = []
+        for e in self.hospital.wards + self.hospital.rooms:
+            names += self._entity_names(e)
+        for bed in self.hospital.occupied_beds:
+            names += self._bed_names(bed)
+        return names
+
+    def ward_counts(self):
+        """
+        Returns the number of violated restrictions within each ward,
+        counting those of the ward, of its rooms and of its patients.
+        """
+        if self._stale:
+            self._refresh()
+        counts = []
+        ward_counts = self.hospital.compile_restrictions().ward_counts()
+        for ward, count in zip(self.hospital.wards, ward_counts):
+            count += sum(len(self._entity_names(r)) for r in ward.rooms)
+            count += sum(len(self._bed_names(b)) for b in ward.occupied_beds)
+            counts.append(count)
+        return counts
+
+    def mark_stale(self, bed):
+        """
+        Marks the entries affected by a change to the occupancy of the bed.
+        """
+        self._stale[bed] = None
+
+    def _entity_names(self, entity):
+        if entity not in self._names:
+            self._names[entity] = entity.eval_restrictions()["names"]
+        return self._names[entity]
+
+    def _bed_names(self, bed):
+        # patient entries are recorded against the bed they occupy
+        if bed not in self._patient_names:
+            restrictions = bed.patient.eval_restrictions()
+            self._patient_names[bed] = restrictions["names"]
+        return self._patient_names[bed]
+
+    def _build(self):
+        beds = self.hospital.beds
+        compiled = self.hospital.compile_restrictions()
+        bed_penalties = compiled.bed_penalties().tolist()
+        self._bed_penalties = dict(zip(beds, bed_penalties))
+        for bed in self.hospital.occupied_beds:
+            patient = bed.patient
+            penalty = total_penalty(patient.restrictions, patient)
+            self._patient_penalties[bed] = penalty
+        for room in self.hospital.rooms:
+            penalty = total_penalty(room.restrictions, room)
+            self._room_penalties[room] = penalty
+        self._score = self._total()
+
+    def _refresh(self):
+        stale, self._stale = self._stale, {}
+        rooms = {}
+        for bed in stale:
+            room = bed.room
+            rooms[room] = None
+            ward_penalty = _bed_penalty(bed, room.ward.restrictions)
+            patient = bed.patient
+            patient_penalty = (
+                total_penalty(patient.restrictions, patient)
+                if patient is not None
+                else 0
+            )
+            self._bed_penalties[bed] = ward_penalty
+            self._patient_penalties[bed] = patient_penalty
+            self._names.pop(room.ward, None)
+            self._patient_names.pop(bed, None)
+
+        for room in rooms:
+            room_penalty = total_penalty(room.restrictions, room)
+            self._room_penalties[room] = room_penalty
+            self._names.pop(room, None)
+
+        self._score = self._total()
+
+    def _total(self):
+        return math.fsum(
+            chain(
+                self._bed_penalties.values(),
+                self._patient_penalties.values(),
+                self._room_penalties.values(),
+            )
+        )
+
+
+def _bed_penalty(bed, restrictions):
+    total = 0
+    for r in restrictions:
+        penalty = r._evaluate_bed(bed)
+        if penalty > 0:
+            total += penalty
+    return total
+
+
+class CompiledWardRestrictions:
+    """
+    Vectorised evaluation of the ward restrictions within a hospital.
+
+    The beds are encoded once as hospital.features.BedFeatures, and their
+    occupants as PatientFeatures which are updated in place when a bed is
+    allocated or vacated (see `update`). Ward restrictions of the same class
+    are grouped into layers holding the penalty of every bed, so that each
+    layer is evaluated as a single mask over all the beds in the hospital.
+    Restrictions without a vectorised form (`_evaluate_features`) are
+    evaluated bed by bed.
+
+    Attributes
+    ----------
+    beds: Tuple[hospital.equipment.bed.Bed]
+        Beds of the hospital, in the order of the encoded arrays.
+    wards: Tuple[hospital.building.ward.Ward]
+        Wards of the hospital.
+    features: hospital.features.BedFeatures
+        Encoded beds.
+    occupants: hospital.features.PatientFeatures
+        Encoded occupants of the beds.
+    revision: int
+        Value of `BaseRestriction.revision` when the restrictions were
+        compiled.
+    """
+
+    def __init__(self, hospital):
+        self.revision = BaseRestriction.revision
+        self.beds = hospital.beds
+        self.wards = hospital.wards
+        self.features = BedFeatures.from_beds(self.beds)
+        self.occupants = PatientFeatures.from_patients(
+            bed.patient for bed in self.beds
+        )
+        self._positions = {bed: i for i, bed in enumerate(self.beds)}
+        ward_positions = {ward: i for i, ward in enumerate(self.wards)}
+        self._bed_wards = np.array(
+            [ward_positions[bed.room.ward] for bed in self.beds],
+            dtype=np.int64,
+        )
+        self._ward_onehot = np.equal.outer(
+            self._bed_wards, np.arange(len(self.wards))
+        ).astype(float)
+        self._compile()
+
+    def _compile(self):
+        self._layers, self._ward_layers, penalties = _compile_layers(
+            self.wards
+        )
+        self._penalties = penalties[:, self._bed_wards]
+        self._vectorised = []
+        for r in self._layers:
+            try:
+                r._evaluate_features(self.features, self.occupants)
+            except NotImplementedError:
+                self._vectorised.append(False)
+            else:
+                self._vectorised.append(True)
+
+    @property
+    def is_valid(self):
+        return self.revision == BaseRestriction.revision
+
+    def update(self, bed):
+        """
+        Re-encodes the occupant of the bed.
+        """
+        self.occupants.set(self._positions[bed], bed.patient)
+
+    def position(self, bed):
+        """
+        Returns the index of the bed in the encoded arrays.
+        """
+        return self._positions[bed]
+
+    def _masks(self, patients=None, occupants=None):
+        shape = self._shape(patients, occupants)
+        if patients is not None:
+            occupants = patients.column()
+        for r, vectorised in zip(self._layers, self._vectorised):
+            if vectorised:
+                mask = r._evaluate_features(
+                    self.features,
+                    self.occupants if occupants is None else occupants,
+                )
+                yield np.broadcast_to(mask, shape)
+            elif occupants is None:
+                yield np.array(
+                    [r._evaluate_bed(bed) > 0 for bed in self.beds],
+                    dtype=bool,
+                )
+            else:
+                raise NotImplementedError(
+                    f"{r.__class__.__name__} can only be evaluated on the "
+                    "beds of the hospital."
+                )
+
+    def bed_penalties(self, patients=None, occupants=None):
+        """
+        Returns the ward restriction penalty incurred by each bed.
+
+        Parameters
+        ----------
+        patients: hospital.features.PatientFeatures, optional
+            When given, the penalty of every bed is evaluated as if it were
+            occupied by each of these patients, returning an array of shape
+            (len(patients), len(beds)).
+        occupants: hospital.features.PatientFeatures, optional
+            When given, the penalty of every bed is evaluated as if it were
+            occupied by the matching entry instead of its current occupant.
+            Occupants of shape (n, len(beds)) evaluate n occupancies at once,
+            returning an array of the same shape.
+
+        Both raise NotImplementedError if any restriction lacks a vectorised
+        form.
+        """
+        shape = self._shape(patients, occupants)
+        if not self._layers:
+            return np.zeros(shape, dtype=np.int64)
+        masks = np.stack(list(self._masks(patients, occupants)))
+        penalties = self._penalties.reshape(
+            (len(self._layers),) + (1,) * (len(shape) - 1) + shape[-1:]
+        )
+        return (masks * penalties).sum(axis=0)
+
+    def _shape(self, patients, occupants):
+        if patients is not None:
+            return (len(patients), len(self.beds))
+        if occupants is not None:
+            return np.shape(occupants.is_occupied)[:-1] + (len(self.beds),)
+        return (len(self.beds),)
+
+    def evaluate(self):
+        """
+        Returns the total penalty and the list of violated ward restrictions,
+        as the sum of `Ward.eval_restrictions` over all wards.
+        """
+        if not self._layers:
+            return {"score": 0, "names": []}
+        counts = self._layer_counts()
+        penalty = 0
+        names = []
+        for w, ward_layers in enumerate(self._ward_layers):
+            for n, p, layer in ward_layers:
+                total = _repeated_penalty(p, counts[layer][w])
+                if total > 0:
+                    penalty += total
+                    names += [n] * int(total / p)
+        return {"score": penalty, "names": names}
+
+    def ward_counts(self):
+        """
+        Returns the number of violated restrictions of each ward, as the
+        length of the names returned by `Ward.eval_restrictions`.
+        """
+        if not self._layers:
+            return [0] * len(self.wards)
+        counts = self._layer_counts()
+        ward_counts = []
+        for w, ward_layers in enumerate(self._ward_layers):
+            count = 0
+            for _, p, layer in ward_layers:
+                total = _repeated_penalty(p, counts[layer][w])
+                if total > 0:
+                    count += int(total / p)
+            ward_counts.append(count)
+        return ward_counts
+
+    def _layer_counts(self):
+        # violations per layer and ward
+        masks = np.stack(list(self._masks()))
+        return (masks @ self._ward_onehot).astype(np.int64).tolist()
+
+
+def _repeated_penalty(penalty, count):
+    # summed bed by bed, as in `WardRestriction.evaluate`, so that float
+    # penalties round to the same total (and number of names) as the wards
+    return sum([penalty] * count)
+
+
+def _compile_layers(entities):
+    """
+    Groups the restrictions of the entities (wards or rooms) by class.
+
+    Returns the representative restriction of each layer, the restrictions
+    of each entity as (name, penalty, layer index) and the penalty of each
+    layer for each entity, as an array of shape (n_layers, n_entities).
+    """
+    penalties = [r.penalty for e in entities for r in e.restrictions]
+    dtype = np.array(penalties + [0]).dtype
+    layers = {}
+    layer_penalties = []
+    entity_layers = []
+    for i, entity in enumerate(entities):
+        seen = Counter()
+        restrictions = []
+        for r in entity.restrictions:
+            key = (type(r), seen[type(r)])
+            seen[type(r)] += 1
+            if key not in layers:
+                layers[key] = r
+                layer_penalties.append(np.zeros(len(entities), dtype=dtype))
+            layer = list(layers).index(key)
+            layer_penalties[layer][i] = max(r.penalty, 0)
+            n, p = r._key()
+            restrictions.append((n, p, layer))
+        entity_layers.append(restrictions)
+    penalties = np.array(layer_penalties, dtype=dtype).reshape(
+        len(layers), len(entities)
+    )
+    return list(layers.values()), entity_layers, penalties
+
+
+def penalty_matrix(hospital, patients, beds=None):
+    """
+    Returns the change in the hospital score caused by admitting each of the
+    patients to each of the beds, one admission at a time.
+
+    Ward and patient restrictions only depend on the bed and its occupant,
+    so they are evaluated from the encoded bed and patient features. Room
+    restrictions are evaluated from a summary of the current occupants of
+    each room (see hospital.features.RoomFeatures). If any restriction lacks
+    a vectorised form, every admission is scored on the hospital instead.
+
+    Parameters
+    ----------
+    hospital: hospital.building.building.Hospital
+        Hospital the patients are admitted to.
+    patients: Sequence[hospital.people.Patient]
+        Patients to admit.
+    beds: Sequence[hospital.equipment.bed.Bed], optional
+        Empty beds to admit the patients to, all the empty beds of the
+        hospital by default.
+
+    Returns
+    -------
+    Tuple[np.ndarray, Tuple[hospital.equipment.bed.Bed]]
+        Array of shape (len(patients), len(beds)) and the beds matching its
+        columns.
+    """
+    beds = tuple(hospital.empty_beds if beds is None else beds)
+    patients = list(patients)
+    if any(bed.is_occupied for bed in beds):
+        raise ValueError("Penalties can only be evaluated for empty beds.")
+    try:
+        matrix = _vectorised_penalty_matrix(hospital, patients, beds)
+    except NotImplementedError:
+        matrix = _admission_penalty_matrix(hospital, patients, beds)
+    return matrix, beds
+
+
+def _vectorised_penalty_matrix(hospital, patients, beds):
+    shape = (len(patients), len(beds))
+    compiled = hospital.compile_restrictions()
+    features = PatientFeatures.from_patients(patients)
+    positions = [compiled.position(bed) for bed in beds]
+    # ward restrictions, only the entry of the allocated bed changes
+    before = compiled.bed_penalties()[positions]
+    after = compiled.bed_penalties(features)[:, positions]
+    matrix = np.broadcast_to(after - before, shape).astype(float)
+
+    # room restrictions, evaluated before and after the admission
+    rooms = list(dict.fromkeys(bed.room for bed in beds))
+    room_index = {room: i for i, room in enumerate(rooms)}
+    bed_rooms = np.array([room_index[bed.room] for bed in beds], dtype=int)
+    summary = RoomFeatures.from_rooms(rooms)
+    summary = RoomFeatures(
+        summary.occupants[bed_rooms], summary.sexes[bed_rooms]
+    )
+    nobody = PatientFeatures.from_patients([None])
+    layers, _, penalties = _compile_layers(rooms)
+    for r, layer_penalties in zip(layers, penalties):
+        before = np.broadcast_to(
+            r._evaluate_features(summary, nobody), (len(beds),)
+        )
+        after = np.broadcast_to(
+            r._evaluate_features(summary, features.column()), shape
+        )
+        change = after.astype(np.int64) - before
+        matrix = matrix + layer_penalties[bed_rooms] * change
+
+    # patient restrictions
+    bed_features = BedFeatures.from_beds(beds)
+    for i, patient in enumerate(patients):
+        for r in patient.restrictions:
+            mask = r._evaluate_features(patient, bed_features)
+            matrix[i] += max(r.penalty, 0) * np.broadcast_to(
+                mask, (len(beds),)
+            )
+    return _as_penalty_dtype(matrix, hospital, patients)
+
+
+def _admission_penalty_matrix(hospital, patients, beds):
+    matrix = np.zeros((len(patients), len(beds)))
+    current = hospital.score()
+    for i, patient in enumerate(patients):
+        for j, bed in enumerate(beds):
+            with hospital.what_if():
+                bed.allocate(patient)
+                hospital.record(patient, "bed")
+                patient.bed = bed
+                score = hospital.score()
+            matrix[i, j] = score - current
+    return _as_penalty_dtype(matrix, hospital, patients)
+
+
+def _as_penalty_dtype(matrix, hospital, patients):
+    # integer penalties give integer matrices, as the hospital score does
+    penalties = [
+        r.penalty
+        for e in list(hospital.wards) + list(hospital.rooms) + patients
+        for r in e.restrictions
+    ]
+    if np.array(penalties + [0]).dtype.kind in "iu":
+        return np.rint(matrix).astype(np.int64)
+    return matrix
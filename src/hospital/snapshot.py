@@ -0,0 +1,232 @@
+import copy
+
+from hospital.exceptions import BedOccupiedError
+from hospital.state import HospitalState, HospitalTopology, _copy_patient
+
+
+class SnapshotContext:
+    """
+    State shared by every OccupancySnapshot derived from the same hospital.
+
+    Snapshots are scored on a single working copy of the hospital, which is
+    brought in line with a snapshot by re-allocating only the beds of the
+    rooms that differ from the snapshot last checked out.
+
+    Attributes
+    ----------
+    topology: hospital.state.HospitalTopology
+        Structure of the hospital, including an empty copy of it.
+    hospital: hospital.building.building.Hospital
+        Working copy of the hospital.
+    locations: List[Tuple[int, int, int]]
+        Ward, room and bed index of each bed, in bed order.
+    """
+
+    def __init__(self, hospital):
+        self.topology = HospitalTopology(hospital)
+        self.hospital = copy.deepcopy(self.topology.hospital)
+        self.locations = [
+            (w, r, b)
+            for w, ward in enumerate(self.hospital.wards)
+            for r, room in enumerate(ward.rooms)
+            for b, _ in enumerate(room.beds)
+        ]
+        self._beds = [
+            [room.beds for room in ward.rooms] for ward in self.hospital.wards
+        ]
+        self.empty = tuple(
+            tuple((None,) * len(room.beds) for room in ward.rooms)
+            for ward in self.hospital.wards
+        )
+        self._checked_out = self.empty
+
+    def checkout(self, snapshot):
+        """
+        Allocates the beds of the working hospital as in the snapshot.
+        """
+        current = self._checked_out
+        if snapshot.wards is current:
+            return
+        changed = []
+        for w, (new_ward, old_ward) in enumerate(zip(snapshot.wards, current)):
+            if new_ward is old_ward:
+                continue
+            for r, (new_room, old_room) in enumerate(zip(new_ward, old_ward)):
+                if new_room is not old_room:
+                    changed.append((self._beds[w][r], new_room, old_room))
+
+        # vacate first, so patients moving between rooms end in their new bed
+        for beds, new_room, old_room in changed:
+            for bed, new, old in zip(beds, new_room, old_room):
+                if old is not None and (new is None or new[0] is not old[0]):
+                    bed.patient = None
+                    if old[0].bed is bed:
+                        old[0].bed = None
+        for beds, new_room, old_room in changed:
+            for bed, new, old in zip(beds, new_room, old_room):
+                if new is not None and (old is None or new[0] is not old[0]):
+                    bed.patient = new[0]
+                    new[0].bed = bed
+        self._checked_out = snapshot.wards
+
+
+class OccupancySnapshot:
+    """
+    Persistent occupancy of a hospital.
+
+    The occupancy is stored as nested tuples of wards, rooms and beds, where
+    each bed holds None or a (patient, admission time) pair. Snapshots are
+    never modified: admitting or discharging patients returns a new snapshot
+    that shares every ward and room it does not touch with the original, so
+    a sequence of snapshots costs a few rooms per change rather than a copy
+    of the hospital each. Length of stay timers are derived from the
+    snapshot `time`, so advancing it shares all of the wards.
+
+    Attributes
+    ----------
+    context: SnapshotContext
+        State shared with the other snapshots of the hospital.
+    wards: Tuple[Tuple[Tuple[Optional[Tuple[Patient, int]]]]]
+        Occupancy of each bed, by ward and room.
+    time: int
+        Number of time steps since the snapshot of the original hospital.
+    """
+
+    __slots__ = ("context", "wards", "time")
+
+    def __init__(self, context, wards, time=0):
+        self.context = context
+        self.wards = wards
+        self.time = time
+
+    @classmethod
+    def from_hospital(cls, hospital):
+        """
+        Takes a snapshot of the hospital, holding copies of its patients.
+        """
+        context = SnapshotContext(hospital)
+        entries = []
+        for i, bed in enumerate(hospital.beds):
+            if bed.patient is not None:
+                patient = _copy_patient(bed.patient)
+                entries.append((i, (patient, -patient.length_of_stay)))
+        return cls(context, context.empty)._allocate(entries)
+
+    def to_hospital(self):
+        """
+        Returns a new hospital holding copies of the patients in the
+        snapshot, with their length of stay timers.
+        """
+        hospital = copy.deepcopy(self.context.topology.hospital)
+        beds = hospital.beds
+        for i, (_, patient, length_of_stay) in self._occupied():
+            patient = _copy_patient(patient)
+            patient.length_of_stay = length_of_stay
+            beds[i].allocate(patient)
+            patient.allocate(beds[i])
+        return hospital
+
+    def to_state(self):
+        """
+        Returns a hospital.state.HospitalState holding the occupancy of the
+        snapshot, sharing its topology and patients.
+        """
+        state = HospitalState(self.context.topology)
+        occupied = list(self._occupied())
+        ids = state.add_patients([patient for _, (_, patient, _) in occupied])
+        state.bed_patient[[i for i, _ in occupied]] = ids
+        state.length_of_stay[ids] = [t for _, (_, _, t) in occupied]
+        return state
+
+    def occupants(self):
+        """
+        Returns the (bed name, patient, length of stay) of every occupied
+        bed, in bed order.
+        """
+        return [occupant for _, occupant in self._occupied()]
+
+    def empty_beds(self):
+        """
+        Returns the names of the empty beds, in bed order.
+        """
+        names = self.context.topology.bed_names
+        return [
+            names[i]
+            for i, (w, r, b) in enumerate(self.context.locations)
+            if self.wards[w][r][b] is None
+        ]
+
+    def admit(self, allocations):
+        """
+        Returns a new snapshot with the patients admitted, given as
+        (bed name, patient) pairs.
+        """
+        topology = self.context.topology
+        entries = []
+        for bed_name, patient in allocations:
+            i = topology.index(bed_name)
+            w, r, b = self.context.locations[i]
+            if self.wards[w][r][b] is not None:
+                raise BedOccupiedError(f"Bed {bed_name} is alreay in use.")
+            entries.append((i, (patient, self.time - patient.length_of_stay)))
+        return self._allocate(entries)
+
+    def discharge(self, bed_names):
+        """
+        Returns a new snapshot with the given beds vacated.
+        """
+        index = self.context.topology.index
+        return self._allocate((index(name), None) for name in bed_names)
+
+    def tick(self, timedelta=1):
+        """
+        Returns a new snapshot with every length of stay timer incremented.
+        """
+        return OccupancySnapshot(
+            self.context, self.wards, self.time + timedelta
+        )
+
+    def score(self):
+        """
+        Returns the total penalty, as `Hospital.score` for the hospital
+        returned by `to_hospital`.
+        """
+        self.context.checkout(self)
+        return self.context.hospital.score()
+
+    def eval_restrictions(self):
+        """
+        Returns the total penalty and the violated restrictions, as
+        `Hospital.eval_restrictions` for the hospital returned by
+        `to_hospital`.
+        """
+        self.context.checkout(self)
+        return self.context.hospital.eval_restrictions()
+
+    def _occupied(self):
+        names = self.context.topology.bed_names
+        for i, (w, r, b) in enumerate(self.context.locations):
+            entry = self.wards[w][r][b]
+            if entry is not None:
+                patient, admitted = entry
+                yield i, (names[i], patient, self.time - admitted)
+
+    def _allocate(self, entries):
+        # copy the rooms (and their wards) holding the changed beds only
+        wards = list(self.wards)
+        copied = {}
+        for i, entry in entries:
+            w, r, b = self.context.locations[i]
+            if w not in copied:
+                copied[w] = {}
+                wards[w] = list(wards[w])
+            rooms = wards[w]
+            if r not in copied[w]:
+                copied[w][r] = True
+                rooms[r] = list(rooms[r])
+            rooms[r][b] = entry
+        for w, rooms in copied.items():
+            for r in rooms:
+                wards[w][r] = tuple(wards[w][r])
+            wards[w] = tuple(wards[w])
+        return OccupancySnapshot(self.context, tuple(wards), self.time)
@@ -0,0 +1,364 @@
+import copy
+
+import numpy as np
+
+from hospital.exceptions import (
+    BedNotFoundError,
+    BedOccupiedError,
+    PatientNotFoundError,
+)
+from hospital.features import BedFeatures, PatientFeatures, RoomFeatures
+from hospital.restrictions.base import BaseRestriction, RestrictionList
+from hospital.scoring import CompiledWardRestrictions, _compile_layers
+
+
+class HospitalTopology:
+    """
+    Static encoding of the structure of a hospital, shared by every
+    HospitalState derived from it.
+
+    The restrictions are captured when the topology is built, so states
+    derived from it do not follow later changes to the restrictions of the
+    original hospital (see `is_valid`).
+
+    Attributes
+    ----------
+    hospital: hospital.building.building.Hospital
+        Copy of the hospital with every bed empty, used to build hospitals
+        from states.
+    bed_names: Tuple[str]
+        Name of each bed.
+    bed_room: np.ndarray
+        Index of the room of each bed within `hospital.rooms`.
+    bed_ward: np.ndarray
+        Index of the ward of each bed within `hospital.wards`.
+    features: hospital.features.BedFeatures
+        Encoded bed types and ward attributes.
+    revision: int
+        Value of `BaseRestriction.revision` when the topology was built.
+    """
+
+    def __init__(self, hospital):
+        self.revision = BaseRestriction.revision
+        self.hospital = copy.deepcopy(hospital)
+        for bed in self.hospital.occupied_beds:
+            bed.vacate()
+        beds = self.hospital.beds
+        rooms = {room: i for i, room in enumerate(self.hospital.rooms)}
+        wards = {ward: i for i, ward in enumerate(self.hospital.wards)}
+        self.bed_names = tuple(bed.name for bed in beds)
+        self.bed_room = np.array([rooms[b.room] for b in beds], dtype=int)
+        self.bed_ward = np.array([wards[b.room.ward] for b in beds], dtype=int)
+        self.features = BedFeatures.from_beds(beds)
+        self._bed_index = {}
+        for i, name in enumerate(self.bed_names):
+            # keep the first bed when names are duplicated, as find_bed
+            self._bed_index.setdefault(name, i)
+        self._wards = CompiledWardRestrictions(self.hospital)
+        self._room_layers, _, self._room_penalties = _compile_layers(
+            self.hospital.rooms
+        )
+        self._nobody = PatientFeatures.from_patients([None])
+
+    @property
+    def is_valid(self):
+        return self.revision == BaseRestriction.revision
+
+    def __len__(self):
+        return len(self.bed_names)
+
+    def index(self, bed_name):
+        """
+        Returns the index of the bed with the given name.
+        """
+        try:
+            return self._bed_index[bed_name]
+        except KeyError:
+            message = f"Couldn't find any bed with name {bed_name}"
+            raise BedNotFoundError(message)
+
+    def ward_penalty(self, occupants):
+        """
+        Returns the total ward restriction penalty for the beds occupied as
+        described by `occupants`, one entry per bed. Occupants of shape
+        (n, n_beds) return the penalty of each of the n occupancies.
+        """
+        return self._wards.bed_penalties(occupants=occupants).sum(axis=-1)
+
+    def ward_penalties(self, patients):
+        """
+        Returns the ward restriction penalty of each of the encoded patients
+        in each bed, as an array of shape (len(patients), n_beds).
+        """
+        return self._wards.bed_penalties(patients)
+
+    def room_penalty(self, rooms):
+        """
+        Returns the total room restriction penalty for the encoded rooms, one
+        entry per room of the hospital. Rooms of shape (n, n_rooms) return
+        the penalty of each of the n occupancies.
+        """
+        total = 0
+        for r, penalties in zip(self._room_layers, self._room_penalties):
+            mask = r._evaluate_features(rooms, self._nobody)
+            total = total + (penalties * mask).sum(axis=-1)
+        return total
+
+
+class HospitalState:
+    """
+    Array-backed occupancy of a hospital.
+
+    Every patient ever admitted to the state is given an id, the position of
+    the patient within `patients`. The bed occupancy and length of stay
+    timers are integer arrays, so copying a state copies these two arrays
+    while the topology, the patients and their encoded attributes are shared
+    (admitting a new patient replaces them instead of extending them in
+    place).
+
+    Attributes
+    ----------
+    topology: HospitalTopology
+        Structure of the hospital.
+    bed_patient: np.ndarray
+        Id of the patient in each bed, -1 for empty beds.
+    patients: Tuple[hospital.people.Patient]
+        Patients by id.
+    patient_features: hospital.features.PatientFeatures
+        Encoded patient attributes by id, followed by one entry describing
+        no patient so that empty beds (id -1) index it.
+    length_of_stay: np.ndarray
+        Length of stay timer of each patient.
+    expected_length_of_stay: np.ndarray
+        Expected length of stay of each patient.
+    """
+
+    def __init__(self, topology):
+        self.topology = topology
+        self.bed_patient = np.full(len(topology), -1, dtype=int)
+        self.patients = ()
+        self.patient_features = PatientFeatures.from_patients([None])
+        self.length_of_stay = np.zeros(0, dtype=int)
+        self.expected_length_of_stay = np.zeros(0, dtype=int)
+        self._patient_ids = {}
+        self._patient_penalties = ()
+        self._penalty_matrix = None
+
+    @classmethod
+    def from_hospital(cls, hospital, topology=None):
+        """
+        Encodes the occupancy of the hospital. A topology previously built
+        from a hospital with the same structure can be reused.
+        """
+        if topology is None:
+            topology = HospitalTopology(hospital)
+        state = cls(topology)
+        beds = [i for i, bed in enumerate(hospital.beds) if bed.is_occupied]
+        state._register([hospital.beds[i].patient for i in beds])
+        state.bed_patient[beds] = np.arange(len(beds))
+        return state
+
+    def to_hospital(self):
+        """
+        Returns a new hospital holding copies of the patients in the state,
+        with their length of stay timers.
+        """
+        hospital = copy.deepcopy(self.topology.hospital)
+        beds = hospital.beds
+        for i in self.occupied_beds.tolist():
+            patient_id = self.bed_patient[i]
+            patient = _copy_patient(self.patients[patient_id])
+            patient.length_of_stay = int(self.length_of_stay[patient_id])
+            beds[i].allocate(patient)
+            patient.allocate(beds[i])
+        return hospital
+
+    def copy(self):
+        """
+        Returns a copy of the state sharing its topology and patients.
+        """
+        state = copy.copy(self)
+        state.bed_patient = self.bed_patient.copy()
+        state.length_of_stay = self.length_of_stay.copy()
+        return state
+
+    @property
+    def empty_beds(self):
+        return np.flatnonzero(self.bed_patient < 0)
+
+    @property
+    def occupied_beds(self):
+        return np.flatnonzero(self.bed_patient >= 0)
+
+    def has_empty_beds(self):
+        return bool((self.bed_patient < 0).any())
+
+    def admit(self, patient, bed_name):
+        bed = self.topology.index(bed_name)
+        if self.bed_patient[bed] >= 0:
+            raise BedOccupiedError(f"Bed {bed_name} is alreay in use.")
+        if id(patient) not in self._patient_ids:
+            self._register([patient])
+        self.bed_patient[bed] = self._patient_ids[id(patient)]
+
+    def discharge(self, patient):
+        patient_id = self._patient_ids.get(id(patient), -1)
+        beds = np.flatnonzero(self.bed_patient == patient_id)
+        if patient_id < 0 or not len(beds):
+            message = f"Couldn't find patient {patient} in any bed."
+            raise PatientNotFoundError(message)
+        self.bed_patient[beds[0]] = -1
+
+    def vacate(self, beds):
+        """
+        Empties the beds at the given indices.
+        """
+        self.bed_patient[beds] = -1
+
+    def increment_timers(self, timedelta=1):
+        """
+        Increments the length of stay timers of the patients in the state.
+        """
+        self.length_of_stay[self.bed_patient[self.occupied_beds]] += timedelta
+
+    def occupants(self):
+        """
+        Returns the encoded occupant of each bed.
+        """
+        return self.patient_features.take(self.bed_patient)
+
+    def score(self):
+        """
+        Returns the total penalty of the hospital, as
+        `Hospital.score()` for the hospital returned by
+        `to_hospital`.
+
+        Restrictions without a vectorised form are evaluated on a hospital
+        built from the state.
+        """
+        return self.score_batch(self.bed_patient[None, :])[0].item()
+
+    def score_batch(self, bed_patient):
+        """
+        Returns the total penalty of each row of `bed_patient`, an array of
+        shape (n, n_beds) holding the id of the patient in each bed (-1 for
+        empty beds), as `score` for a state with that occupancy. The
+        occupancies are scored together, e.g. to evaluate many simulated
+        trajectories of the state at once.
+        """
+        bed_patient = np.asarray(bed_patient)
+        try:
+            return self._score_batch(bed_patient)
+        except NotImplementedError:
+            state = self.copy()
+            scores = []
+            for row in bed_patient:
+                state.bed_patient = row
+                scores.append(state.to_hospital().score())
+            return np.array(scores)
+
+    def add_patients(self, patients):
+        """
+        Gives ids to patients without admitting them, e.g. to patients
+        waiting for a bed, returning their ids.
+        """
+        start = len(self.patients)
+        self._register(patients)
+        return np.arange(start, len(self.patients))
+
+    def admission_penalties(self, patient_ids):
+        """
+        Returns the ward and patient restriction penalty of each of the
+        patients in each bed, as an array of shape (len(patient_ids),
+        n_beds). Room restrictions depend on the other occupants of the room
+        and are left out.
+        """
+        features = self.patient_features.take(patient_ids)
+        return (
+            self.topology.ward_penalties(features)
+            + self._patient_penalty_matrix()[patient_ids]
+        )
+
+    def _score_batch(self, bed_patient):
+        topology = self.topology
+        n_rooms = len(topology.hospital.rooms)
+        rows = np.arange(len(bed_patient))[:, None]
+        rooms = np.broadcast_to(topology.bed_room, bed_patient.shape)
+        occupied = bed_patient >= 0
+
+        total = topology.ward_penalty(self.patient_features.take(bed_patient))
+
+        sex = self.patient_features.sex[bed_patient]
+        bits = np.where(occupied & (sex >= 0), 1 << np.maximum(sex, 0), 0)
+        sexes = np.zeros((len(bed_patient), n_rooms), dtype=np.int64)
+        np.bitwise_or.at(sexes, (rows, rooms), bits)
+        occupants = np.zeros((len(bed_patient), n_rooms), dtype=np.int64)
+        np.add.at(occupants, (rows, rooms), occupied)
+        total = total + topology.room_penalty(RoomFeatures(occupants, sexes))
+
+        penalties = self._patient_penalty_matrix()
+        beds = np.arange(len(topology))
+        return total + penalties[bed_patient, beds].sum(axis=-1)
+
+    def _patient_penalty_matrix(self):
+        # patient restriction penalty of each patient in each bed, followed
+        # by a row of zeros for empty beds (id -1)
+        rows = self._patient_penalties
+        cache = self._penalty_matrix
+        if cache is not None and cache[0] is rows:
+            return cache[1]
+        if any(penalties is NotImplemented for penalties in rows):
+            raise NotImplementedError
+        rows = [(i, p) for i, p in enumerate(rows) if p is not None]
+        dtype = np.result_type(np.int64, *(p for _, p in rows))
+        matrix = np.zeros((len(self.patients) + 1, len(self.topology)), dtype)
+        for i, penalties in rows:
+            matrix[i] = penalties
+        self._penalty_matrix = (self._patient_penalties, matrix)
+        return matrix
+
+    def _register(self, patients):
+        start = len(self.patients)
+        self.patients = self.patients + tuple(patients)
+        self._patient_ids = dict(self._patient_ids)
+        for i, patient in enumerate(patients, start):
+            self._patient_ids[id(patient)] = i
+        self.patient_features = PatientFeatures.concatenate(
+            [
+                self.patient_features.take(slice(0, start)),
+                PatientFeatures.from_patients(list(patients) + [None]),
+            ]
+        )
+        self.length_of_stay = np.concatenate(
+            [self.length_of_stay, [p.length_of_stay for p in patients]]
+        ).astype(int)
+        self.expected_length_of_stay = np.concatenate(
+            [
+                self.expected_length_of_stay,
+                [p.expected_length_of_stay for p in patients],
+            ]
+        ).astype(int)
+        self._patient_penalties = self._patient_penalties + tuple(
+            self._bed_penalties(p) for p in patients
+        )
+
+    def _bed_penalties(self, patient):
+        # penalty of the patient restrictions in each bed
+        if not patient.restrictions:
+            return None
+        penalties = np.zeros(len(self.topology), dtype=np.int64)
+        try:
+            for r in patient.restrictions:
+                mask = r._evaluate_features(patient, self.topology.features)
+                penalties = penalties + max(r.penalty, 0) * mask
+        except NotImplementedError:
+            return NotImplemented
+        return penalties
+
+
+def _copy_patient(patient):
+    # the copy is not allocated, and its restrictions can be changed freely
+    patient = copy.copy(patient)
+    patient.restrictions = RestrictionList(patient.restrictions)
+    patient.bed = None
+    return patient
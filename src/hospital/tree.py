@@ -0,0 +1,287 @@
+from operator import attrgetter
+
+from hospital.exceptions import TreeLoopError
+from hospital.restrictions.base import BaseRestriction, RestrictionList
+
+
+def alias(name):
+    """
+    Returns a property exposing the tree attribute `name` under another
+    name (e.g. `bed.room` for `bed.parent`). Reads go straight to the
+    underlying slot, assignments go through the `name` property.
+    """
+
+    def fset(node, value):
+        setattr(node, name, value)
+
+    return property(attrgetter(f"_{name}"), fset)
+
+
+class ScoredAttribute:
+    """
+    Node attribute read by the restrictions. Assigning it marks cached
+    penalties as out of date (see `BaseRestriction.revision`).
+
+    The value is stored in the slot of the same name prefixed with an
+    underscore, after being passed through `convert` if given.
+    """
+
+    def __init__(self, convert=None):
+        self.convert = convert
+
+    def __set_name__(self, owner, name):
+        self.slot = f"_{name}"
+        self._get = attrgetter(self.slot)
+
+    def __get__(self, node, owner=None):
+        if node is None:
+            return self
+        return self._get(node)
+
+    def __set__(self, node, value):
+        if self.convert is not None:
+            value = self.convert(value)
+        setattr(node, self.slot, value)
+        BaseRestriction.touch()
+
+
+def _restriction_list(restrictions):
+    if isinstance(restrictions, RestrictionList):
+        return restrictions
+    return RestrictionList(restrictions)
+
+
+_STATE_SLOTS = {}
+
+
+def _state_slots(cls):
+    # slots copied and pickled with the node, transient ones are left out
+    try:
+        return _STATE_SLOTS[cls]
+    except KeyError:
+        slots = [
+            name
+            for c in cls.__mro__
+            for name in c.__dict__.get("__slots__", ())
+            if name not in cls._transient + ("__dict__", "__weakref__")
+        ]
+        _STATE_SLOTS[cls] = slots
+        return slots
+
+
+class HospitalNode:
+    """
+    Base class for the nodes of the virtual hospital tree (hospital, wards,
+    rooms and beds).
+
+    Nodes hold their `parent` and `children` directly in slots, children as
+    a tuple. Assigning either keeps both ends of the link in sync, in the
+    same way as anytree.NodeMixin. Whenever the structure of the tree
+    changes, or a bed is allocated or vacated, the ancestors of the affected
+    node are notified so that they can keep cached views and indexes in
+    sync.
+
+    Subclasses declare their attributes in `__slots__`, and expose the tree
+    links under domain names with `alias` (e.g. `bed.room`).
+    """
+
+    __slots__ = ("name", "_parent", "_children")
+    # slots left out of copies and pickles, reset by `__setstate__`
+    _transient = ()
+
+    def __init__(self):
+        self._parent = None
+        self._children = ()
+
+    @property
+    def parent(self):
+        return self._parent
+
+    @parent.setter
+    def parent(self, parent):
+        old_parent = self._parent
+        if parent is old_parent:
+            return
+        if parent is not None:
+            self._check_loop(parent)
+        if old_parent is not None:
+            old_parent._children = tuple(
+                c for c in old_parent._children if c is not self
+            )
+            self._parent = None
+            old_parent._on_structure_change()
+        if parent is not None:
+            parent._children = parent._children + (self,)
+            self._parent = parent
+            parent._on_structure_change()
+
+    @property
+    def children(self):
+        return self._children
+
+    @children.setter
+    def children(self, children):
+        children = tuple(children)
+        if len({id(c) for c in children}) < len(children):
+            raise ValueError("Cannot add the same node twice as a child.")
+        for child in children:
+            if not isinstance(child, HospitalNode):
+                raise TypeError(f"Cannot add non-node object {child!r}.")
+            child._check_loop(self)
+
+        for child in self._children:
+            child._parent = None
+        for child in children:
+            old_parent = child._parent
+            if old_parent is not None:
+                old_parent._children = tuple(
+                    c for c in old_parent._children if c is not child
+                )
+                old_parent._on_structure_change()
+            child._parent = self
+        self._children = children
+        self._on_structure_change()
+
+    def _check_loop(self, parent):
+        node = parent
+        while node is not None:
+            if node is self:
+                raise TreeLoopError(
+                    f"Cannot set parent, {self!r} is an ancestor of "
+                    f"{parent!r}."
+                )
+            node = node._parent
+
+    def _on_structure_change(self):
+        """
+        Called when a descendant of the node is attached or detached.
+        """
+        self._clear_cache()
+        if self._parent is not None:
+            self._parent._on_structure_change()
+
+    def _on_occupancy_change(self, bed, old_patient, new_patient):
+        """
+        Called when the patient assigned to a descendant bed changes.
+        """
+
+    def _notify_occupancy_change(self, old_patient, new_patient):
+        node = self._parent
+        while node is not None:
+            node._on_occupancy_change(self, old_patient, new_patient)
+            node = node._parent
+
+    def _clear_cache(self):
+        pass
+
+    def __getstate__(self):
+        state = dict(getattr(self, "__dict__", {}))
+        for name in _state_slots(type(self)):
+            try:
+                state[name] = getattr(self, name)
+            except AttributeError:
+                pass
+        return state
+
+    def __setstate__(self, state):
+        self._clear_cache()
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+
+class BedContainer(HospitalNode):
+    """
+    Base class for nodes holding beds (hospitals, wards and rooms).
+
+    Views and indexes are cached in the `_cache` dictionary, which is not
+    copied or pickled. The flattened `beds` view is cached until the
+    structure of the subtree changes. The occupied and empty beds are
+    tracked as ordered sets that are updated in place whenever one of the
+    beds is allocated or vacated; the `patients`, `occupied_beds` and
+    `empty_beds` tuples are materialised from them on first access, in bed
+    order.
+    """
+
+    __slots__ = ("_cache", "_restrictions")
+    _transient = ("_cache",)
+
+    restrictions = ScoredAttribute(_restriction_list)
+
+    def __init__(self):
+        super().__init__()
+        self._cache = {}
+
+    def _clear_cache(self):
+        self._cache = {}
+
+    def _collect_beds(self):
+        """
+        Returns the beds within the node, in tree order.
+        """
+        raise NotImplementedError
+
+    def _build_occupancy(self):
+        beds = self.beds
+        cache = self._cache
+        cache["positions"] = {bed: i for i, bed in enumerate(beds)}
+        cache["occupied"] = dict.fromkeys(b for b in beds if b.is_occupied)
+        cache["empty"] = dict.fromkeys(b for b in beds if b.is_available)
+
+    def _ordered(self, bed_set):
+        positions = self._cache["positions"]
+        return tuple(sorted(bed_set, key=positions.__getitem__))
+
+    def _on_occupancy_change(self, bed, old_patient, new_patient):
+        cache = self._cache
+        occupied = cache.get("occupied")
+        if occupied is not None:
+            empty = cache["empty"]
+            if new_patient is None:
+                occupied.pop(bed, None)
+                empty[bed] = None
+            else:
+                empty.pop(bed, None)
+                occupied[bed] = None
+        cache.pop("occupied_beds", None)
+        cache.pop("empty_beds", None)
+        cache.pop("patients", None)
+
+    @property
+    def beds(self):
+        try:
+            return self._cache["beds"]
+        except KeyError:
+            beds = self._cache["beds"] = self._collect_beds()
+            return beds
+
+    @property
+    def occupied_beds(self):
+        try:
+            return self._cache["occupied_beds"]
+        except KeyError:
+            if "occupied" not in self._cache:
+                self._build_occupancy()
+            beds = self._ordered(self._cache["occupied"])
+            self._cache["occupied_beds"] = beds
+            return beds
+
+    @property
+    def empty_beds(self):
+        try:
+            return self._cache["empty_beds"]
+        except KeyError:
+            if "empty" not in self._cache:
+                self._build_occupancy()
+            beds = self._ordered(self._cache["empty"])
+            self._cache["empty_beds"] = beds
+            return beds
+
+    @property
+    def patients(self):
+        try:
+            return self._cache["patients"]
+        except KeyError:
+            beds = self.occupied_beds
+            patients = tuple(bed.patient for bed in beds)
+            self._cache["patients"] = patients
+            return patients
@@ -0,0 +1,70 @@
+class UndoLog:
+    """
+    Log of the changes made to a hospital since the oldest open checkpoint.
+
+    Each entry records an object, one of its attributes and the value the
+    attribute held before the change. Rolling back restores the values in
+    reverse order, so reverting costs one assignment per recorded change.
+
+    Attributes
+    ----------
+    entries: List[Tuple[Any, str, Any]]
+        Recorded (object, attribute, previous value) changes.
+    checkpoints: List[int]
+        Position within `entries` of each open checkpoint, oldest first.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.checkpoints = []
+        self._paused = False
+
+    def record(self, obj, attribute, value):
+        if not self._paused:
+            self.entries.append((obj, attribute, value))
+
+    def checkpoint(self):
+        """
+        Opens a checkpoint and returns its identifier.
+        """
+        self.checkpoints.append(len(self.entries))
+        return len(self.checkpoints) - 1
+
+    def rollback(self, checkpoint):
+        """
+        Reverts the changes recorded since the checkpoint, closing it and
+        every checkpoint opened after it.
+        """
+        position = self._close(checkpoint)
+        self._paused = True
+        try:
+            while len(self.entries) > position:
+                obj, attribute, value = self.entries.pop()
+                setattr(obj, attribute, value)
+        finally:
+            self._paused = False
+        self._trim()
+
+    def release(self, checkpoint):
+        """
+        Keeps the changes recorded since the checkpoint, closing it and every
+        checkpoint opened after it.
+        """
+        self._close(checkpoint)
+        self._trim()
+
+    @property
+    def is_open(self):
+        return bool(self.checkpoints)
+
+    def _close(self, checkpoint):
+        if not 0 <= checkpoint < len(self.checkpoints):
+            raise ValueError(f"Checkpoint {checkpoint} is not open.")
+        position = self.checkpoints[checkpoint]
+        del self.checkpoints[checkpoint:]
+        return position
+
+    def _trim(self):
+        # changes only need to be kept while a checkpoint may revert them
+        if not self.checkpoints:
+            self.entries.clear()
@@ -0,0 +1,19 @@
+import pytest
+
+from hospital.people import Patient
+
+
+@pytest.fixture
+def arrivals():
+    """
+    Forecast of three timesteps, the first holding the patient being
+    allocated.
+    """
+    return [
+        [Patient("A0", sex="male", department="medicine")],
+        [
+            Patient("A1", sex="female", department="surgery"),
+            Patient("A2", sex="female", department="medicine"),
+        ],
+        [Patient("A3", sex="male", department="surgery")],
+    ]
@@ -0,0 +1,123 @@
+"""
+Test suite for the `agent.checkpoint` module and `Simulator` checkpoints.
+"""
+import random
+
+import numpy as np
+import pytest
+
+from agent.checkpoint import SearchCheckpoint, load_search
+from agent.policy import random_allocate
+from agent.run_mcts import run_mcts
+from agent.simulator import Simulator
+from hospital.people import Patient
+
+
+class _Stop(Exception):
+    pass
+
+
+def _arrivals(seed):
+    rng = random.Random(seed)
+    for i in range(1000):
+        yield Patient(
+            f"A{i}",
+            sex=rng.choice(["male", "female"]),
+            department=rng.choice(["medicine", "surgery"]),
+            expected_length_of_stay=rng.randrange(1, 5),
+        )
+
+
+def _stopping_policy(n_calls):
+    # allocates as random_allocate, stopping the job at the given call
+    calls = []
+
+    def policy(hospital, patient_queue):
+        calls.append(None)
+        if len(calls) > n_calls:
+            raise _Stop
+        random_allocate(hospital, patient_queue)
+
+    return policy
+
+
+def _tree(node):
+    return [
+        node.visit_count,
+        node.value,
+        [_tree(child) for child in node.children],
+    ]
+
+
+def test_simulator_checkpoint(small_hospital, tmp_path):
+    path = str(tmp_path / "simulation.pkl")
+    random.seed(5)
+    simulator = Simulator(small_hospital, _arrivals(1), random_allocate, 0)
+    scores = simulator.run(30, progress_bar=False)
+
+    random.seed(5)
+    stopped = Simulator(small_hospital, _arrivals(1), _stopping_policy(17), 0)
+    with pytest.raises(_Stop):
+        stopped.run(30, False, checkpoint=path, checkpoint_every=5)
+
+    # resumed from timestep 15, whatever the state of the process
+    random.seed(123)
+    np.random.seed(123)
+    resumed = Simulator(small_hospital, _arrivals(1), random_allocate, 0)
+    assert resumed.run(30, False, checkpoint=path) == scores
+    assert resumed.time == simulator.time
+    assert resumed.num_arrivals == simulator.num_arrivals
+    assert [p.name for p in resumed.hospital.patients] == [
+        p.name for p in simulator.hospital.patients
+    ]
+    with pytest.raises(ValueError):
+        Simulator(small_hospital, _arrivals(1), random_allocate).run(
+            20, False, checkpoint=path
+        )
+
+
+@pytest.mark.parametrize(
+    "n_rollouts, table_size", [(None, None), (4, None), (None, 64)]
+)
+def test_search_checkpoint(
+    small_hospital, arrivals, tmp_path, n_rollouts, table_size
+):
+    path = str(tmp_path / "search.pkl")
+    random.seed(0)
+    root = run_mcts(
+        small_hospital,
+        arrivals,
+        n_iterations=40,
+        n_rollouts=n_rollouts,
+        table_size=table_size,
+    )
+
+    checkpoint = SearchCheckpoint(path, arrivals, every=10)
+
+    def callback(root):
+        checkpoint(root)
+        if checkpoint.n_iterations == 25:
+            raise _Stop
+
+    random.seed(0)
+    with pytest.raises(_Stop):
+        run_mcts(
+            small_hospital,
+            arrivals,
+            n_iterations=40,
+            n_rollouts=n_rollouts,
+            table_size=table_size,
+            callback=callback,
+        )
+
+    random.seed(77)
+    resumed, resumed_arrivals, done = load_search(path)
+    assert done == 20
+    resumed = run_mcts(
+        small_hospital,
+        resumed_arrivals,
+        n_iterations=40 - done,
+        n_rollouts=n_rollouts,
+        root=resumed,
+    )
+    assert _tree(resumed) == _tree(root)
@@ -0,0 +1,67 @@
+"""
+Test suite for the `agent.ensemble` module.
+"""
+import random
+
+import numpy as np
+
+from agent import ensemble
+from agent.ensemble import run_ensemble
+from agent.policy import random_allocate
+from hospital.people import Patient
+
+
+def _arrivals(rng):
+    # module level, so that it can be sent to worker processes
+    for i in range(1000):
+        yield Patient(
+            f"A{i}",
+            sex=rng.choice(["male", "female"]),
+            department=rng.choice(["medicine", "surgery"]),
+            expected_length_of_stay=int(rng.integers(1, 5)),
+        )
+
+
+def test_run_ensemble_workers(small_hospital):
+    summaries = [
+        run_ensemble(
+            small_hospital, _arrivals, random_allocate, 6, 5, n_workers=n
+        )
+        for n in [1, 2]
+    ]
+    for name in ["penalty", "occupancy", "violations"]:
+        np.testing.assert_array_equal(
+            getattr(summaries[0], name), getattr(summaries[1], name)
+        )
+
+
+def test_run_ensemble_summary(small_hospital):
+    summary = run_ensemble(
+        small_hospital,
+        _arrivals,
+        random_allocate,
+        8,
+        10,
+        seed=1,
+        percentiles=(0, 50, 100),
+    )
+    assert summary.percentiles == (0, 50, 100)
+    for values in [summary.penalty, summary.occupancy, summary.violations]:
+        assert values.shape == (3, 8)
+        assert (np.diff(values, axis=0) >= 0).all()
+    assert (summary.occupancy <= len(small_hospital.beds)).all()
+    assert summary.penalty[-1].max() > 0
+
+    # a single replication is its own distribution
+    single = run_ensemble(small_hospital, _arrivals, random_allocate, 8, 1)
+    assert (single.penalty == single.penalty[0]).all()
+
+
+def test_run_ensemble_leaves_process_state(small_hospital):
+    random.seed(0)
+    np.random.seed(0)
+    states = random.getstate(), np.random.get_state()[1].copy()
+    run_ensemble(small_hospital, _arrivals, random_allocate, 3, 2)
+    assert random.getstate() == states[0]
+    np.testing.assert_array_equal(np.random.get_state()[1], states[1])
+    assert not ensemble._worker
@@ -0,0 +1,71 @@
+"""
+Test suite for the `agent.event_simulator` module.
+"""
+from agent.event_simulator import EventSimulator
+from agent.policy import random_allocate
+from hospital.building import Hospital, Room, Ward
+from hospital.equipment.bed import Bed
+from hospital.people import Patient
+
+
+def _one_bed_hospital():
+    rooms = [Room("R0", beds=[Bed("B0")])]
+    hospital = Hospital("H", wards=[Ward("W0", rooms=rooms)])
+    hospital.admit(
+        Patient("P0", sex="female", department="medicine", length_of_stay=1),
+        "B0",
+    )
+    return hospital
+
+
+def _patient(name):
+    return Patient(name, sex="male", department="surgery")
+
+
+def test_discharges_before_arrivals():
+    hospital = _one_bed_hospital()
+    simulator = EventSimulator(hospital, [], random_allocate, seed=0)
+    ((due, _, _, _),) = simulator._events
+    # an arrival due at the same time as the discharge takes the bed
+    simulator = EventSimulator(
+        hospital, [(due, _patient("A0"))], random_allocate, seed=0
+    )
+    scores = simulator.run(due)
+    assert [time for time, _ in scores] == [due]
+    assert [p.name for p in simulator.hospital.patients] == ["A0"]
+    assert simulator.queue.empty()
+
+
+def test_events_in_time_order(small_hospital):
+    arrivals = [(1.5 * i, _patient(f"A{i}")) for i in range(1, 20)]
+    simulator = EventSimulator(small_hospital, arrivals, random_allocate, 0)
+    scores = simulator.run(50)
+    times = [time for time, _ in scores]
+    assert times == sorted(set(times))
+    assert simulator.time == 50
+    # the original hospital is left unchanged
+    assert [p.name for p in small_hospital.patients] == ["P0", "P1"]
+
+
+def test_stale_discharge():
+    simulator = EventSimulator(_one_bed_hospital(), [], random_allocate, 0)
+    ((due, _, _, _),) = simulator._events
+    # the patient is readmitted, for much longer, before the discharge
+    hospital = simulator.hospital
+    (patient,) = hospital.patients
+    hospital.discharge(patient)
+    patient.expected_length_of_stay = 1000
+    hospital.admit(patient, "B0")
+    simulator.run(due)
+    assert hospital.patients == (patient,)
+    assert len(simulator._events) == 1
+
+
+def test_score_returns_to_zero(small_hospital):
+    arrivals = [(i, _patient(f"A{i}")) for i in range(1, 6)]
+    simulator = EventSimulator(small_hospital, arrivals, random_allocate, 0)
+    scores = simulator.run(1000)
+    assert max(score for _, score in scores) > 0
+    assert not simulator.hospital.patients
+    assert scores[-1][1] == 0
+    assert simulator.hospital.score() == 0
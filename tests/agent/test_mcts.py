@@ -0,0 +1,385 @@
+"""
+Test suite for the `agent.mcts` and `agent.run_mcts` modules.
+"""
+import copy
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from agent.mcts import Node, SearchTree, _allocation_combinations
+from agent.run_mcts import (
+    _action_key,
+    _root_statistics,
+    iter_mcts,
+    reuse_tree,
+    run_mcts,
+)
+from hospital.building import BedBay, Hospital, Room, Ward
+from hospital.equipment.bed import Bed, HighVisibility
+from hospital.people import Patient
+from hospital.restrictions import ward as WR
+from hospital.snapshot import OccupancySnapshot
+
+
+def _plain_room_hospital():
+    # hospital of notebooks/3.MCTS_Allocation.ipynb, with plain rooms
+    beds = [Bed(f"B00{i}") for i in range(10)]
+    wards = [
+        Ward(
+            "MedicalWard",
+            rooms=[Room("R000", beds=beds[:5])],
+            restrictions=[WR.NoSurgical(10)],
+        ),
+        Ward(
+            "SurgicalWard",
+            rooms=[Room("R001", beds=beds[5:])],
+            restrictions=[WR.NoMedical(5)],
+        ),
+    ]
+    hospital = Hospital("H", wards=wards)
+    for i, bed_name in enumerate(["B001", "B005", "B006", "B009"]):
+        hospital.admit(
+            Patient(name=f"P{i}", sex="male", department="medicine"),
+            bed_name,
+        )
+    return hospital
+
+
+def _actions(node):
+    return sorted(sorted(child.action) for child in node.children)
+
+
+def _statistics(node):
+    return [
+        (sorted(child.action), child.visit_count, child.value)
+        for child in node.children
+    ]
+
+
+def test_allocation_combinations():
+    a, b, c = "a", "b", "c"
+    combinations = _allocation_combinations([["A0", "A1"], ["C0"]], [a, b])
+    assert sorted(sorted(x) for x in combinations) == [
+        [("A0", a), ("A1", b)],
+        [("A0", a), ("C0", b)],
+        [("A0", b), ("C0", a)],
+    ]
+    # fewer beds than patients, every bed is filled
+    combinations = _allocation_combinations([["A0"]], [a, b, c])
+    assert sorted(combinations) == [[("A0", a)], [("A0", b)], [("A0", c)]]
+
+
+def test_expand_plain_rooms():
+    hospital = _plain_room_hospital()
+    node = Node(hospital, prior=0, max_tree_depth=1)
+    node.expand([Patient(name="new", sex="female", department="medicine")])
+    # one class of interchangeable beds per room
+    assert _actions(node) == [["B000"], ["B007"]]
+
+
+def test_expand_covers_every_bed_type():
+    ward = Ward("W0", sex="female")
+    BedBay("BB0", ward=ward, beds=[Bed("B0"), HighVisibility("B1")])
+    hospital = Hospital("H", wards=[ward])
+    patient = Patient(
+        name="P0",
+        sex="female",
+        department="medicine",
+        needs_visual_supervision=True,
+    )
+    node = Node(hospital, prior=0, max_tree_depth=1)
+    node.expand([patient])
+    assert _actions(node) == [["B0"], ["B1"]]
+    rewards = {
+        next(iter(child.action)): child.immediate_reward
+        for child in node.children
+    }
+    assert rewards["B1"] == 1
+    assert rewards["B0"] < 1
+
+
+def test_search_tree_growth(small_hospital):
+    tree = SearchTree(OccupancySnapshot.from_hospital(small_hospital), 3)
+    tree.visit_count[0] = 5
+    actions = [{"B01": f"P{i}"} for i in range(20)]
+    children = tree.add_children(0, tree.snapshots[0], [0.05] * 20, actions)
+    # the arrays grow past their initial 16 entries, keeping their values
+    assert len(tree) == 21
+    assert all(len(getattr(tree, name)) >= 21 for name in tree._arrays)
+    assert tree.visit_count[0] == 5
+    assert children == tree.children(0) == range(1, 21)
+    assert tree.actions[1:] == actions
+    assert np.isnan(tree.immediate_reward[1:21]).all()
+
+
+def test_search_tree_indexing(small_hospital):
+    tree = SearchTree(OccupancySnapshot.from_hospital(small_hospital), 3)
+    snapshot = tree.snapshots[0]
+    tree.add_children(0, snapshot, [0.5, 0.5], [{"B01": "a"}, {"B02": "a"}])
+    grandchildren = tree.add_children(2, snapshot, [1.0], [{"S0": "b"}])
+    assert grandchildren == range(3, 4)
+    assert tree.parent[:4].tolist() == [-1, 0, 0, 2]
+    assert tree.depth[:4].tolist() == [0, 1, 1, 2]
+    assert tree.path(3) == [3, 2, 0]
+    assert tree.is_leaf(1) and not tree.is_leaf(2)
+    assert tree.expanded_from[2] is snapshot
+    with pytest.raises(ValueError):
+        tree.add_children(2, snapshot, [1.0], [{"S1": "b"}])
+
+    node = Node._view(tree, 3)
+    assert node.parent == Node._view(tree, 2)
+    assert node.parent.parent.is_root
+    assert [child.index for child in node.parent.parent.children] == [1, 2]
+
+
+def test_backpropagate(small_hospital, arrivals):
+    gamma = 0.9
+    root = Node(small_hospital, prior=0, max_tree_depth=3)
+    root.expand(arrivals[0])
+    child, *siblings = root.children
+    child.backpropagate([0.5, 0.25], [1, gamma])
+
+    long_term = child.immediate_reward + gamma * (0.5 + gamma * 0.25)
+    normalisation = 1 + gamma * (1 + gamma)
+    assert child.visit_count == 1
+    assert child.value == pytest.approx(long_term / normalisation)
+    long_term = root.immediate_reward + gamma * long_term
+    normalisation = 1 + gamma * normalisation
+    assert root.visit_count == 1
+    assert root.value == pytest.approx(long_term / normalisation)
+    assert root.tree.value_min[0] == root.value
+    assert all(s.visit_count == 0 and s.value == 0 for s in siblings)
+
+
+def test_subtree(small_hospital, arrivals):
+    random.seed(0)
+    root = Node(small_hospital, prior=0, max_tree_depth=3)
+    root.expand(arrivals[0])
+    child = root.children[0]
+    child.expand(arrivals[1])
+    for i, grandchild in enumerate(child.children):
+        grandchild.backpropagate([i / 10], [1])
+    child.children[0].expand(arrivals[2])
+
+    subtree = child.subtree(2)
+    assert subtree.is_root and subtree.depth == 0
+    assert subtree.snapshot is child.expanded_from
+    assert subtree.visit_count == child.visit_count
+    assert subtree.value == pytest.approx(child.value)
+    assert _statistics(subtree) == _statistics(child)
+    assert [c.depth for c in subtree.children] == [1] * len(child.children)
+    assert len(subtree.children[0].children) == len(child.children[0].children)
+    # nodes deeper than the new maximum depth are left out
+    assert len(child.subtree(1).children[0].children) == 0
+
+
+def _occupancy(hospital):
+    return [
+        (bed.name, bed.patient.name, bed.patient.length_of_stay)
+        for bed in hospital.occupied_beds
+    ]
+
+
+def _unallocated(patient):
+    # snapshots are scored by allocating their patients to a shared hospital
+    patient = copy.copy(patient)
+    patient.bed = None
+    return patient
+
+
+def test_materialise(small_hospital, arrivals):
+    random.seed(0)
+    root = Node(small_hospital, prior=0, max_tree_depth=3)
+    root.expand(arrivals[0])
+    child = root.children[-1]
+    child.expand(arrivals[1])
+    # children are only materialised when first used
+    tree = root.tree
+    assert all(tree.snapshots[c.index] is None for c in child.children)
+    assert np.isnan(tree.immediate_reward[child.children[0].index])
+    grandchild = child.children[-1]
+
+    # the same admissions, discharges and timers applied to a hospital
+    hospital = copy.deepcopy(small_hospital)
+    for bed_name, patient in child.action.items():
+        hospital.admit(_unallocated(patient), bed_name)
+    assert child.snapshot.to_hospital().score() == hospital.score()
+    assert child.immediate_reward == 1 - hospital.score()
+    remaining = {
+        bed_name for bed_name, _, _ in child.expanded_from.occupants()
+    }
+    for bed in list(hospital.occupied_beds):
+        bed.patient.length_of_stay += 1
+        if bed.name not in remaining:
+            hospital.discharge(bed.patient)
+    for bed_name, patient in grandchild.action.items():
+        hospital.admit(_unallocated(patient), bed_name)
+
+    assert _occupancy(grandchild.hospital) == _occupancy(hospital)
+    assert grandchild.immediate_reward == 1 - hospital.score()
+    assert tree.snapshots[grandchild.index] is not None
+    assert tree.snapshots[child.children[0].index] is None
+
+
+def test_run_mcts_plain_rooms():
+    random.seed(0)
+    hospital = _plain_room_hospital()
+    patient = Patient(name="new", sex="female", department="medicine")
+    arrivals = [
+        [patient],
+        [Patient(name="A0", sex="male", department="surgery")],
+    ]
+    root = run_mcts(hospital, arrivals, n_iterations=20)
+    assert _actions(root) == [["B000"], ["B007"]]
+    assert sum(child.visit_count for child in root.children) > 0
+
+
+def test_run_mcts_is_reproducible(small_hospital, arrivals):
+    statistics = []
+    for _ in range(2):
+        random.seed(0)
+        root = run_mcts(small_hospital, arrivals, n_iterations=30)
+        statistics.append(_statistics(root))
+    assert statistics[0] == statistics[1]
+    assert sum(count for _, count, _ in statistics[0]) > 0
+
+
+def test_run_mcts_callback(small_hospital, arrivals):
+    visits = []
+    root = run_mcts(
+        small_hospital,
+        arrivals,
+        n_iterations=15,
+        callback=lambda root: visits.append(root.visit_count),
+    )
+    assert len(visits) == 15
+    assert visits == sorted(visits) and visits[-1] == root.visit_count
+    with pytest.raises(ValueError):
+        run_mcts(small_hospital, arrivals, n_workers=2, callback=print)
+
+
+def test_run_mcts_deadline(small_hospital, arrivals):
+    root = run_mcts(small_hospital, arrivals, n_iterations=None, deadline=50)
+    assert root.visit_count > 0
+    with pytest.raises(ValueError):
+        run_mcts(small_hospital, arrivals, n_iterations=None)
+
+
+@pytest.mark.parametrize("widening", [None, (1, 0.5)])
+def test_run_mcts_visits_horizon(small_hospital, arrivals, widening):
+    for n_iterations in [30, 60]:
+        random.seed(0)
+        root = run_mcts(
+            small_hospital,
+            arrivals[:2],
+            n_iterations=n_iterations,
+            widening=widening,
+        )
+        # every iteration visits the root, also once the search reaches the
+        # end of the forecast, the first visiting each child simulated
+        num_children = len(root.children)
+        assert n_iterations <= root.visit_count < n_iterations + num_children
+    assert sum(c.visit_count > 0 for c in root.children) > 1
+
+
+def test_iter_mcts(small_hospital, arrivals):
+    rankings = list(
+        iter_mcts(small_hospital, arrivals, n_iterations=20, report_every=5)
+    )
+    assert len(rankings) == 5
+    assert rankings[-1] == rankings[-2]
+    counts = [r["visit_count"] for r in rankings[-1]]
+    assert counts == sorted(counts, reverse=True)
+
+
+def _searched(hospital, arrivals):
+    random.seed(0)
+    root = run_mcts(hospital, arrivals, n_iterations=30)
+    return root, max(root.children, key=lambda child: child.visit_count)
+
+
+def test_reuse_tree_keeps_subtree(small_hospital, arrivals):
+    root, child = _searched(small_hospital, arrivals)
+    hospital = child.expanded_from.to_hospital()
+    new_root = reuse_tree(root, child.action, hospital, arrivals[1:])
+    assert new_root.tree is not root.tree
+    assert new_root.is_root and new_root.max_tree_depth == 2
+    assert new_root.visit_count == child.visit_count
+    assert new_root.value == pytest.approx(child.value)
+    assert _statistics(new_root) == _statistics(child)
+    assert {c.depth for c in new_root.children} == {1}
+    assert {g.depth for c in new_root.children for g in c.children} <= {2}
+
+
+def _allocation(action):
+    return tuple(sorted((bed, p.name) for bed, p in action.items()))
+
+
+def test_reuse_tree_other_occupancy(small_hospital, arrivals):
+    root, child = _searched(small_hospital, arrivals)
+    hospital = child.expanded_from.to_hospital()
+    hospital.admit(Patient("X", sex="male", department="surgery"), "S1")
+    new_root = reuse_tree(root, child.action, hospital, arrivals[1:])
+    assert new_root.visit_count == child.visit_count
+    assert new_root.snapshot.occupants()[0][0] == "S1"
+    # allocations to the same classes of beds keep their statistics
+    explored = {_allocation(g.action): g.visit_count for g in child.children}
+    kept = [
+        (c.visit_count, explored[_allocation(c.action)])
+        for c in new_root.children
+        if _allocation(c.action) in explored
+    ]
+    assert kept and all(new == old for new, old in kept)
+    assert all("S1" not in c.action for c in new_root.children)
+
+
+def test_reuse_tree_unexpanded_child(small_hospital, arrivals):
+    root = Node(small_hospital, prior=0, max_tree_depth=3)
+    root.expand(arrivals[0])
+    child = root.children[0]
+    child.backpropagate([0.5, 0.5], [1, 0.9])
+    new_root = reuse_tree(root, child.action, small_hospital, arrivals[1:])
+    assert new_root.visit_count == 1
+    assert new_root.value == pytest.approx(child.value)
+    assert new_root.children == ()
+
+
+def test_reuse_tree_at_horizon(small_hospital, arrivals):
+    root, child = _searched(small_hospital, arrivals)
+    hospital = child.expanded_from.to_hospital()
+    hospital.admit(Patient("X", sex="male", department="surgery"), "S1")
+    new_root = reuse_tree(root, child.action, hospital, [])
+    assert new_root.max_tree_depth == 0
+    assert new_root.visit_count == child.visit_count
+    assert new_root.children == ()
+
+
+def test_root_parallel(small_hospital, arrivals):
+    root = run_mcts(
+        small_hospital, arrivals, n_iterations=10, n_workers=2, seed=0
+    )
+    again = run_mcts(
+        small_hospital, arrivals, n_iterations=10, n_workers=2, seed=0
+    )
+    assert _statistics(root) == _statistics(again)
+
+    # the statistics are the sums of those of each worker's search
+    seeds = random.Random(0).sample(range(2 ** 32), 2)
+    results = [
+        _root_statistics(
+            small_hospital, arrivals, 0.9, 10, None, s, None, None, None
+        )
+        for s in seeds
+    ]
+    assert root.visit_count > 0
+    assert root.visit_count == sum(r[0][0] for r in results)
+    visits = Counter()
+    for _, child_statistics in results:
+        for key, (count, _, _) in child_statistics:
+            visits[key] += count
+    assert {
+        _action_key(child.action, arrivals[0]): child.visit_count
+        for child in root.children
+    } == dict(visits)
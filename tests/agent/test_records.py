@@ -0,0 +1,70 @@
+"""
+Test suite for the `agent.records` module.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from agent.records import StepRecord, read_records, write_records
+
+
+def _records(n):
+    return [
+        StepRecord(
+            time=t,
+            score=t / 10,
+            admissions=t % 3,
+            discharges=t % 2,
+            occupancy=np.array([t, 2 * t]),
+            violations=np.array([t % 4, 1]),
+        )
+        for t in range(1, n + 1)
+    ]
+
+
+def _assert_columns(columns, records):
+    for name in ["time", "score", "admissions", "discharges"]:
+        expected = [getattr(r, name) for r in records]
+        assert columns[name].tolist() == expected
+    for name in ["occupancy", "violations"]:
+        expected = np.array([getattr(r, name) for r in records])
+        np.testing.assert_array_equal(columns[name], expected)
+
+
+@pytest.mark.parametrize("buffer_size", [1, 3, 1024])
+def test_round_trip(tmp_path, buffer_size):
+    records = _records(7)
+    path = str(tmp_path / "records")
+    count = write_records(records, path, ["W0", "W1"], buffer_size)
+    assert count == 7
+    columns = read_records(path)
+    assert columns["wards"] == ["W0", "W1"]
+    _assert_columns(columns, records)
+
+
+def test_partly_written_records(tmp_path):
+    records = _records(5)
+    path = str(tmp_path / "records")
+    write_records(records, path)
+    # stopped while flushing the fifth record, part way through its score
+    # and before its occupancy
+    score = os.path.join(path, "score.bin")
+    with open(score, "r+b") as f:
+        f.truncate(os.path.getsize(score) - 3)
+    occupancy = os.path.join(path, "occupancy.bin")
+    with open(occupancy, "r+b") as f:
+        f.truncate(os.path.getsize(occupancy) * 4 // 5)
+    _assert_columns(read_records(path), records[:4])
+
+    with open(occupancy, "r+b") as f:
+        f.truncate(0)
+    columns = read_records(path)
+    assert columns["time"].shape == (0,)
+    assert columns["occupancy"].shape == (0, 2)
+
+
+def test_no_records(tmp_path):
+    path = str(tmp_path / "records")
+    assert write_records([], path) == 0
+    assert read_records(path) == {"wards": []}
@@ -0,0 +1,61 @@
+"""
+Test suite for the `agent.rollout` module.
+"""
+import random
+
+import numpy as np
+import pytest
+
+from agent.mcts import Node
+from agent.rollout import batched_rollouts
+from hospital.people import Patient
+from hospital.state import HospitalState
+
+
+@pytest.fixture
+def full_hospital(mixed_hospital):
+    # every bed but B00 is taken by patients who are never discharged
+    for i, bed in enumerate(mixed_hospital.beds[1:]):
+        patient = Patient(
+            f"P{i}",
+            sex="male",
+            department="surgery",
+            expected_length_of_stay=300,
+        )
+        mixed_hospital.admit(patient, bed.name)
+    return mixed_hospital
+
+
+def test_single_and_batched_rollouts_agree(full_hospital):
+    # needs a high visibility bed, which only the batched rollouts scored
+    patient = Patient(
+        "A0",
+        sex="female",
+        department="medicine",
+        needs_visual_supervision=True,
+    )
+    node = Node(full_hospital, prior=0, max_tree_depth=3)
+    rewards, discounts = node.simulate(iter([patient]))
+    batched, batched_discounts = node.simulate_batch(
+        [patient], 4, rng=np.random.default_rng(0)
+    )
+    assert batched.shape == (4, 3)
+    assert np.allclose(batched, rewards)
+    assert np.allclose(batched_discounts, discounts)
+    assert rewards[0] < 1 - full_hospital.score()
+    # the forecast patient is left as it was
+    assert patient.bed is None and patient.length_of_stay == 0
+
+
+@pytest.mark.parametrize("policy", ["random", "greedy"])
+def test_batched_rollouts(mixed_hospital, random_patient, policy):
+    rng = np.random.default_rng(0)
+    state = HospitalState.from_hospital(mixed_hospital)
+    arrivals = [random_patient(random.Random(i), f"A{i}") for i in range(3)]
+    penalties = batched_rollouts(state, arrivals, 5, 10, policy, rng)
+    assert penalties.shape == (10, 5)
+    assert (penalties >= 0).all()
+    # the state the rollouts start from is left unchanged
+    assert (state.bed_patient < 0).all()
+    with pytest.raises(ValueError):
+        batched_rollouts(state, arrivals, 5, 10, "best", rng)
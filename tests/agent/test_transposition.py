@@ -0,0 +1,78 @@
+"""
+Test suite for the `agent.transposition` module.
+"""
+import pytest
+
+from agent.run_mcts import run_mcts
+from agent.transposition import TranspositionTable, ZobristHasher
+from hospital.building import BedBay, Hospital, SideRoom, Ward
+from hospital.equipment.bed import Bed, HighVisibility
+from hospital.people import Patient
+from hospital.snapshot import OccupancySnapshot
+
+
+@pytest.fixture
+def snapshot():
+    ward = Ward("W0", sex="female")
+    BedBay("BB0", ward=ward, beds=[Bed("B0"), Bed("B1"), HighVisibility("B2")])
+    BedBay("BB1", ward=ward, beds=[Bed("B3")])
+    SideRoom("SR0", ward=ward, beds=[Bed("S0")])
+    return OccupancySnapshot.from_hospital(Hospital("H", wards=[ward]))
+
+
+def _patient(name):
+    return Patient(name=name, sex="female", department="medicine")
+
+
+def test_transposition_table():
+    table = TranspositionTable(2)
+    table.put("a", 0)
+    table.put("b", 1)
+    assert table.get("a") == 0
+    table.put("c", 2)
+    # "b" was the least recently used entry
+    assert "b" not in table
+    assert len(table) == 2
+    assert table.get("b", -1) == -1
+    assert table.hits == 1
+
+
+def test_bed_classes(snapshot):
+    hasher = ZobristHasher(snapshot.context)
+    # B0 and B1 are interchangeable, every other bed is in a class of its own
+    b0, b1, b2, b3, s0 = hasher.bed_class
+    assert b0 == b1
+    assert len({b0, b2, b3, s0}) == 4
+
+
+def test_hash(snapshot):
+    hasher = ZobristHasher(snapshot.context)
+    patient = _patient("P0")
+
+    def hash_of(bed_name):
+        return hasher.hash(snapshot.admit([(bed_name, patient)]))
+
+    assert hash_of("B0") == hash_of("B1")
+    assert len({hash_of(name) for name in ["B0", "B2", "B3", "S0"]}) == 4
+
+
+def test_incremental_hash(snapshot):
+    hasher = ZobristHasher(snapshot.context)
+    allocations = [("B0", _patient("P0")), ("S0", _patient("P1"))]
+    admitted = snapshot.admit(allocations)
+    value = hasher.admit(hasher.hash(snapshot), snapshot.time, allocations)
+    assert value == hasher.hash(admitted)
+
+    later = admitted.tick(2)
+    discharged = [o for o in later.occupants() if o[0] == "S0"]
+    value = hasher.discharge(hasher.hash(later), later.time, discharged)
+    assert value == hasher.hash(later.discharge(["S0"]))
+
+
+def test_run_mcts_table_is_opt_in(snapshot):
+    hospital = snapshot.to_hospital()
+    arrivals = [[_patient("P0")], [_patient("P1")], [_patient("P2")]]
+    assert run_mcts(hospital, arrivals, n_iterations=5).tree.table is None
+    root = run_mcts(hospital, arrivals, n_iterations=20, table_size=64)
+    assert root.tree.table is not None
+    assert len(root.tree.table) > 0
@@ -0,0 +1,102 @@
+import pytest
+
+from hospital.building import BedBay, Hospital, SideRoom, Ward
+from hospital.equipment.bed import Bed, HighVisibility
+from hospital.people import Patient
+from hospital.restrictions import room as RR
+from hospital.restrictions import ward as WR
+
+
+def _two_ward_hospital(
+    ward_restrictions, bay_penalty, side_room_penalty, **female_ward
+):
+    # a female and a mixed ward, each holding a bed bay and a side room
+    wards = [
+        Ward(
+            "W0",
+            sex="female",
+            restrictions=ward_restrictions[0],
+            **female_ward,
+        ),
+        Ward("W1", restrictions=ward_restrictions[1]),
+    ]
+    for i, ward in enumerate(wards):
+        BedBay(
+            f"BB{i}",
+            ward=ward,
+            beds=[Bed(f"B{i}0"), Bed(f"B{i}1"), HighVisibility(f"B{i}2")],
+            restrictions=[RR.NoMixedSex(bay_penalty)],
+        )
+        SideRoom(
+            f"SR{i}",
+            ward=ward,
+            beds=[Bed(f"S{i}")],
+            restrictions=[RR.KeepSideRoomEmpty(side_room_penalty)],
+        )
+    return Hospital("H", wards=wards)
+
+
+@pytest.fixture
+def mixed_hospital():
+    """
+    Hospital with a female and a mixed ward, each holding a bed bay (beds
+    B<ward>0, B<ward>1 and high visibility bed B<ward>2) and a side room
+    (bed S<ward>), with ward and room restrictions.
+    """
+    return _two_ward_hospital(
+        [
+            [WR.IncorrectSex(10), WR.IncorrectSpecialty(2)],
+            [WR.NoKnownCovid(10), WR.NoSurgical(3)],
+        ],
+        bay_penalty=8,
+        side_room_penalty=1,
+        specialty=["general"],
+    )
+
+
+@pytest.fixture
+def small_hospital():
+    """
+    Hospital laid out as `mixed_hospital`, with small float penalties and one
+    patient in each bay.
+    """
+    hospital = _two_ward_hospital(
+        [
+            [WR.IncorrectSex(0.3), WR.NoSurgical(0.1)],
+            [WR.NoMedical(0.1)],
+        ],
+        bay_penalty=0.2,
+        side_room_penalty=0.05,
+    )
+    hospital.admit(
+        Patient("P0", sex="female", department="medicine", length_of_stay=1),
+        "B00",
+    )
+    hospital.admit(
+        Patient("P1", sex="male", department="surgery", length_of_stay=2),
+        "B10",
+    )
+    return hospital
+
+
+@pytest.fixture
+def random_patient():
+    """
+    Returns a function drawing a patient with random attributes and
+    restrictions from a `random.Random` generator.
+    """
+
+    def _random_patient(rng, name):
+        return Patient(
+            name=name,
+            sex=rng.choice(["male", "female"]),
+            department=rng.choice(["medicine", "surgery"]),
+            specialty=rng.choice(["general", "cardiology"]),
+            is_known_covid=rng.random() < 0.3,
+            is_immunosupressed=rng.random() < 0.3,
+            is_falls_risk=rng.random() < 0.3,
+            needs_visual_supervision=rng.random() < 0.3,
+            length_of_stay=rng.randrange(3),
+        )
+
+    return _random_patient
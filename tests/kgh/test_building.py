@@ -1,12 +1,19 @@
 """
 Test suite for hospital.building module.
 """
+import copy
+
 import pytest
 
 from hospital.building.building import Hospital
 from hospital.building.room import Room
 from hospital.building.ward import Ward
 from hospital.equipment.bed import Bed
+from hospital.exceptions import (
+    BedNotFoundError,
+    PatientNotFoundError,
+    TreeLoopError,
+)
 from hospital.people import Patient
 
 
@@ -85,3 +92,169 @@ def test_hospital(hospital, ward, room, bed_, patient):
 
 def test_ward_restrictions(ward, patient):
     assert ward.eval_restrictions()["score"] == 0
+
+
+def test_find_bed(hospital, ward, room, bed_):
+    with pytest.raises(BedNotFoundError):
+        hospital.find_bed(bed_.name)
+    room.beds = [bed_]
+    ward.rooms = [room]
+    ward.hospital = hospital
+    assert hospital.find_bed(bed_.name) is bed_
+
+    # index follows changes to the tree structure
+    new_bed = Bed(name="B1", room=room)
+    assert hospital.find_bed("B1") is new_bed
+    new_bed.room = None
+    with pytest.raises(BedNotFoundError):
+        hospital.find_bed("B1")
+
+
+def test_find_patient(hospital, ward, room, bed_, patient):
+    room.beds = [bed_]
+    ward.rooms = [room]
+    ward.hospital = hospital
+    with pytest.raises(PatientNotFoundError):
+        hospital.find_patient(patient)
+
+    # index follows beds allocated outside of the hospital
+    bed_.allocate(patient)
+    assert hospital.find_patient(patient) is bed_
+    bed_.vacate()
+    with pytest.raises(PatientNotFoundError):
+        hospital.find_patient(patient)
+
+    hospital.admit(patient, bed_.name)
+    hospital_copy = copy.deepcopy(hospital)
+    patient_copy = hospital_copy.patients[0]
+    assert hospital_copy.find_patient(patient_copy).name == bed_.name
+    with pytest.raises(PatientNotFoundError):
+        hospital_copy.find_patient(patient)
+    hospital.discharge(patient)
+    assert hospital.patients == ()
+
+
+def test_cached_views(hospital, ward, room, bed_, patient):
+    room.beds = [bed_]
+    ward.rooms = [room]
+    ward.hospital = hospital
+    assert hospital.rooms == (room,)
+    assert hospital.beds == (bed_,)
+    assert hospital.empty_beds == (bed_,)
+
+    # structural changes are picked up by every ancestor
+    new_bed = Bed(name="B1", room=room)
+    assert room.beds == (bed_, new_bed)
+    assert ward.beds == (bed_, new_bed)
+    assert hospital.beds == (bed_, new_bed)
+
+    # occupancy views are kept in bed order
+    new_bed.allocate(patient)
+    assert hospital.occupied_beds == (new_bed,)
+    assert hospital.empty_beds == (bed_,)
+    new_bed.vacate()
+    bed_.allocate(patient)
+    assert ward.patients == (patient,)
+    assert ward.empty_beds == (new_bed,)
+    assert list(hospital.get_occupied_beds()) == [bed_]
+    assert hospital.has_empty_beds()
+
+    new_room = Room(name="R1", ward=ward)
+    assert hospital.rooms == (room, new_room)
+    new_bed.room = new_room
+    assert room.beds == (bed_,)
+    assert hospital.empty_beds == (new_bed,)
+
+
+def test_tree_links(hospital, ward, room, bed_):
+    other_room = Room(name="R1", ward=ward)
+    room.ward = ward
+    bed_.room = room
+    assert ward.rooms == (other_room, room)
+    assert room.beds == (bed_,)
+
+    # moving a node detaches it from its previous parent
+    bed_.room = other_room
+    assert room.beds == ()
+    assert other_room.beds == (bed_,)
+    room.beds = [bed_]
+    assert bed_.room is room
+    assert other_room.beds == ()
+
+    ward.rooms = [room]
+    assert other_room.ward is None
+    assert room.ward is ward
+
+    ward.hospital = hospital
+    with pytest.raises(TreeLoopError):
+        hospital.parent = bed_
+    with pytest.raises(ValueError):
+        room.beds = [bed_, bed_]
+    assert not hasattr(bed_, "__dict__")
+
+
+def test_what_if(hospital, ward, room, bed_, patient):
+    other_bed = Bed(name="B1", room=room)
+    room.beds = [bed_, other_bed]
+    ward.rooms = [room]
+    ward.hospital = hospital
+    hospital.admit(patient, bed_.name)
+    score = hospital.eval_restrictions()
+
+    new_patient = Patient(name="p", sex="female", department="medicine")
+    with pytest.raises(RuntimeError):
+        with hospital.what_if():
+            hospital.discharge(patient)
+            hospital.admit(new_patient, bed_.name)
+            hospital.record(new_patient, "length_of_stay")
+            new_patient.length_of_stay = 5
+            assert hospital.patients == (new_patient,)
+            raise RuntimeError
+    assert hospital.patients == (patient,)
+    assert hospital.find_patient(patient) is bed_
+    assert patient.bed is bed_
+    assert new_patient.bed is None
+    assert new_patient.length_of_stay == 0
+    assert hospital.eval_restrictions() == score
+
+
+def test_checkpoints(hospital, ward, room, bed_, patient):
+    other_bed = Bed(name="B1", room=room)
+    room.beds = [bed_, other_bed]
+    ward.rooms = [room]
+    ward.hospital = hospital
+
+    outer = hospital.checkpoint()
+    hospital.admit(patient, bed_.name)
+    hospital.checkpoint()
+    hospital.discharge(patient)
+    hospital.admit(patient, other_bed.name)
+
+    # copies do not take part in the transaction
+    hospital_copy = copy.deepcopy(hospital)
+    hospital_copy.rollback(hospital_copy.checkpoint())
+    assert hospital_copy.occupied_beds[0].name == "B1"
+
+    hospital.rollback()
+    assert hospital.occupied_beds == (bed_,)
+    hospital.release(outer)
+    assert hospital.occupied_beds == (bed_,)
+    assert patient.bed is bed_
+    with pytest.raises(ValueError):
+        hospital.rollback(outer)
+
+
+def test_observe(hospital, ward, room, bed_, patient):
+    room.beds = [bed_]
+    ward.rooms = [room]
+    ward.hospital = hospital
+    changes = []
+    hospital.observe(lambda *change: changes.append(change))
+
+    with hospital.what_if():
+        hospital.admit(patient, bed_.name)
+    assert changes == [(bed_, None, patient), (bed_, patient, None)]
+
+    # observers are not copied
+    copy.deepcopy(hospital).admit(patient, bed_.name)
+    assert len(changes) == 2
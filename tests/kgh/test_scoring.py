@@ -0,0 +1,236 @@
+"""
+Test suite for the `hospital.scoring` module.
+"""
+import random
+
+import pytest
+
+from hospital.building import BedBay, Hospital, Ward
+from hospital.data import Sex
+from hospital.equipment.bed import Bed
+from hospital.people import Patient
+from hospital.restrictions import people as PR
+from hospital.restrictions import room as RR
+from hospital.restrictions import ward as WR
+
+
+def _full_evaluation(hospital):
+    entities = hospital.wards + hospital.rooms + hospital.patients
+    results = [e.eval_restrictions() for e in entities]
+    return {
+        "score": sum(r["score"] for r in results),
+        "names": sum((r["names"] for r in results), []),
+    }
+
+
+def test_ledger_matches_full_evaluation(mixed_hospital, random_patient):
+    rng = random.Random(0)
+    for i in range(200):
+        empty = list(mixed_hospital.get_empty_beds())
+        if empty and (rng.random() < 0.6 or not mixed_hospital.patients):
+            mixed_hospital.admit(
+                random_patient(rng, f"P{i}"), rng.choice(empty).name
+            )
+        else:
+            mixed_hospital.discharge(rng.choice(mixed_hospital.patients))
+        assert mixed_hospital.eval_restrictions() == _full_evaluation(
+            mixed_hospital
+        )
+        assert (
+            mixed_hospital.score() == _full_evaluation(mixed_hospital)["score"]
+        )
+
+
+def test_violation_counts(mixed_hospital, random_patient):
+    rng = random.Random(1)
+    for i in range(100):
+        empty = list(mixed_hospital.get_empty_beds())
+        if empty and (rng.random() < 0.6 or not mixed_hospital.patients):
+            mixed_hospital.admit(
+                random_patient(rng, f"P{i}"), rng.choice(empty).name
+            )
+        else:
+            mixed_hospital.discharge(rng.choice(mixed_hospital.patients))
+        counts = mixed_hospital.violation_counts()
+        assert len(counts) == len(mixed_hospital.wards)
+        assert sum(counts) == len(mixed_hospital.eval_restrictions()["names"])
+        for ward, count in zip(mixed_hospital.wards, counts):
+            assert count >= len(ward.eval_restrictions()["names"])
+
+
+def test_score(mixed_hospital, random_patient):
+    rng = random.Random(3)
+    for i, bed in enumerate(mixed_hospital.beds):
+        mixed_hospital.admit(random_patient(rng, f"P{i}"), bed.name)
+    entities = (
+        mixed_hospital.wards + mixed_hospital.rooms + mixed_hospital.patients
+    )
+    for entity in entities + (mixed_hospital,):
+        assert entity.score() == entity.eval_restrictions()["score"]
+
+
+def test_ledger_follows_restriction_changes(mixed_hospital):
+    patient = Patient("p", sex="male", department="surgery")
+    mixed_hospital.admit(patient, "B00")
+    assert mixed_hospital.eval_restrictions()["score"] == 10
+
+    mixed_hospital.wards[0].restrictions.append(WR.NoSurgical(3))
+    assert mixed_hospital.eval_restrictions()["score"] == 13
+
+    mixed_hospital.wards[0].restrictions[0].change_penalty(20)
+    assert mixed_hospital.eval_restrictions()["score"] == 23
+
+    mixed_hospital.wards[0].sex = Sex.male
+    mixed_hospital.wards[0].restrictions = [WR.NoSurgical(5)]
+    assert mixed_hospital.eval_restrictions() == _full_evaluation(
+        mixed_hospital
+    )
+    assert mixed_hospital.eval_restrictions()["score"] == 5
+
+
+def test_ledger_score_does_not_drift(mixed_hospital, random_patient):
+    entities = mixed_hospital.wards + mixed_hospital.rooms
+    penalties = [0.1, 0.3, 0.7]
+    for i, restriction in enumerate(
+        r for e in entities for r in e.restrictions
+    ):
+        restriction.change_penalty(penalties[i % len(penalties)])
+    rng = random.Random(2)
+    for cycle in range(20):
+        for i, bed in enumerate(mixed_hospital.beds):
+            patient = random_patient(rng, f"P{cycle}{i}")
+            for restriction in patient.restrictions:
+                restriction.change_penalty(0.1)
+            mixed_hospital.admit(patient, bed.name)
+            mixed_hospital.score()
+        for patient in list(mixed_hospital.patients):
+            mixed_hospital.discharge(patient)
+            mixed_hospital.score()
+        assert mixed_hospital.score() == 0
+
+
+@pytest.mark.parametrize(
+    "restriction",
+    [
+        WR.NoAcuteSurgical(1),
+        WR.NoKnownCovid(2),
+        WR.NoSuspectedCovid(3),
+        WR.NoNonCovid(4),
+        WR.NoPatientsOver100kg(5),
+        WR.IncorrectSex(6),
+        WR.NoMobilityAssistance(7),
+        WR.NoDementiaRisk(8),
+        WR.NoHighAcuity(9),
+        WR.NoNonElective(10),
+        WR.NoSurgical(11),
+        WR.NoMedical(12),
+        WR.IncorrectSpecialty(13),
+    ],
+)
+def test_compiled_ward_restrictions(
+    mixed_hospital, restriction, random_patient
+):
+    rng = random.Random(1)
+    for ward in mixed_hospital.wards:
+        ward.restrictions.append(restriction)
+    for i, bed in enumerate(mixed_hospital.beds[:-1]):
+        patient = random_patient(rng, f"P{i}")
+        patient.weight = rng.choice([70.0, 120.0])
+        patient.is_suspected_covid = rng.random() < 0.3
+        patient.is_acute_surgical = rng.random() < 0.3
+        patient.is_elective = rng.random() < 0.3
+        patient.needs_mobility_assistence = rng.random() < 0.3
+        patient.is_dementia_risk = rng.random() < 0.3
+        patient.is_high_acuity = rng.random() < 0.3
+        mixed_hospital.admit(patient, bed.name)
+
+    wards = [ward.eval_restrictions() for ward in mixed_hospital.wards]
+    expected = {
+        "score": sum(w["score"] for w in wards),
+        "names": sum((w["names"] for w in wards), []),
+    }
+    compiled = mixed_hospital.compile_restrictions()
+    assert compiled.evaluate() == expected
+    assert compiled.bed_penalties().sum() == expected["score"]
+
+
+@pytest.mark.parametrize("penalty", [0.1, 0.3, 0.7, 1.1])
+def test_compiled_ward_restrictions_float_penalties(penalty):
+    ward = Ward(
+        "W0",
+        sex="female",
+        restrictions=[WR.IncorrectSex(penalty), WR.NoSurgical(0.2)],
+    )
+    BedBay("BB0", ward=ward, beds=[Bed(f"B{i}") for i in range(8)])
+    hospital = Hospital("H", wards=[ward])
+    for i, bed in enumerate(hospital.beds):
+        hospital.admit(
+            Patient(f"P{i}", sex="male", department="surgery"), bed.name
+        )
+        # the totals and names (e.g. 5 names for six violations of 0.1 each)
+        # match those of the ward, whatever the rounding of the penalties
+        expected = ward.eval_restrictions()
+        compiled = hospital.compile_restrictions()
+        assert compiled.evaluate() == expected
+        assert compiled.ward_counts() == [len(expected["names"])]
+
+
+def test_compiled_ward_restrictions_fallback(mixed_hospital):
+    class NoPatients(WR.WardRestriction):
+        def _evaluate_bed(self, bed):
+            return self.penalty if bed.patient else 0
+
+    mixed_hospital.wards[1].restrictions = [NoPatients(5)]
+    mixed_hospital.admit(Patient("p", sex="male", department="surgery"), "B10")
+    compiled = mixed_hospital.compile_restrictions()
+    assert compiled.evaluate() == {"score": 5, "names": ["NoPatients"]}
+    assert compiled.bed_penalties().tolist() == [0, 0, 0, 0, 5, 0, 0, 0]
+
+
+def _admission_deltas(hospital, patients, beds):
+    current = hospital.eval_restrictions()["score"]
+    deltas = []
+    for patient in patients:
+        row = []
+        for bed in beds:
+            hospital.admit(patient, bed.name)
+            row.append(hospital.eval_restrictions()["score"] - current)
+            hospital.discharge(patient)
+        deltas.append(row)
+    return deltas
+
+
+def test_penalty_matrix(mixed_hospital, random_patient):
+    rng = random.Random(2)
+    for i, bed in enumerate(mixed_hospital.beds[::2]):
+        mixed_hospital.admit(random_patient(rng, f"P{i}"), bed.name)
+    patients = [random_patient(rng, f"Q{i}") for i in range(20)]
+    patients[0].needs_visual_supervision = True
+    patients[0].restrictions.append(PR.NeedsVisualSupervision(5))
+
+    matrix, beds = mixed_hospital.penalty_matrix(patients)
+    assert beds == mixed_hospital.empty_beds
+    assert matrix.shape == (len(patients), len(beds))
+    assert matrix.tolist() == _admission_deltas(mixed_hospital, patients, beds)
+    assert all(patient.bed is None for patient in patients)
+
+
+def test_penalty_matrix_fallback(mixed_hospital):
+    class NoPatients(RR.RoomRestriction):
+        def _evaluate_room(self, room):
+            return self.penalty * len(room.patients)
+
+    mixed_hospital.rooms[0].restrictions.append(NoPatients(3))
+    mixed_hospital.admit(Patient("p", sex="male", department="surgery"), "B00")
+    patients = [Patient("q", sex="female", department="medicine")]
+    beds = [mixed_hospital.find_bed(name) for name in ["B01", "S0", "B10"]]
+
+    matrix, _ = mixed_hospital.penalty_matrix(patients, beds)
+    assert matrix.tolist() == [[8 + 3, 1, 0]]
+    assert matrix.tolist() == _admission_deltas(mixed_hospital, patients, beds)
+    assert patients[0].bed is None
+
+    with pytest.raises(ValueError):
+        mixed_hospital.penalty_matrix(
+            patients, [mixed_hospital.find_bed("B00")]
+        )
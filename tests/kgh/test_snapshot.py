@@ -0,0 +1,78 @@
+"""
+Test suite for the `hospital.snapshot` module.
+"""
+import random
+
+import pytest
+
+from hospital.exceptions import BedOccupiedError
+from hospital.people import Patient
+from hospital.snapshot import OccupancySnapshot
+
+
+def _patient(name, sex="male", **kwargs):
+    return Patient(name=name, sex=sex, department="surgery", **kwargs)
+
+
+def test_snapshot_sharing(mixed_hospital):
+    patient = _patient("p", length_of_stay=2)
+    mixed_hospital.admit(patient, "B00")
+    root = OccupancySnapshot.from_hospital(mixed_hospital)
+    assert root.occupants()[0][0] == "B00"
+    assert root.occupants()[0][1] is not patient
+
+    child = root.admit([("B10", _patient("q"))])
+    assert child.wards[0] is root.wards[0]
+    assert child.wards[1][1] is root.wards[1][1]
+    assert child.wards[1][0] is not root.wards[1][0]
+
+    later = child.tick(3)
+    assert later.wards is child.wards
+    assert [(b, t) for b, _, t in later.occupants()] == [
+        ("B00", 5),
+        ("B10", 3),
+    ]
+    assert patient.length_of_stay == 2
+
+    discharged = later.discharge(["B00"])
+    assert discharged.wards[1] is later.wards[1]
+    assert discharged.empty_beds()[:4] == ["B00", "B01", "B02", "S0"]
+    assert "B10" not in discharged.empty_beds()
+    with pytest.raises(BedOccupiedError):
+        child.admit([("B10", _patient("r"))])
+
+
+def test_snapshot_to_state(mixed_hospital):
+    mixed_hospital.admit(_patient("p", length_of_stay=2), "B00")
+    snapshot = OccupancySnapshot.from_hospital(mixed_hospital)
+    snapshot = snapshot.admit([("S1", _patient("q"))]).tick(3)
+
+    state = snapshot.to_state()
+    assert state.topology is snapshot.context.topology
+    assert state.occupied_beds.tolist() == [0, 7]
+    assert state.length_of_stay.tolist() == [5, 3]
+    assert state.score() == snapshot.score()
+
+
+def test_snapshot_scores(mixed_hospital):
+    rng = random.Random(0)
+    mixed_hospital.admit(_patient("p", is_immunosupressed=True), "B00")
+    snapshots = [OccupancySnapshot.from_hospital(mixed_hospital)]
+    for i in range(100):
+        snapshot = rng.choice(snapshots)
+        occupants = snapshot.occupants()
+        if snapshot.empty_beds() and (rng.random() < 0.6 or not occupants):
+            patient = _patient(
+                f"P{i}",
+                sex=rng.choice(["male", "female"]),
+                is_falls_risk=rng.random() < 0.5,
+            )
+            bed_name = rng.choice(snapshot.empty_beds())
+            snapshot = snapshot.admit([(bed_name, patient)])
+        else:
+            snapshot = snapshot.discharge([rng.choice(occupants)[0]])
+        snapshots.append(snapshot)
+
+    for snapshot in rng.sample(snapshots, len(snapshots)):
+        expected = snapshot.to_hospital().eval_restrictions()
+        assert snapshot.eval_restrictions() == expected
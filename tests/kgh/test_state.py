@@ -0,0 +1,136 @@
+"""
+Test suite for the `hospital.state` module.
+"""
+import random
+
+import numpy as np
+import pytest
+
+from hospital.exceptions import (
+    BedNotFoundError,
+    BedOccupiedError,
+    PatientNotFoundError,
+)
+from hospital.people import Patient
+from hospital.restrictions import ward as WR
+from hospital.state import HospitalState, HospitalTopology
+
+
+def _occupancy(hospital):
+    return [
+        (bed.name, bed.patient.name, bed.patient.length_of_stay)
+        for bed in hospital.occupied_beds
+    ]
+
+
+def test_state_round_trip(mixed_hospital, random_patient):
+    rng = random.Random(0)
+    for i, bed in enumerate(mixed_hospital.beds[::2]):
+        mixed_hospital.admit(random_patient(rng, f"P{i}"), bed.name)
+
+    state = HospitalState.from_hospital(mixed_hospital)
+    assert state.score() == mixed_hospital.eval_restrictions()["score"]
+
+    copy = state.to_hospital()
+    assert copy is not mixed_hospital
+    assert _occupancy(copy) == _occupancy(mixed_hospital)
+    assert copy.eval_restrictions() == mixed_hospital.eval_restrictions()
+    assert all(p.bed is not None for p in copy.patients)
+    assert mixed_hospital.patients[0].bed is mixed_hospital.beds[0]
+
+
+def test_state_matches_hospital(mixed_hospital, random_patient):
+    rng = random.Random(1)
+    state = HospitalState.from_hospital(mixed_hospital)
+    for i in range(200):
+        empty = list(mixed_hospital.get_empty_beds())
+        if empty and (rng.random() < 0.6 or not mixed_hospital.patients):
+            patient = random_patient(rng, f"P{i}")
+            bed = rng.choice(empty).name
+            mixed_hospital.admit(patient, bed)
+            state.admit(patient, bed)
+        else:
+            patient = rng.choice(mixed_hospital.patients)
+            mixed_hospital.discharge(patient)
+            state.discharge(patient)
+        assert state.score() == mixed_hospital.eval_restrictions()["score"]
+    assert _occupancy(state.to_hospital()) == _occupancy(mixed_hospital)
+
+
+def test_state_copy(mixed_hospital):
+    state = HospitalState.from_hospital(mixed_hospital)
+    state.admit(Patient("p", sex="male", department="surgery"), "B10")
+
+    copy = state.copy()
+    copy.admit(Patient("q", sex="female", department="surgery"), "B11")
+    copy.increment_timers(2)
+    assert state.score() == 3
+    assert copy.score() == 3 + 3 + 8
+    assert state.length_of_stay.tolist() == [0]
+    assert copy.length_of_stay.tolist() == [2, 2]
+    assert len(state.patients) == 1
+
+    copy.vacate(copy.occupied_beds)
+    assert copy.score() == 0
+    assert state.occupied_beds.tolist() == [4]
+
+
+def test_state_score_batch(mixed_hospital, random_patient):
+    rng = random.Random(2)
+    state = HospitalState.from_hospital(mixed_hospital)
+    ids = state.add_patients([random_patient(rng, f"P{i}") for i in range(6)])
+    assert len(state.occupied_beds) == 0
+
+    rows = []
+    for _ in range(20):
+        row = np.full(len(mixed_hospital.beds), -1)
+        beds = rng.sample(range(len(row)), rng.randrange(len(ids) + 1))
+        row[beds] = ids[: len(beds)]
+        rows.append(row)
+    expected = []
+    for row in rows:
+        copy = state.copy()
+        copy.bed_patient = row
+        expected.append(copy.score())
+        assert copy.score() == copy.to_hospital().eval_restrictions()["score"]
+    assert state.score_batch(np.array(rows)).tolist() == expected
+
+    penalties = state.admission_penalties(ids)
+    assert penalties.shape == (len(ids), len(mixed_hospital.beds))
+    for i, patient_id in enumerate(ids):
+        for bed in range(len(mixed_hospital.beds)):
+            expected = _admission_penalty(state, patient_id, bed)
+            assert penalties[i, bed] == expected
+
+
+def _admission_penalty(state, patient_id, bed):
+    copy = state.copy()
+    copy.bed_patient[bed] = patient_id
+    # room restrictions are left out of the admission penalties
+    rooms = copy.to_hospital().rooms
+    return copy.score() - sum(room.score() for room in rooms)
+
+
+def test_state_errors(mixed_hospital):
+    topology = HospitalTopology(mixed_hospital)
+    state = HospitalState.from_hospital(mixed_hospital, topology)
+    patient = Patient("p", sex="male", department="surgery")
+    with pytest.raises(BedNotFoundError):
+        state.admit(patient, "missing")
+    state.admit(patient, "B00")
+    with pytest.raises(BedOccupiedError):
+        state.admit(Patient("q", sex="male", department="surgery"), "B00")
+    state.discharge(patient)
+    with pytest.raises(PatientNotFoundError):
+        state.discharge(patient)
+
+
+def test_state_fallback(mixed_hospital):
+    class NoPatients(WR.WardRestriction):
+        def _evaluate_bed(self, bed):
+            return self.penalty if bed.patient else 0
+
+    mixed_hospital.wards[1].restrictions.append(NoPatients(5))
+    mixed_hospital.admit(Patient("p", sex="male", department="surgery"), "B10")
+    state = HospitalState.from_hospital(mixed_hospital)
+    assert state.score() == mixed_hospital.eval_restrictions()["score"] == 8